@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Warm Redis with the profile stats, user stats and first history page of the most active users.
+
+Usage: python3 cache_warmer.py --url redis://localhost:6380 --users 10000 [--measure 200]
+
+Keys and values (JSON, written with SET ... EX):
+
+  cache:v1:getUserProfileStats:<id_user>             what getUserProfileStats(id_user) resolves to
+  cache:v1:getUserStats:<id_user>                    what getUserStats(id_user) resolves to, null without a row
+  cache:v1:getGamesHistory:<id_user>:<page>:<limit>  body of GET /api/games/history?user=<id_user>&page=<page>&limit=<limit>
+
+The functions are the ones in src/api/db/database.js, so a cache-aside
+lookup in front of them can return the value as is and fall back to SQLite on
+a miss. Anything that writes a user's games or user_stats row should delete
+that user's keys; the TTL bounds how stale a missed invalidation can get and
+is spread by --jitter so a warm-up does not expire all at once. Bump the
+version in the prefix when a value's shape changes.
+
+Users are ranked by games played in the last --days days (idx_games_created_at).
+Stats rows are read in bulk with json_each and history pages come from
+game_players (friends.py backfill-game-players), all in one read transaction.
+The report gives keys/s and the Redis memory taken; --measure N replays the
+backend's SQL (query_bench.py) for N warmed users and compares it with a GET
+of the warmed key.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import redis
+
+import game_players
+from query_bench import QUERIES, percentile
+
+
+KEY_PREFIX = "cache:v1"
+KEYS = {
+    "getUserProfileStats": KEY_PREFIX + ":getUserProfileStats:{user}",
+    "getUserStats": KEY_PREFIX + ":getUserStats:{user}",
+    "getGamesHistory": KEY_PREFIX + ":getGamesHistory:{user}:{page}:{limit}",
+}
+PROFILE_STATS_COLUMNS = ("total_games", "wins", "losses", "total_tournaments")
+# the page size the history view always requests (gamesPerPage in historyContentRenderer.ts) and
+# getGamesHistory's default; every limit is cached under its own key
+HISTORY_LIMIT = 8
+CHUNK_SIZE = 1000
+
+HOT_USERS_SQL = """
+    SELECT id_user, COUNT(*) AS games FROM (
+        SELECT player1_id AS id_user FROM games WHERE created_at >= datetime('now', ?)
+        UNION ALL
+        SELECT player2_id FROM games WHERE created_at >= datetime('now', ?)
+    )
+    WHERE id_user IS NOT NULL
+    GROUP BY id_user
+    ORDER BY games DESC
+    LIMIT ?
+"""
+USER_STATS_SQL = "SELECT * FROM user_stats WHERE id_user IN (SELECT value FROM json_each(?))"
+USERNAMES_SQL = "SELECT id_user, username FROM users WHERE id_user IN (SELECT value FROM json_each(?))"
+
+
+def hot_users(conn, days, limit):
+    """Ids of the limit users with the most games in the last days days, most active first"""
+    window = f"-{days} days"
+    return [row[0] for row in conn.execute(HOT_USERS_SQL, (window, window, limit))]
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+def history_body(games, total, page, limit, names):
+    """The response of getGamesHistoryHandler for one page"""
+    return {
+        "success": True,
+        "games": [{**game,
+                   "player1_name": names.get(game["player1_id"]),
+                   "player2_name": names.get(game["player2_id"]),
+                   "winner_name": names.get(game["winner_id"]) if game["winner_id"] else None}
+                  for game in games],
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "totalPages": -(-total // limit),
+        "hasNext": (page + 1) * limit < total,
+        "hasPrev": page > 0,
+    }
+
+def payloads(conn, users, limit=HISTORY_LIMIT):
+    """Yield (kind, key, JSON value) for the cached responses of every user, CHUNK_SIZE users per query"""
+    for low in range(0, len(users), CHUNK_SIZE):
+        chunk = users[low:low + CHUNK_SIZE]
+        stats = {row["id_user"]: dict(row) for row in conn.execute(USER_STATS_SQL, (_dumps(chunk),))}
+        pages = {}
+        for user in chunk:
+            total = conn.execute(game_players.HISTORY_COUNT_SQL, (user,)).fetchone()[0]
+            pages[user] = total, [dict(row) for row in conn.execute(game_players.HISTORY_PAGE_SQL, (user, limit))]
+        players = {game[side] for _, games in pages.values() for game in games
+                   for side in ("player1_id", "player2_id", "winner_id") if game[side]}
+        names = dict(conn.execute(USERNAMES_SQL, (_dumps(sorted(players)),)).fetchall())
+
+        for user in chunk:
+            row = stats.get(user)
+            profile = {col: row[col] for col in PROFILE_STATS_COLUMNS} if row else dict.fromkeys(PROFILE_STATS_COLUMNS, 0)
+            total, games = pages[user]
+            yield "getUserProfileStats", KEYS["getUserProfileStats"].format(user=user), _dumps(profile)
+            yield "getUserStats", KEYS["getUserStats"].format(user=user), _dumps(row)
+            yield ("getGamesHistory", KEYS["getGamesHistory"].format(user=user, page=0, limit=limit),
+                   _dumps(history_body(games, total, 0, limit, names)))
+
+def warm(r, items, ttl, jitter, pipeline_size=1000, seed=0):
+    """SET every (kind, key, value) with a TTL in pipelines; returns {kind: [keys, payload bytes]}"""
+    rng = random.Random(seed)
+    written = {kind: [0, 0] for kind in KEYS}
+    pipe = r.pipeline(transaction=False)
+    queued = 0
+    for kind, key, value in items:
+        pipe.set(key, value, ex=ttl + rng.randint(0, jitter))
+        written[kind][0] += 1
+        written[kind][1] += len(value)
+        queued += 1
+        if queued == pipeline_size:
+            pipe.execute()
+            queued = 0
+    pipe.execute()
+    return written
+
+def memory_per_key(r, users, limit, samples=200, seed=0):
+    """Average MEMORY USAGE of every kind of key over a sample of warmed users"""
+    sample = random.Random(seed).sample(users, min(samples, len(users)))
+    usage = {}
+    for kind, pattern in KEYS.items():
+        sizes = [r.memory_usage(pattern.format(user=user, page=0, limit=limit)) or 0 for user in sample]
+        usage[kind] = sum(sizes) / max(len(sizes), 1)
+    return usage
+
+def _timed(samples, call):
+    latencies = []
+    for args in samples:
+        started_at = time.perf_counter()
+        call(*args)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    return percentile(latencies, 50), percentile(latencies, 95)
+
+def measure(db_path, r, users, samples=200, limit=HISTORY_LIMIT, seed=0):
+    """p50/p95 ms of each cached call served by SQLite (as the backend runs it) and by a GET of its key"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    sample = [(user,) for user in random.Random(seed).choices(users, k=samples)]
+
+    def sqlite_call(name):
+        sql, _ = QUERIES[name]
+        return lambda user: conn.execute(sql, (user,)).fetchone()
+
+    def sqlite_history(user):
+        # getGamesHistory, then the handler's getUsernameById for every player of the page
+        conn.execute(QUERIES["getGamesHistory.count"][0], (user, user)).fetchone()
+        games = conn.execute(QUERIES["getGamesHistory.first_page"][0], (user, user, limit, 0)).fetchall()
+        for game in games:
+            for player in (game[3], game[4], game[5]):
+                if player:
+                    conn.execute("SELECT username FROM users WHERE id_user = ?", (player,)).fetchone()
+
+    def redis_call(kind):
+        return lambda user: json.loads(r.get(KEYS[kind].format(user=user, page=0, limit=limit)))
+
+    results = {}
+    for kind, cold in (("getUserProfileStats", sqlite_call("getUserProfileStats")),
+                       ("getUserStats", sqlite_call("getUserStats")),
+                       ("getGamesHistory", sqlite_history)):
+        results[kind] = {"sqlite": _timed(sample, cold), "redis": _timed(sample, redis_call(kind))}
+    conn.close()
+    return results
+
+def print_report(users, written, seconds, memory_before, memory_after, usage, latencies):
+    keys = sum(count for count, _ in written.values())
+    print(f"\n== warmed {len(users)} users: {keys} keys in {seconds:.2f}s ({keys / max(seconds, 1e-9):.0f} keys/s)")
+    print(f"{'key':<22} {'keys':>8} {'payload B':>10} {'memory B':>10}")
+    for kind, (count, size) in written.items():
+        print(f"{kind:<22} {count:>8} {size / max(count, 1):>10.0f} {usage[kind]:>10.0f}")
+    print(f"Redis used_memory {memory_before / 1e6:.1f} MB -> {memory_after / 1e6:.1f} MB "
+          f"(+{(memory_after - memory_before) / 1e6:.1f} MB)")
+    if latencies:
+        print(f"\n{'call':<22} {'sqlite p50':>11} {'p95 ms':>8} {'redis p50':>10} {'p95 ms':>8}")
+        for kind, result in latencies.items():
+            print(f"{kind:<22} {result['sqlite'][0]:>11.3f} {result['sqlite'][1]:>8.3f} "
+                  f"{result['redis'][0]:>10.3f} {result['redis'][1]:>8.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the Redis cache of profile, stats and history responses")
+    parser.add_argument("--database", default=os.environ.get("DB_PATH", "/usr/src/app/db/mydatabase.db"),
+                        help="SQLite database (default: $DB_PATH or %(default)s)")
+    parser.add_argument("--url", default=os.environ.get("REDIS_URL", "redis://localhost:6380"),
+                        help="Redis URL (default: $REDIS_URL or %(default)s)")
+    parser.add_argument("--db", type=int, default=0, help="Redis logical database (default: %(default)s)")
+    parser.add_argument("--users", type=int, default=10000, help="most active users to warm (default: %(default)s)")
+    parser.add_argument("--days", type=float, default=30,
+                        help="rank users by their games in this many days (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=HISTORY_LIMIT,
+                        help="history page size, as the client requests it (default: %(default)s)")
+    parser.add_argument("--ttl", type=int, default=900, help="seconds the keys live (default: %(default)s)")
+    parser.add_argument("--jitter", type=int, default=120,
+                        help="up to this many seconds added to every TTL (default: %(default)s)")
+    parser.add_argument("--pipeline", type=int, default=1000,
+                        help="commands per pipeline round trip (default: %(default)s)")
+    parser.add_argument("--measure", type=int, default=0, metavar="N",
+                        help="afterwards time N SQLite calls against N Redis GETs per key kind")
+    parser.add_argument("--seed", type=int, default=0, help="seed for TTL jitter and samples (default: %(default)s)")
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"file:{args.database}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'game_players'").fetchone():
+        print("game_players is missing, run friends.py backfill-game-players first.")
+        sys.exit(1)
+    r = redis.Redis.from_url(args.url, db=args.db)
+
+    memory_before = r.info("memory")["used_memory"]
+    started_at = time.perf_counter()
+    # one snapshot for the ranking and every payload
+    conn.execute("BEGIN")
+    users = hot_users(conn, args.days, args.users)
+    written = warm(r, payloads(conn, users, args.limit), args.ttl, args.jitter,
+                   pipeline_size=args.pipeline, seed=args.seed)
+    conn.rollback()
+    seconds = time.perf_counter() - started_at
+    conn.close()
+    memory_after = r.info("memory")["used_memory"]
+
+    usage = memory_per_key(r, users, args.limit, seed=args.seed)
+    latencies = measure(args.database, r, users, args.measure, args.limit, args.seed) if args.measure and users else {}
+    print_report(users, written, seconds, memory_before, memory_after, usage, latencies)
+    if args.json:
+        with open(args.json, "a") as out:
+            out.write(json.dumps({"users": len(users), "seconds": seconds, "written": written,
+                                  "used_memory": [memory_before, memory_after], "memory_per_key": usage,
+                                  "latency_ms": latencies}) + "\n")
+
+if __name__ == "__main__":
+    main()
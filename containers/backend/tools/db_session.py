@@ -0,0 +1,117 @@
+"""SQLite connections tuned for seeding, with deferred secondary index builds"""
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import seed_profile
+
+
+MODES = ("bulk", "safe")
+
+PRAGMAS = {
+    # fastest load: no fsync, big cache, secondary indexes and triggers rebuilt once at the end
+    "bulk": [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = OFF",
+        "PRAGMA cache_size = -262144",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 30000",
+    ],
+    # for a database the backend is serving: durable commits, indexes left in place
+    "safe": [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = FULL",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 30000",
+        "PRAGMA analysis_limit = 1000",
+    ],
+}
+
+DEFERRED_OBJECTS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS seed_deferred_objects (
+        name TEXT PRIMARY KEY,
+        type TEXT NOT NULL,
+        sql TEXT NOT NULL
+    )
+"""
+
+
+def deferrable_objects(conn, tables):
+    """Explicitly created (droppable) indexes and triggers on the given tables"""
+    placeholders = ", ".join("?" * len(tables))
+    return conn.execute(
+        f"SELECT name, type, sql FROM sqlite_master WHERE type IN ('index', 'trigger') "
+        f"AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+        tuple(tables)
+    ).fetchall()
+
+def drop_deferred(conn, tables):
+    """Drop secondary indexes and triggers, remembering them so an interrupted run can still restore them"""
+    objects = deferrable_objects(conn, tables)
+    with conn:
+        conn.execute(DEFERRED_OBJECTS_SCHEMA)
+        conn.executemany("INSERT OR REPLACE INTO seed_deferred_objects (name, type, sql) VALUES (?, ?, ?)", objects)
+        for name, kind, _ in objects:
+            conn.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+    return [name for name, _, _ in objects]
+
+def restore_deferred(conn):
+    """Recreate every index and trigger dropped by drop_deferred"""
+    conn.execute(DEFERRED_OBJECTS_SCHEMA)
+    pending = conn.execute("SELECT name, type, sql FROM seed_deferred_objects").fetchall()
+    if not pending:
+        return
+    started_at = time.perf_counter()
+    with seed_profile.phase("session.rebuild_indexes"), conn:
+        for name, kind, sql in pending:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+            ).fetchone()
+            if not exists:
+                conn.execute(sql)
+            conn.execute("DELETE FROM seed_deferred_objects WHERE name = ?", (name,))
+    print(f"Rebuilt {len(pending)} indexes/triggers in {time.perf_counter() - started_at:.2f}s")
+
+def connect(db_path, mode="safe"):
+    # seeding hands the connection to a write_pipeline thread, one thread uses it at a time
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False,
+                           factory=seed_profile.connection_factory())
+    seed_profile.attach(conn)
+    for pragma in PRAGMAS[mode]:
+        conn.execute(pragma)
+    return conn
+
+@contextmanager
+def session(db_path, mode="bulk", defer=()):
+    """Yield a connection configured for mode.
+
+    In bulk mode the secondary indexes and triggers of the defer tables are
+    dropped for the load and rebuilt once when the session ends, so callers
+    must do the triggers' work themselves (see game_players.backfill). Both
+    modes finish with ANALYZE and PRAGMA optimize so the backend's query
+    planner has fresh statistics.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown session mode: {mode}")
+
+    conn = connect(db_path, mode)
+    try:
+        # indexes and triggers left behind by an interrupted bulk load
+        restore_deferred(conn)
+        if mode == "bulk" and defer:
+            with seed_profile.phase("session.drop_indexes"):
+                drop_deferred(conn, defer)
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        restore_deferred(conn)
+        started_at = time.perf_counter()
+        with seed_profile.phase("session.analyze"):
+            conn.execute("ANALYZE")
+            conn.execute("PRAGMA optimize")
+        print(f"Analyzed database in {time.perf_counter() - started_at:.2f}s")
+        conn.close()
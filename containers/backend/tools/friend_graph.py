@@ -0,0 +1,90 @@
+"""In-memory friendship graph models used by friends.py to seed the friends table"""
+import random
+
+
+MODELS = ("regular", "powerlaw", "communities")
+
+def _pick_others(rng, n, k, exclude):
+    """Pick k distinct node indices in [0, n) other than exclude"""
+    picked = rng.sample(range(n - 1), k)
+    # shift indices at or above exclude so the node itself can never be picked
+    return {p + 1 if p >= exclude else p for p in picked}
+
+def regular_graph(n, k, rng):
+    """Every node gets exactly k friends chosen uniformly at random"""
+    return [_pick_others(rng, n, k, node) for node in range(n)]
+
+def powerlaw_graph(n, k, rng):
+    """Preferential attachment (Barabasi-Albert): each new node links to k existing ones"""
+    adjacency = [set() for _ in range(n)]
+    order = list(range(n))
+    rng.shuffle(order)
+
+    # every endpoint is appended once per edge, so sampling from it is degree-proportional
+    endpoints = []
+    seeds = order[:k + 1]
+    for i, a in enumerate(seeds):
+        for b in seeds[i + 1:]:
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+            endpoints += (a, b)
+
+    for node in order[k + 1:]:
+        targets = set()
+        while len(targets) < k:
+            targets.add(rng.choice(endpoints))
+        for target in targets:
+            adjacency[node].add(target)
+            adjacency[target].add(node)
+            endpoints += (node, target)
+
+    return adjacency
+
+def community_graph(n, k, rng, community_size=50, p_in=0.8):
+    """Nodes are split into communities and pick most of their k friends inside their own"""
+    order = list(range(n))
+    rng.shuffle(order)
+    communities = [order[i:i + community_size] for i in range(0, n, community_size)]
+
+    adjacency = [set() for _ in range(n)]
+    for members in communities:
+        for node in members:
+            friends = adjacency[node]
+            inside = min(len(members) - 1, sum(rng.random() < p_in for _ in range(k)))
+            while len(friends) < inside:
+                friend = rng.choice(members)
+                if friend != node:
+                    friends.add(friend)
+            while len(friends) < k:
+                friend = rng.randrange(n)
+                if friend != node:
+                    friends.add(friend)
+    return adjacency
+
+def build_graph(model, n, k, seed=None, mutual=False, **options):
+    """Return the adjacency (list of friend index sets) for n nodes"""
+    if k >= n:
+        raise ValueError(f"Cannot give {k} friends to each of {n} users")
+
+    rng = random.Random(seed)
+    if model == "regular":
+        adjacency = regular_graph(n, k, rng)
+    elif model == "powerlaw":
+        adjacency = powerlaw_graph(n, k, rng)
+    elif model == "communities":
+        adjacency = community_graph(n, k, rng, **options)
+    else:
+        raise ValueError(f"Unknown friendship model: {model}")
+
+    if mutual:
+        for node, friends in enumerate(adjacency):
+            for friend in friends:
+                adjacency[friend].add(node)
+    return adjacency
+
+def iter_edges(adjacency, ids):
+    """Yield (user_id, friend_id) rows, translating node indices to ids"""
+    for node, friends in enumerate(adjacency):
+        user_id = ids[node]
+        for friend in friends:
+            yield (user_id, ids[friend])
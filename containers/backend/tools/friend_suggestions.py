@@ -0,0 +1,253 @@
+"""friend_mutuals and friend_suggestions: mutual-friend counts and "people you may know", precomputed.
+
+friends is directed and may hold a friendship in one direction only, so
+counting mutual friends per request means self-joining friends, and a
+suggestion list means grouping every friend-of-a-friend. refresh() loads the
+graph into CSR arrays (a friendship in either direction counts), expands two
+hops per block of users with NumPy and writes:
+
+  friend_mutuals      (id_user, id_friend) -> friends in common, for every friendship
+  friend_suggestions  (id_user, position)  -> top-K non-friends by friends in common
+
+Triggers on friends log the endpoints of every added or removed edge to
+friend_changes once a first build exists. A refresh only recomputes the users
+whose counts can have changed: the endpoints and their current friends.
+"""
+import time
+
+import numpy as np
+
+import seed_profile
+import write_pipeline
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS friend_mutuals (
+        id_user INTEGER NOT NULL,
+        id_friend INTEGER NOT NULL,
+        mutual_friends INTEGER NOT NULL,
+        PRIMARY KEY (id_user, id_friend)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS friend_suggestions (
+        id_user INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        id_suggested INTEGER NOT NULL,
+        mutual_friends INTEGER NOT NULL,
+        PRIMARY KEY (id_user, position)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS friend_suggestion_builds (
+        id_build INTEGER PRIMARY KEY AUTOINCREMENT,
+        top_k INTEGER NOT NULL,
+        last_change INTEGER NOT NULL DEFAULT 0,
+        users INTEGER,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS friend_changes (
+        id_change INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        friend_id INTEGER NOT NULL
+    );
+
+    -- nothing to keep in step before the first build, so seeding friends pays only the EXISTS
+    CREATE TRIGGER IF NOT EXISTS trg_friends_changes_insert AFTER INSERT ON friends
+    WHEN EXISTS (SELECT 1 FROM friend_suggestion_builds)
+    BEGIN
+        INSERT INTO friend_changes (user_id, friend_id) VALUES (NEW.user_id, NEW.friend_id);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_friends_changes_delete AFTER DELETE ON friends
+    WHEN EXISTS (SELECT 1 FROM friend_suggestion_builds)
+    BEGIN
+        INSERT INTO friend_changes (user_id, friend_id) VALUES (OLD.user_id, OLD.friend_id);
+    END;
+"""
+
+# lookups for the backend, both a single primary key range scan
+SUGGESTIONS_SQL = """
+    SELECT fs.id_suggested, u.username, u.avatar_filename, u.avatar_type, fs.mutual_friends
+    FROM friend_suggestions fs
+    JOIN users u ON u.id_user = fs.id_suggested
+    WHERE fs.id_user = ?
+    ORDER BY fs.position
+    LIMIT ?
+"""
+MUTUAL_FRIENDS_SQL = "SELECT mutual_friends FROM friend_mutuals WHERE id_user = ? AND id_friend = ?"
+
+# the same answers computed per request from friends, a friendship in either direction counting,
+# for query_bench.py to compare against
+SUGGESTIONS_SELF_JOIN_SQL = """
+    WITH mine(id) AS (
+        SELECT friend_id FROM friends WHERE user_id = ?1
+        UNION SELECT user_id FROM friends WHERE friend_id = ?1
+    ),
+    hops(via, id) AS (
+        SELECT f.user_id, f.friend_id FROM mine JOIN friends f ON f.user_id = mine.id
+        UNION SELECT f.friend_id, f.user_id FROM mine JOIN friends f ON f.friend_id = mine.id
+    )
+    SELECT id, COUNT(*) AS mutual_friends
+    FROM hops
+    WHERE id != ?1 AND via != ?1 AND via != id AND id NOT IN mine
+    GROUP BY id
+    ORDER BY mutual_friends DESC, id
+    LIMIT ?2
+"""
+MUTUAL_FRIENDS_SELF_JOIN_SQL = """
+    WITH a(id) AS (
+        SELECT friend_id FROM friends WHERE user_id = ?1
+        UNION SELECT user_id FROM friends WHERE friend_id = ?1
+    ),
+    b(id) AS (
+        SELECT friend_id FROM friends WHERE user_id = ?2
+        UNION SELECT user_id FROM friends WHERE friend_id = ?2
+    )
+    SELECT COUNT(*) FROM a JOIN b USING (id) WHERE id NOT IN (?1, ?2)
+"""
+
+DELETE_MUTUALS_SQL = "DELETE FROM friend_mutuals WHERE id_user = ?"
+DELETE_SUGGESTIONS_SQL = "DELETE FROM friend_suggestions WHERE id_user = ?"
+INSERT_MUTUALS_SQL = "INSERT INTO friend_mutuals (id_user, id_friend, mutual_friends) VALUES (?, ?, ?)"
+INSERT_SUGGESTIONS_SQL = """
+    INSERT INTO friend_suggestions (id_user, position, id_suggested, mutual_friends) VALUES (?, ?, ?, ?)
+"""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+def load_graph(conn):
+    """Sorted user ids and the undirected friendship graph over their indices as CSR (indptr, indices)"""
+    ids = np.array([row[0] for row in conn.execute("SELECT id_user FROM users ORDER BY id_user")], dtype=np.int64)
+    edges = np.array(conn.execute("SELECT user_id, friend_id FROM friends").fetchall(), dtype=np.int64).reshape(-1, 2)
+    n = len(ids)
+    if n == 0:
+        return ids, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # rows pointing at users that no longer exist are dropped
+    nodes = np.minimum(np.searchsorted(ids, edges), n - 1)
+    keep = (ids[nodes] == edges).all(axis=1) & (nodes[:, 0] != nodes[:, 1])
+    a, b = nodes[keep, 0], nodes[keep, 1]
+    pairs = np.unique(np.concatenate([a * n + b, b * n + a]))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs // n, minlength=n), out=indptr[1:])
+    return ids, indptr, pairs % n
+
+def _expand(indptr, indices, nodes):
+    """Neighbors of nodes, concatenated, and the position in nodes each neighbor came from"""
+    starts = indptr[nodes]
+    degrees = indptr[nodes + 1] - starts
+    origin = np.repeat(np.arange(len(nodes)), degrees)
+    offsets = np.arange(len(origin)) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    return origin, indices[np.repeat(starts, degrees) + offsets]
+
+def _blocks(indptr, indices, nodes, max_pairs):
+    """Split nodes (ascending) so each block expands to about max_pairs two-hop paths"""
+    degrees = np.diff(indptr)
+    origin, friends = _expand(indptr, indices, nodes)
+    paths = np.cumsum(np.bincount(origin, weights=degrees[friends], minlength=len(nodes)))
+    if len(paths) == 0:
+        return []
+    cuts = np.searchsorted(paths, np.arange(max_pairs, paths[-1], max_pairs), side="right")
+    return [block for block in np.split(nodes, np.unique(cuts)) if len(block)]
+
+def block_rows(ids, indptr, indices, block, top_k):
+    """friend_mutuals and friend_suggestions rows of the users at indices block (ascending)"""
+    n = len(ids)
+    origin, friends = _expand(indptr, indices, block)
+    owners = block[origin]
+    via, candidates = _expand(indptr, indices, friends)
+    hop_owners = owners[via]
+    keep = candidates != hop_owners
+    pairs, mutual = np.unique(hop_owners[keep] * n + candidates[keep], return_counts=True)
+    # a sentinel past every key, so each lookup below lands on a valid slot
+    pairs, mutual = np.append(pairs, n * n), np.append(mutual, 0)
+
+    friend_pairs = owners * n + friends
+    slot = np.searchsorted(pairs, friend_pairs)
+    found = pairs[slot] == friend_pairs
+    friend_mutual = np.where(found, mutual[slot], 0)
+
+    is_friend = np.zeros(len(pairs), dtype=bool)
+    is_friend[slot[found]] = True
+    is_friend[-1] = True
+    pairs, mutual = pairs[~is_friend], mutual[~is_friend]
+    user, candidate = pairs // n, pairs % n
+    # most friends in common first, lowest id on ties: pairs are already in (user, candidate)
+    # order, so a stable sort on one combined key does it, far faster than lexsort
+    most = mutual.max(initial=0)
+    order = np.argsort(user * (most + 1) + (most - mutual), kind="stable")
+    user, candidate, mutual = user[order], candidate[order], mutual[order]
+    position = np.arange(len(user)) - np.searchsorted(user, user)
+    top = position < top_k
+
+    mutual_rows = list(zip(ids[owners].tolist(), ids[friends].tolist(), friend_mutual.tolist()))
+    suggestion_rows = list(zip(ids[user[top]].tolist(), (position[top] + 1).tolist(),
+                               ids[candidate[top]].tolist(), mutual[top].tolist()))
+    return mutual_rows, suggestion_rows
+
+def _changed_users(conn, ids, indptr, indices, after, through):
+    """Indices of users whose rows a change in (after, through] can affect, and ids of deleted users"""
+    changed = np.array(conn.execute(
+        "SELECT user_id, friend_id FROM friend_changes WHERE id_change > ? AND id_change <= ?", (after, through)
+    ).fetchall(), dtype=np.int64).reshape(-1)
+    endpoints = np.unique(changed)
+    if len(ids) == 0:
+        return np.zeros(0, dtype=np.int64), endpoints
+    slot = np.minimum(np.searchsorted(ids, endpoints), len(ids) - 1)
+    known = ids[slot] == endpoints
+    touched = slot[known]
+    # an edge a-b changes the counts between a and every friend of b, and the other way around
+    _, neighbors = _expand(indptr, indices, touched)
+    return np.union1d(touched, neighbors), endpoints[~known]
+
+def refresh(conn, top_k=10, full=False, max_pairs=2000000):
+    """Recompute friend_mutuals and friend_suggestions for the users whose friends changed since the
+    last build, or for everyone with full (also the first build and after a top_k change)"""
+    ensure_schema(conn)
+    started_at = time.perf_counter()
+    last = conn.execute(
+        "SELECT top_k, last_change FROM friend_suggestion_builds WHERE finished_at IS NOT NULL "
+        "ORDER BY id_build DESC LIMIT 1"
+    ).fetchone()
+    # the build row turns the change log on before the graph is read, so edges added meanwhile are not lost
+    with conn:
+        id_build = conn.execute("INSERT INTO friend_suggestion_builds (top_k) VALUES (?)", (top_k,)).lastrowid
+    through = conn.execute("SELECT COALESCE(MAX(id_change), 0) FROM friend_changes").fetchone()[0]
+
+    with seed_profile.phase("suggestions.load"):
+        ids, indptr, indices = load_graph(conn)
+    full = full or last is None or last[0] != top_k
+    if full:
+        nodes, deleted = np.arange(len(ids)), np.zeros(0, dtype=np.int64)
+    else:
+        nodes, deleted = _changed_users(conn, ids, indptr, indices, last[1], through)
+    print(f"Loaded {len(ids)} users and {len(indices) // 2} friendships in {time.perf_counter() - started_at:.2f}s, "
+          f"refreshing {'every user' if full else f'{len(nodes)} users'}")
+
+    written = 0
+    with write_pipeline.BatchWriter(conn) as writer:
+        if len(deleted):
+            gone = [(user,) for user in deleted.tolist()]
+            writer.submit((DELETE_MUTUALS_SQL, gone), (DELETE_SUGGESTIONS_SQL, gone))
+        for block in _blocks(indptr, indices, nodes, max_pairs):
+            with seed_profile.phase("suggestions.compute"):
+                mutual_rows, suggestion_rows = block_rows(ids, indptr, indices, block, top_k)
+            users = [(user,) for user in ids[block].tolist()]
+            # each block replaces its users' rows in one transaction, readers see old or new lists
+            writer.submit((DELETE_MUTUALS_SQL, users), (DELETE_SUGGESTIONS_SQL, users),
+                          (INSERT_MUTUALS_SQL, mutual_rows), (INSERT_SUGGESTIONS_SQL, suggestion_rows))
+            written += len(mutual_rows) + len(suggestion_rows)
+
+    with conn:
+        if full:
+            for table in ("friend_mutuals", "friend_suggestions"):
+                conn.execute(f"DELETE FROM {table} WHERE id_user NOT IN (SELECT id_user FROM users)")
+        conn.execute("DELETE FROM friend_changes WHERE id_change <= ?", (through,))
+        conn.execute(
+            "UPDATE friend_suggestion_builds SET last_change = ?, users = ?, finished_at = CURRENT_TIMESTAMP "
+            "WHERE id_build = ?", (through, len(nodes), id_build)
+        )
+    return len(nodes), written
@@ -1,728 +1,772 @@
 #!/usr/bin/env python3
-import sqlite3
 import sys
 import os
 import bcrypt
-import random
+import time
 import json
-from datetime import datetime
-
-
-DB_PATH = "/usr/src/app/db/mydatabase.db"
-
-def create_users(n):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    for i in range(1, n + 1):
-        username = f"user{i}"
-        email = f"{username}@gmail.com"
-        plain_password = "Hola1234"
-        provider = "local"
-
-        hashed_password = bcrypt.hashpw(plain_password.encode('utf-8'), bcrypt.gensalt())
-
-        try:
-            c.execute(
-                """
-                INSERT INTO users (username, email, password, provider)
-                VALUES (?, ?, ?, ?)
-                """,
-                (username, email, hashed_password.decode('utf-8'), provider)
-            )
-            print(f"Created user: {username}")
-        except sqlite3.IntegrityError as e:
-            print(f"Error creating user {username}: {e}")
-
+import secrets
+import argparse
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+import numpy as np
+
+import db_session
+import friend_graph
+import friend_suggestions
+import game_archive
+import game_players
+import game_results
+import game_synth
+import game_timeline
+import leaderboard
+import pong_sim
+import seed_metrics
+import seed_profile
+import seed_progress
+import shard_seed
+import snapshot
+import stats_audit
+import tournament_engine
+import write_pipeline
+from stats_accumulator import UPSERT_STATS_SQL, StatsAccumulator
+
+
+DB_PATH = os.environ.get("DB_PATH", "/usr/src/app/db/mydatabase.db")
+
+DEFAULT_PASSWORD = "Hola1234"
+DEFAULT_BCRYPT_ROUNDS = 12
+BATCH_SIZE = 5000
+# seconds between the rounds of a seeded tournament
+TOURNAMENT_ROUND_GAP = 600
+
+def hash_password(rounds):
+    return bcrypt.hashpw(DEFAULT_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def generate_password_hashes(n, rounds=DEFAULT_BCRYPT_ROUNDS, workers=None, shared_hash=False):
+    """Yield n bcrypt hashes of the default password, hashed in a process pool"""
+    if shared_hash:
+        hashed_password = hash_password(rounds)
+        for _ in range(n):
+            yield hashed_password
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, min(256, n // (workers * 4)))
+        yield from pool.map(hash_password, repeat(rounds, n), chunksize=chunksize)
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def load_user_ids(c):
+    """Every id_user in ascending order as a compact int64 buffer (np.frombuffer views it without copying)"""
+    return array('q', (row[0] for row in c.execute("SELECT id_user FROM users ORDER BY id_user")))
+
+def print_summary(label, rows, started_at, skipped=0):
+    elapsed = time.perf_counter() - started_at
+    rate = rows / elapsed if elapsed > 0 else 0
+    extra = f", {skipped} skipped" if skipped else ""
+    print(f"{label}: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s{extra})")
+
+def lock_budget(yield_ms):
+    """The LockBudget of --yield-ms, None when seeding at full speed"""
+    return write_pipeline.LockBudget(yield_ms / 1000) if yield_ms else None
+
+def reserve_ids(conn, table, column, count):
+    """First of count ids of table for a run that assigns them itself.
+
+    The AUTOINCREMENT counter is moved past the range in the same write
+    transaction, so rows the backend saves while the run is going get ids
+    after it instead of colliding with a later batch.
+    """
     conn.commit()
-    conn.close()
-
-def create_friends(n):
-    conn = sqlite3.connect(DB_PATH)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        first_id = conn.execute(
+            f"SELECT MAX((SELECT COALESCE(MAX({column}), 0) FROM {table}), "
+            f"COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0)) + 1", (table,)
+        ).fetchone()[0]
+        last_id = first_id + count - 1
+        if not conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (last_id, table)).rowcount:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, last_id))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return first_id
+
+def write_user_stats(conn, stats, run, budget=None, batch_size=BATCH_SIZE):
+    """Upsert the run's user_stats and finish the run; returns the rows written.
+
+    With a budget the upsert is split into transactions of batch_size users,
+    each recording the last user it wrote, so a resumed run adds every
+    user's totals exactly once.
+    """
     c = conn.cursor()
-
-    c.execute("SELECT id_user FROM users ORDER BY id_user ASC")
-    users = [row[0] for row in c.fetchall()]
-
-    if len(users) < n + 1:
-        print(f"Error: Not enough users to create {n} friends per user.")
-        conn.close()
-        sys.exit(1)
-
-    for user_id in users:
-        friends_added = 0
-        for friend_id in users:
-            if friend_id == user_id:
-                continue  # no self-friend
-            # Check if friendship already exists
-            c.execute(
-                "SELECT 1 FROM friends WHERE user_id = ? AND friend_id = ?",
-                (user_id, friend_id)
-            )
-            if c.fetchone():
-                continue  # already friends
-            c.execute(
-                """
-                INSERT OR IGNORE INTO friends (user_id, friend_id)
-                VALUES (?, ?)
-                """,
-                (user_id, friend_id)
-            )
-            friends_added += 1
-            if friends_added >= n:
-                break
-
-        print(f"User {user_id} now has {friends_added} new friends.")
-
+    if budget is None:
+        stats.write(c)
+        run.finish(conn)
+        conn.commit()
+        return c.rowcount
+    written = 0
+    for chunk in chunked(stats.rows(after=run.state.get("stats_written", 0)), batch_size):
+        with budget.transaction(conn):
+            c.executemany(UPSERT_STATS_SQL, chunk)
+            c.executemany(*run.save("stats_written", chunk[-1][0]))
+        written += len(chunk)
+        budget.pause()
+    seed_metrics.add_rows("user_stats", written)
+    run.finish(conn)
     conn.commit()
+    budget.report("user_stats")
+    return written
+
+def create_users(n, rounds=DEFAULT_BCRYPT_ROUNDS, workers=None, shared_hash=False, batch_size=BATCH_SIZE,
+                 totp_secret=None, mode="bulk", resume=False, yield_ms=None):
+    with db_session.session(DB_PATH, mode, defer=()) as conn:
+        started_at = time.perf_counter()
+        run = seed_progress.Run.open(conn, "users", n, None, batch_size, resume=resume, options={
+            "rounds": rounds, "workers": workers, "shared_hash": shared_hash, "totp_secret": totp_secret})
+        start = run.batches_done * batch_size
+
+        def rows():
+            hashes = generate_password_hashes(n - start, rounds, workers, shared_hash)
+            for i, hashed_password in enumerate(hashes, start + 1):
+                username = f"user{i}"
+                yield (username, f"{username}@gmail.com", hashed_password, "local",
+                       totp_secret, 1 if totp_secret else 0)
+
+        budget = lock_budget(yield_ms)
+        with write_pipeline.BatchWriter(conn, budget=budget) as writer:
+            batches = seed_profile.timed_iter("users.hash", chunked(rows(), batch_size))
+            for index, batch in enumerate(batches, run.batches_done):
+                writer.submit((
+                    """
+                    INSERT OR IGNORE INTO users (username, email, password, provider, twoFactorSecret, twoFactorEnabled)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    batch
+                ), checkpoint=run.checkpoint(index))
+        if budget:
+            budget.report("users")
+        inserted = writer.changes
+        run.finish(conn)
+
+        print_summary("users", inserted, started_at, skipped=n - start - inserted)
+
+def create_friends(n, model="regular", seed=None, mutual=False, community_size=50,
+                   batch_size=BATCH_SIZE, mode="bulk", resume=False, yield_ms=None):
+    with db_session.session(DB_PATH, mode, defer=()) as conn:
+        started_at = time.perf_counter()
+        users = load_user_ids(conn.cursor())
+
+        if len(users) < n + 1:
+            print(f"Error: Not enough users to create {n} friends per user.")
+            sys.exit(1)
+
+        options = {"community_size": community_size} if model == "communities" else {}
+        with seed_profile.phase("friends.graph"):
+            adjacency = friend_graph.build_graph(model, len(users), n, seed=seed, mutual=mutual, **options)
+        degrees = [len(friends) for friends in adjacency]
+        print(f"Built {model} graph in {time.perf_counter() - started_at:.2f}s "
+              f"(friends per user: min {min(degrees)}, avg {sum(degrees) / len(degrees):.1f}, max {max(degrees)})")
+
+        run = seed_progress.Run.open(
+            conn, "friends", n, seed, batch_size, batches_total=-(-sum(degrees) // batch_size), resume=resume,
+            options={"model": model, "mutual": mutual, "community_size": community_size},
+            state={"users": len(users)}
+        )
+        if run.state["users"] != len(users):
+            raise SystemExit(f"users changed since the interrupted run ({run.state['users']} then, {len(users)} now)")
+
+        # the graph is rebuilt from the seed, so a resumed run only skips the committed edges
+        edges = islice(friend_graph.iter_edges(adjacency, users), run.batches_done * batch_size, None)
+        budget = lock_budget(yield_ms)
+        with write_pipeline.BatchWriter(conn, budget=budget) as writer:
+            batches = seed_profile.timed_iter("friends.edges", chunked(edges, batch_size))
+            for index, batch in enumerate(batches, run.batches_done):
+                writer.submit(("INSERT OR IGNORE INTO friends (user_id, friend_id) VALUES (?, ?)", batch),
+                              checkpoint=run.checkpoint(index))
+        if budget:
+            budget.report("friends")
+        inserted = writer.changes
+        run.finish(conn)
+
+        remaining = sum(degrees) - min(sum(degrees), run.batches_done * batch_size)
+        print_summary("friends", inserted, started_at, skipped=remaining - inserted)
+
+def create_games(n, seed=None, batch_size=BATCH_SIZE, months=6, skew=1.0, engine="synthetic", vs_ai=0.0,
+                 difficulty="medium", results="none", results_timeline=False, mode="bulk", resume=False,
+                 yield_ms=None):
+    with db_session.session(DB_PATH, mode, defer=("games",)) as conn:
+        c = conn.cursor()
+        started_at = time.perf_counter()
+
+        users = np.frombuffer(load_user_ids(c), dtype=np.int64)
+
+        if len(users) < 2:
+            print("Need at least 2 users to simulate games.")
+            sys.exit(1)
+
+        stats = StatsAccumulator(int(users.max()))
+        # game_results rows need the ids of their games up front
+        first_id = reserve_ids(conn, "games", "id_game", n) if results != "none" and not resume else next_id(c, "games", "id_game")
+        run = seed_progress.Run.open(conn, "games", n, seed, batch_size, resume=resume,
+                                     options={"months": months, "skew": skew, "engine": engine,
+                                              "vs_ai": vs_ai, "difficulty": difficulty,
+                                              "results": results, "results_timeline": results_timeline},
+                                     state={"first_id": first_id, "users": len(users),
+                                            "timeline_end": int(time.time())})
+        if run.state["users"] != len(users):
+            raise SystemExit(f"users changed since the interrupted run ({run.state['users']} then, {len(users)} now)")
+        timeline = game_timeline.Timeline(run.state["timeline_end"], months)
+        activity = game_timeline.activity_weights(np.random.default_rng(run.seed), len(users), skew)
+        if engine == "simulated":
+            skill = pong_sim.player_skills(np.random.default_rng(run.seed), int(users.max()))
+            bot_id = butibot_id(c) if vs_ai else None
+        names = game_results.load_usernames(c) if results != "none" else None
+
+        budget = lock_budget(yield_ms)
+        # rows are materialized here so the writer thread only runs SQLite
+        with write_pipeline.BatchWriter(conn, budget=budget) as writer:
+            for index, offset in enumerate(range(0, n, batch_size)):
+                rng = run.rng(index)
+                size = min(batch_size, n - offset)
+                with seed_profile.phase(f"games.{engine}"):
+                    player1_ids, player2_ids = game_synth.random_pairs(rng, users, size, activity)
+                    if engine == "simulated":
+                        against_bot = (rng.random(size) < vs_ai) & (player1_ids != bot_id)
+                        if vs_ai:
+                            player2_ids[against_bot] = bot_id
+                        games = pong_sim.simulated_games(rng, player1_ids, player2_ids, skill, against_bot, difficulty)
+                    else:
+                        games = game_synth.synthesize_games(rng, player1_ids, player2_ids)
+                    # batch i covers the i-th slice of the traffic, so rows go in oldest first
+                    game_timeline.stamp(rng, games, timeline.sample(rng, offset / n, (offset + size) / n, size))
+                # committed batches are regenerated only for their user_stats, written once at the end
+                if run.pending(index) and names is not None:
+                    # game_results rows reference the games, so the batch gets its ids up front
+                    first_id = run.state["first_id"] + offset
+                    with seed_profile.phase("games.rows"):
+                        rows = list(game_synth.game_rows(games, first_id=first_id))
+                    with seed_profile.phase("games.results"):
+                        payloads = game_results.rows(rng, games, first_id, names, results, results_timeline)
+                    writer.submit((game_synth.INSERT_GAME_WITH_ID_SQL, rows), (game_results.INSERT_SQL, payloads),
+                                  checkpoint=run.checkpoint(index))
+                elif run.pending(index):
+                    with seed_profile.phase("games.rows"):
+                        rows = list(game_synth.game_rows(games))
+                    writer.submit((game_synth.INSERT_GAME_SQL, rows), checkpoint=run.checkpoint(index))
+                with seed_profile.phase("games.stats"):
+                    stats.add_games(games)
+        if budget:
+            budget.report("games")
+        print_summary("games", n, started_at)
+
+        if mode == "bulk":
+            fill_game_players(conn, run.state["first_id"])
+
+        started_at = time.perf_counter()
+        with seed_profile.phase("user_stats.write"):
+            written = write_user_stats(conn, stats, run, budget, batch_size)
+        print_summary("user_stats", written, started_at)
+
+def butibot_id(c):
+    row = c.execute("SELECT id_user FROM users WHERE username = 'ButiBot'").fetchone()
+    if row is None:
+        raise SystemExit("ButiBot is missing, run init_db.sh first")
+    return row[0]
+
+def ensure_schema(tournaments=False):
+    """Tables and triggers the game actions write to that older databases may lack.
+
+    Only the actions that fill game_players create it, with its triggers on
+    games, so an existing game_players always covers every game; the
+    maintenance actions create their own tables.
+    """
+    conn = db_session.connect(DB_PATH)
+    if tournaments:
+        conn.executescript(tournament_engine.TOURNAMENT_SCHEMA)
+    game_players.ensure_schema(conn)
     conn.close()
 
-def create_games(n):
-    conn = sqlite3.connect(DB_PATH)
+def fill_game_players(conn, first_id):
+    """Bulk sessions drop the games triggers, so add the participation rows ourselves"""
+    started_at = time.perf_counter()
+    with seed_profile.phase("game_players.fill"):
+        inserted = game_players.backfill(conn, from_id=first_id - 1, chunk_size=250000)
+    print_summary("game_players", inserted, started_at)
+
+def backfill_game_players(from_id=0, chunk_size=50000, mode="safe"):
+    with db_session.session(DB_PATH, mode) as conn:
+        started_at = time.perf_counter()
+        inserted = game_players.backfill(conn, from_id=from_id, chunk_size=chunk_size)
+        print_summary("game_players", inserted, started_at)
+
+def refresh_suggestions(top_k=10, full=False, mode="safe"):
+    with db_session.session(DB_PATH, mode) as conn:
+        started_at = time.perf_counter()
+        users, rows = friend_suggestions.refresh(conn, top_k=top_k, full=full)
+        print_summary("friend_mutuals + friend_suggestions", rows, started_at)
+        print(f"  {users} users refreshed")
+
+def refresh_leaderboard(min_games=10, block_size=1024, full=False, mode="safe"):
+    with db_session.session(DB_PATH, mode) as conn:
+        started_at = time.perf_counter()
+        users, _ = leaderboard.refresh(conn, min_games=min_games, block_size=block_size, full=full)
+        print_summary("leaderboard", users, started_at)
+
+def audit_stats(full=False, fix=False, chunk_size=250000, tolerance=0.01, show=10, mode="safe"):
+    with db_session.session(DB_PATH, mode) as conn:
+        stats_audit.audit(conn, full=full, fix=fix, chunk_size=chunk_size, tolerance=tolerance, show=show)
+
+def archive_games(archive_path=None, older_than=365, batch_size=5000, max_games=None, pause=0.05,
+                  vacuum_pages=2000, enable_vacuum=False, mode="safe"):
+    with db_session.session(DB_PATH, mode) as conn:
+        if enable_vacuum:
+            game_archive.enable_incremental_vacuum(conn)
+        game_archive.archive(conn, archive_path or game_archive.default_path(DB_PATH), older_than=older_than,
+                             batch_size=batch_size, max_games=max_games, pause=pause, vacuum_pages=vacuum_pages)
+
+def next_id(c, table, column):
+    c.execute(f"SELECT COALESCE(MAX({column}), 0) + 1 FROM {table}")
+    return c.fetchone()[0]
+
+def create_tournaments(n, min_size=2, max_size=8, seed=None, batch_size=1000, months=6, results="none",
+                       results_timeline=False, mode="bulk", resume=False, yield_ms=None):
+    with db_session.session(DB_PATH, mode, defer=("games", "tournament_participants")) as conn:
+        c = conn.cursor()
+        started_at = time.perf_counter()
+
+        users = np.frombuffer(load_user_ids(c), dtype=np.int64)
+
+        if len(users) < max(2, min_size):
+            print(f"Need at least {max(2, min_size)} users to create tournaments.")
+            sys.exit(1)
+        max_size = min(max_size, len(users))
+
+        stats = StatsAccumulator(int(users.max()))
+        # a resumed run continues after whatever the committed batches used
+        tournament_id = next_id(c, "tournaments", "id_tournament")
+        # games are inserted with explicit ids, so reserve them before the backend can save games in
+        # between batches; a field of k players plays k - 1 games
+        game_id = reserve_ids(conn, "games", "id_game", n * (max_size - 1))
+        run = seed_progress.Run.open(conn, "tournaments", n, seed, batch_size, resume=resume,
+                                     options={"min_size": min_size, "max_size": max_size, "months": months,
+                                              "results": results, "results_timeline": results_timeline},
+                                     state={"first_game_id": game_id, "users": len(users),
+                                            "timeline_end": int(time.time())})
+        if run.state["users"] != len(users):
+            raise SystemExit(f"users changed since the interrupted run ({run.state['users']} then, {len(users)} now)")
+        timeline = game_timeline.Timeline(run.state["timeline_end"], months)
+        totals = {"participants": 0, "games": 0}
+        names = game_results.load_usernames(c) if results != "none" else None
+
+        budget = lock_budget(yield_ms)
+        with write_pipeline.BatchWriter(conn, budget=budget) as writer:
+            for index, offset in enumerate(range(0, n, batch_size)):
+                rng = run.rng(index)
+                count = min(batch_size, n - offset)
+                with seed_profile.phase("tournaments.play"):
+                    sizes = rng.integers(min_size, max_size + 1, size=count)
+                    fields = [rng.choice(users, size, replace=False).tolist() for size in sizes.tolist()]
+                    winners, positions, rounds = tournament_engine.play_tournaments(rng, fields)
+                    tournament_ids = range(tournament_id, tournament_id + count)
+
+                    games = game_synth.concat_games([batch for _, _, batch in rounds])
+                    owners = np.concatenate([owners for _, owners, _ in rounds])
+                    round_numbers = np.concatenate([np.full(len(owners_), number) for number, owners_, _ in rounds])
+
+                    # rounds start TOURNAMENT_ROUND_GAP apart; games are inserted in start order
+                    starts = timeline.sample(rng, offset / n, (offset + count) / n, count)
+                    game_starts = starts[owners] + (round_numbers - 1) * TOURNAMENT_ROUND_GAP
+                    order = np.argsort(game_starts, kind='stable')
+                    games = game_timeline.stamp(rng, game_synth.take(games, order), game_starts[order])
+                    owners, round_numbers = owners[order].tolist(), round_numbers[order].tolist()
+
+                with seed_profile.phase("tournaments.stats"):
+                    stats.add_games(games)
+                    for field, winner in zip(fields, winners):
+                        stats.add_tournament(field, winner)
+                totals["participants"] += int(sizes.sum())
+                totals["games"] += len(owners)
+                # committed batches are regenerated only for their user_stats
+                if not run.pending(index):
+                    continue
+
+                # one transaction per batch; rows are built now because the ids below move on
+                with seed_profile.phase("tournaments.rows"):
+                    statements = (
+                        ("INSERT INTO tournaments (id_tournament, name, status, size, winner_id, created_at) "
+                         "VALUES (?, ?, 'finished', ?, ?, ?)",
+                         [(tid, f"Tournament {tid}", len(field), winner, created_at)
+                          for tid, field, winner, created_at
+                          in zip(tournament_ids, fields, winners, game_timeline.to_text(starts))]),
+                        ("INSERT INTO tournament_participants (id_tournament, id_user, is_ai, final_position) VALUES (?, ?, 0, ?)",
+                         [(tid, user_id, position)
+                          for tid, field_positions in zip(tournament_ids, positions)
+                          for user_id, position in field_positions.items()]),
+                        (game_synth.INSERT_GAME_WITH_ID_SQL, list(game_synth.game_rows(games, first_id=game_id))),
+                        ("INSERT INTO tournament_games (id_tournament, id_game, round) VALUES (?, ?, ?)",
+                         [(tournament_id + t, game_id + i, number)
+                          for i, (t, number) in enumerate(zip(owners, round_numbers))]),
+                    )
+                if names is not None:
+                    with seed_profile.phase("tournaments.results"):
+                        statements += ((game_results.INSERT_SQL,
+                                        game_results.rows(rng, games, game_id, names, results, results_timeline)),)
+                writer.submit(*statements, checkpoint=run.checkpoint(index))
+                tournament_id += count
+                game_id += len(owners)
+
+        if budget:
+            budget.report("tournaments")
+        print_summary("tournaments", n, started_at)
+        print(f"  {totals['participants']} participants, {totals['games']} games")
+
+        if mode == "bulk":
+            fill_game_players(conn, run.state["first_game_id"])
+
+        started_at = time.perf_counter()
+        with seed_profile.phase("user_stats.write"):
+            written = write_user_stats(conn, stats, run, budget, batch_size)
+        print_summary("user_stats", written, started_at)
+
+def create_parallel(n, games=0, shards=None, rounds=DEFAULT_BCRYPT_ROUNDS, shared_hash=False, seed=None,
+                    batch_size=BATCH_SIZE, months=6, skew=1.0, mode="bulk"):
+    """Seed n more users and their games in shard databases built by worker processes"""
+    shards = max(1, min(shards or os.cpu_count() or 1, n))
+    conn = db_session.connect(DB_PATH)
     c = conn.cursor()
-
-    # Get all users
-    c.execute("SELECT id_user FROM users")
-    users = [row[0] for row in c.fetchall()]
-
-    if len(users) < 2:
-        print("Need at least 2 users to simulate games.")
-        conn.close()
-        sys.exit(1)
-    
-    smart_contract_link = "https://testnet.snowtrace.io/address/0x7f053C63bF897AA9Dc1373158051F1fDbB4a5BC6/contract/43113/readContract?chainid=43113"
-    contract_address = "0x7f053C63bF897AA9Dc1373158051F1fDbB4a5BC6"
-
-
-    for _ in range(n):
-        # Randomly pick two distinct players
-        player1_id, player2_id = random.sample(users, 2)
-
-        # Random game mode
-        game_modes = ['online', 'tournament']
-        game_mode = random.choice(game_modes)
-
-        # Simulate game stats
-        player1_score = random.randint(0, 10)
-        player2_score = random.randint(0, 10)
-
-        if player1_score > player2_score:
-            winner_id = player1_id
-            general_result = 'leftWin'
-            player1_result = 'win'
-            player2_result = 'lose'
-        elif player2_score > player1_score:
-            winner_id = player2_id
-            general_result = 'rightWin'
-            player1_result = 'lose'
-            player2_result = 'win'
-        else:
-            winner_id = None
-            general_result = 'draw'
-            player1_result = 'draw'
-            player2_result = 'draw'
-
-        # Simulated hits and powerups (random reasonable values)
-        player1_hits = random.randint(0, 20)
-        player2_hits = random.randint(0, 20)
-
-        player1_goals_in_favor = player1_score
-        player2_goals_in_favor = player2_score
-
-        player1_goals_against = player2_score
-        player2_goals_against = player1_score
-
-        player1_powerups_picked = random.randint(0, 5)
-        player2_powerups_picked = random.randint(0, 5)
-
-        player1_powerdowns_picked = random.randint(0, 3)
-        player2_powerdowns_picked = random.randint(0, 3)
-
-        player1_ballchanges_picked = random.randint(0, 2)
-        player2_ballchanges_picked = random.randint(0, 2)
-
-        # Ball usage and special items usage set to random 0-3
-        ball_usage_keys = [
-            'default_balls_used', 'curve_balls_used', 'multiply_balls_used',
-            'spin_balls_used', 'burst_balls_used'
-        ]
-        special_items_keys = [
-            'bullets_used', 'shields_used'
-        ]
-        wall_elements_keys = [
-            'pyramids_used', 'escalators_used', 'hourglasses_used', 'lightnings_used',
-            'maws_used', 'rakes_used', 'trenches_used', 'kites_used', 'bowties_used',
-            'honeycombs_used', 'snakes_used', 'vipers_used', 'waystones_used'
-        ]
-
-        ball_usage = {k: random.randint(0, 3) for k in ball_usage_keys}
-        special_items = {k: random.randint(0, 2) for k in special_items_keys}
-        wall_elements = {k: random.randint(0, 1) for k in wall_elements_keys}
-
-        # game config JSON (simplified)
-        config = {
-            "difficulty": random.choice(["easy", "medium", "hard"]),
-            "time_limit": random.choice([300, 600, 900]),
-        }
-        config_json = json.dumps(config)
-
-        # Insert game record - Fixed parameter count
-        c.execute("""
-            INSERT INTO games (
-                player1_id, player2_id, winner_id,
-                player1_score, player2_score,
-                game_mode, general_result,
-                config_json, smart_contract_link, contract_address,
-                default_balls_used, curve_balls_used, multiply_balls_used,
-                spin_balls_used, burst_balls_used,
-                bullets_used, shields_used,
-                pyramids_used, escalators_used, hourglasses_used,
-                lightnings_used, maws_used, rakes_used,
-                trenches_used, kites_used, bowties_used,
-                honeycombs_used, snakes_used, vipers_used,
-                waystones_used,
-                player1_hits, player1_goals_in_favor, player1_goals_against,
-                player1_powerups_picked, player1_powerdowns_picked, player1_ballchanges_picked,
-                player1_result,
-                player2_hits, player2_goals_in_favor, player2_goals_against,
-                player2_powerups_picked, player2_powerdowns_picked, player2_ballchanges_picked,
-                player2_result,
-                ended_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            player1_id, player2_id, winner_id,
-            player1_score, player2_score,
-            game_mode, general_result,
-            config_json, smart_contract_link, contract_address,
-            ball_usage['default_balls_used'], ball_usage['curve_balls_used'], ball_usage['multiply_balls_used'],
-            ball_usage['spin_balls_used'], ball_usage['burst_balls_used'],
-            special_items['bullets_used'], special_items['shields_used'],
-            wall_elements['pyramids_used'], wall_elements['escalators_used'], wall_elements['hourglasses_used'],
-            wall_elements['lightnings_used'], wall_elements['maws_used'], wall_elements['rakes_used'],
-            wall_elements['trenches_used'], wall_elements['kites_used'], wall_elements['bowties_used'],
-            wall_elements['honeycombs_used'], wall_elements['snakes_used'], wall_elements['vipers_used'],
-            wall_elements['waystones_used'],
-            player1_hits, player1_goals_in_favor, player1_goals_against,
-            player1_powerups_picked, player1_powerdowns_picked, player1_ballchanges_picked,
-            player1_result,
-            player2_hits, player2_goals_in_favor, player2_goals_against,
-            player2_powerups_picked, player2_powerdowns_picked, player2_ballchanges_picked,
-            player2_result,
-            datetime.now().isoformat(" ", "seconds")
-        ))
-
-        game_id = c.lastrowid
-
-        # Update user_stats for player1
-        update_user_stats(c, player1_id,
-                          win=player1_result == 'win',
-                          loss=player1_result == 'lose',
-                          draw=player1_result == 'draw',
-                          hits=player1_hits,
-                          goals_scored=player1_goals_in_favor,
-                          goals_conceded=player1_goals_against,
-                          powerups=player1_powerups_picked,
-                          powerdowns=player1_powerdowns_picked,
-                          ballchanges=player1_ballchanges_picked,
-                          ball_usage={k.replace('_used', ''): ball_usage[k] for k in ball_usage},
-                          special_items={k.replace('_used', ''): special_items[k] for k in special_items},
-                          wall_elements={k.replace('_used', ''): wall_elements[k] for k in wall_elements},
-                          score=player1_score
-                          )
-
-        # Update user_stats for player2
-        update_user_stats(c, player2_id,
-                          win=player2_result == 'win',
-                          loss=player2_result == 'lose',
-                          draw=player2_result == 'draw',
-                          hits=player2_hits,
-                          goals_scored=player2_goals_in_favor,
-                          goals_conceded=player2_goals_against,
-                          powerups=player2_powerups_picked,
-                          powerdowns=player2_powerdowns_picked,
-                          ballchanges=player2_ballchanges_picked,
-                          ball_usage={k.replace('_used', ''): ball_usage[k] for k in ball_usage},
-                          special_items={k.replace('_used', ''): special_items[k] for k in special_items},
-                          wall_elements={k.replace('_used', ''): wall_elements[k] for k in wall_elements},
-                          score=player2_score
-                          )
-
-        print(f"Created game {game_id} between user {player1_id} and user {player2_id}")
-
-    conn.commit()
+    c.execute("SELECT COALESCE(MAX(CAST(SUBSTR(username, 5) AS INTEGER)), 0) + 1 FROM users WHERE username GLOB 'user[0-9]*'")
+    first_user = c.fetchone()[0]
+    first_user_id = next_id(c, "users", "id_user")
+    first_game_id = next_id(c, "games", "id_game")
+    schema = shard_seed.shard_schema(conn)
     conn.close()
 
-def update_user_stats(c, user_id, win=False, loss=False, draw=False,
-                      hits=0, goals_scored=0, goals_conceded=0,
-                      powerups=0, powerdowns=0, ballchanges=0,
-                      ball_usage=None, special_items=None, wall_elements=None,
-                      score=0):
-
-    ball_usage = ball_usage or {}
-    special_items = special_items or {}
-    wall_elements = wall_elements or {}
-
-    # Check if user_stats row exists
-    c.execute("SELECT id_user FROM user_stats WHERE id_user = ?", (user_id,))
-    if not c.fetchone():
-        # Insert default stats row for user
-        c.execute("""
-            INSERT INTO user_stats (
-                id_user,
-                wins, losses, draws,
-                total_hits, total_goals_scored, total_goals_conceded,
-                total_powerups_picked, total_powerdowns_picked, total_ballchanges_picked,
-                total_default_balls, total_curve_balls, total_multiply_balls,
-                total_spin_balls, total_burst_balls,
-                total_bullets, total_shields,
-                total_pyramids, total_escalators, total_hourglasses,
-                total_lightnings, total_maws, total_rakes,
-                total_trenches, total_kites, total_bowties,
-                total_honeycombs, total_snakes, total_vipers,
-                total_waystones,
-                highest_score
-            ) VALUES (?, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
-        """, (user_id,))
-
-    # Update stats accordingly
-    update_query = """
-        UPDATE user_stats SET
-            wins = wins + ?,
-            losses = losses + ?,
-            draws = draws + ?,
-            total_hits = total_hits + ?,
-            total_goals_scored = total_goals_scored + ?,
-            total_goals_conceded = total_goals_conceded + ?,
-            total_powerups_picked = total_powerups_picked + ?,
-            total_powerdowns_picked = total_powerdowns_picked + ?,
-            total_ballchanges_picked = total_ballchanges_picked + ?,
-            total_default_balls = total_default_balls + ?,
-            total_curve_balls = total_curve_balls + ?,
-            total_multiply_balls = total_multiply_balls + ?,
-            total_spin_balls = total_spin_balls + ?,
-            total_burst_balls = total_burst_balls + ?,
-            total_bullets = total_bullets + ?,
-            total_shields = total_shields + ?,
-            total_pyramids = total_pyramids + ?,
-            total_escalators = total_escalators + ?,
-            total_hourglasses = total_hourglasses + ?,
-            total_lightnings = total_lightnings + ?,
-            total_maws = total_maws + ?,
-            total_rakes = total_rakes + ?,
-            total_trenches = total_trenches + ?,
-            total_kites = total_kites + ?,
-            total_bowties = total_bowties + ?,
-            total_honeycombs = total_honeycombs + ?,
-            total_snakes = total_snakes + ?,
-            total_vipers = total_vipers + ?,
-            total_waystones = total_waystones + ?,
-            highest_score = MAX(highest_score, ?),
-            total_games = total_games + 1,
-            win_rate = CASE 
-                WHEN (wins + losses + draws + 1) > 0 
-                THEN CAST((wins + ?) AS FLOAT) / (wins + losses + draws + 1) 
-                ELSE 0 
-            END,
-            average_score = CASE 
-                WHEN total_games > 0 
-                THEN (average_score * total_games + ?) / (total_games + 1) 
-                ELSE ? 
-            END,
-            goals_per_game = CASE 
-                WHEN total_games > 0 
-                THEN CAST(total_goals_scored + ? AS FLOAT) / (total_games + 1) 
-                ELSE ? 
-            END,
-            hits_per_game = CASE 
-                WHEN total_games > 0 
-                THEN CAST(total_hits + ? AS FLOAT) / (total_games + 1) 
-                ELSE ? 
-            END,
-            powerups_per_game = CASE 
-                WHEN total_games > 0 
-                THEN CAST(total_powerups_picked + ? AS FLOAT) / (total_games + 1) 
-                ELSE ? 
-            END,
-            last_updated = CURRENT_TIMESTAMP
-        WHERE id_user = ?
-    """
-
-    values = (
-        1 if win else 0,
-        1 if loss else 0,
-        1 if draw else 0,
-        hits,
-        goals_scored,
-        goals_conceded,
-        powerups,
-        powerdowns,
-        ballchanges,
-        ball_usage.get('default_balls', 0),
-        ball_usage.get('curve_balls', 0),
-        ball_usage.get('multiply_balls', 0),
-        ball_usage.get('spin_balls', 0),
-        ball_usage.get('burst_balls', 0),
-        special_items.get('bullets', 0),
-        special_items.get('shields', 0),
-        wall_elements.get('pyramids', 0),
-        wall_elements.get('escalators', 0),
-        wall_elements.get('hourglasses', 0),
-        wall_elements.get('lightnings', 0),
-        wall_elements.get('maws', 0),
-        wall_elements.get('rakes', 0),
-        wall_elements.get('trenches', 0),
-        wall_elements.get('kites', 0),
-        wall_elements.get('bowties', 0),
-        wall_elements.get('honeycombs', 0),
-        wall_elements.get('snakes', 0),
-        wall_elements.get('vipers', 0),
-        wall_elements.get('waystones', 0),
-        score,  # for highest_score MAX comparison
-        1 if win else 0,  # for win_rate calculation
-        score,  # for average_score calculation
-        score,  # for average_score fallback
-        goals_scored,  # for goals_per_game calculation
-        goals_scored,  # for goals_per_game fallback
-        hits,  # for hits_per_game calculation
-        hits,  # for hits_per_game fallback
-        powerups,  # for powerups_per_game calculation
-        powerups,  # for powerups_per_game fallback
-        user_id
-    )
-
-    c.execute(update_query, values)
-
-def create_tournaments(n):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    # Get all users
-    c.execute("SELECT id_user FROM users")
-    users = [row[0] for row in c.fetchall()]
-
-    if len(users) < 2:
-        print("Need at least 2 users to create tournaments.")
-        conn.close()
-        sys.exit(1)
-
-    for tournament_num in range(1, n + 1):
-        # Determine tournament size (2, 4, or 8 players)
-        available_sizes = []
-        if len(users) >= 2:
-            available_sizes.append(2)
-        if len(users) >= 4:
-            available_sizes.append(4)
-        if len(users) >= 8:
-            available_sizes.append(8)
-        
-        tournament_size = random.choice(available_sizes)
-        
-        # Create tournament
-        tournament_name = f"Tournament {tournament_num}"
-        c.execute("""
-            INSERT INTO tournaments (name, status)
-            VALUES (?, 'finished')
-        """, (tournament_name,))
-        
-        tournament_id = c.lastrowid
-        
-        # Select random participants
-        participants = random.sample(users, tournament_size)
-        
-        # Insert participants
-        for participant_id in participants:
-            c.execute("""
-                INSERT INTO tournament_participants (id_tournament, id_user, is_ai)
-                VALUES (?, ?, 0)
-            """, (tournament_id, participant_id))
-        
-        print(f"Created tournament {tournament_id}: {tournament_name} with {tournament_size} players")
-        
-        # Generate tournament games
-        tournament_games = generate_tournament_bracket(participants)
-        winner_id = None
-        
-        for round_num, round_games in enumerate(tournament_games, 1):
-            print(f"  Round {round_num}:")
-            round_winners = []
-            
-            for game in round_games:
-                player1_id, player2_id = game
-                
-                # Create game with tournament flag
-                game_id = create_tournament_game(c, tournament_id, player1_id, player2_id)
-                
-                # Get the winner from the created game
-                c.execute("SELECT winner_id FROM games WHERE id_game = ?", (game_id,))
-                game_winner_id = c.fetchone()[0]
-                
-                if game_winner_id:
-                    round_winners.append(game_winner_id)
-                    print(f"    Game {game_id}: User {player1_id} vs User {player2_id} - Winner: User {game_winner_id}")
-                else:
-                    # In case of draw, randomly pick winner for tournament progression
-                    game_winner_id = random.choice([player1_id, player2_id])
-                    round_winners.append(game_winner_id)
-                    print(f"    Game {game_id}: User {player1_id} vs User {player2_id} - Draw (Random winner: User {game_winner_id})")
-            
-            # Update participants for next round
-            participants = round_winners
-            
-            # If this is the final round, we have our winner
-            if len(participants) == 1:
-                winner_id = participants[0]
-        
-        # Update final positions
-        update_tournament_positions(c, tournament_id, participants, winner_id)
-        
-        # Update user tournament stats
-        update_tournament_stats(c, tournament_id, winner_id)
-        
-        print(f"  Tournament {tournament_id} completed! Winner: User {winner_id}\n")
-
-    conn.commit()
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(DB_PATH))) as tmp:
+        started_at = time.perf_counter()
+        plan = shard_seed.plan_shards(
+            n, games, shards, first_user, first_user_id, first_game_id, seed, tmp, schema,
+            password=DEFAULT_PASSWORD, rounds=rounds, batch_size=batch_size,
+            timeline=game_timeline.Timeline(months=months), skew=skew,
+            shared_hash=hash_password(rounds) if shared_hash else None,
+        )
+        with seed_profile.phase("parallel.shards"), ProcessPoolExecutor(max_workers=shards) as pool:
+            for index, users, shard_games, elapsed in pool.map(shard_seed.build_shard, plan):
+                print(f"  shard {index}: {users} users, {shard_games} games in {elapsed:.2f}s")
+        print_summary(f"shards ({shards} workers)", n + games, started_at)
+
+        with db_session.session(DB_PATH, mode, defer=("games",)) as conn:
+            started_at = time.perf_counter()
+            # the shards commit one at a time, so reserve the whole ranges first: rows the backend
+            # wrote since planning push them up, rows it writes during the merge land after them
+            user_delta = reserve_ids(conn, "users", "id_user", n) - first_user_id
+            game_delta = reserve_ids(conn, "games", "id_game", games) - first_game_id
+            with seed_profile.phase("parallel.merge"):
+                stats = sum(shard_seed.merge_shard(conn, shard, user_delta, game_delta) for shard in plan)
+            print_summary("merge", n + games, started_at)
+            print(f"  users user{first_user}..user{first_user + n - 1}, {stats} user_stats upserts")
+
+def record_run(action, number, seed, options):
+    """Remember how the dataset was built, snapshots copy this into their manifest"""
+    conn = db_session.connect(DB_PATH)
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS seed_runs (
+                id_run INTEGER PRIMARY KEY AUTOINCREMENT,
+                action TEXT NOT NULL,
+                number INTEGER,
+                seed INTEGER,
+                options TEXT,
+                finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute(
+            "INSERT INTO seed_runs (action, number, seed, options) VALUES (?, ?, ?, ?)",
+            (action, number, seed, json.dumps(options))
+        )
     conn.close()
 
-def generate_tournament_bracket(participants):
-    """Generate tournament bracket games"""
-    current_round = participants[:]
-    all_rounds = []
-    
-    while len(current_round) > 1:
-        round_games = []
-        next_round = []
-        
-        # Pair up players for this round
-        for i in range(0, len(current_round), 2):
-            player1 = current_round[i]
-            player2 = current_round[i + 1]
-            round_games.append((player1, player2))
-        
-        all_rounds.append(round_games)
-        current_round = []  # Will be filled with winners
-        
-        # For bracket generation, we need to simulate who advances
-        # This will be determined when we actually create the games
-        break
-    
-    return all_rounds
-
-def create_tournament_game(c, tournament_id, player1_id, player2_id):
-    """Create a single tournament game"""
-    # Random game mode
-    game_modes = ['classic', 'arcade', 'time_attack']
-    game_mode = random.choice(game_modes)
-
-    # Simulate game stats
-    player1_score = random.randint(0, 10)
-    player2_score = random.randint(0, 10)
-
-    # Ensure no draws in tournament (except rarely)
-    if player1_score == player2_score and random.random() > 0.1:  # 10% chance of draw
-        player1_score += random.randint(1, 2)
-
-    if player1_score > player2_score:
-        winner_id = player1_id
-        general_result = 'leftWin'
-        player1_result = 'win'
-        player2_result = 'lose'
-    elif player2_score > player1_score:
-        winner_id = player2_id
-        general_result = 'rightWin'
-        player1_result = 'lose'
-        player2_result = 'win'
-    else:
-        winner_id = None
-        general_result = 'draw'
-        player1_result = 'draw'
-        player2_result = 'draw'
-
-    # Generate realistic stats for tournament games (slightly higher than regular games)
-    player1_hits = random.randint(5, 25)
-    player2_hits = random.randint(5, 25)
-
-    player1_goals_in_favor = player1_score
-    player2_goals_in_favor = player2_score
-    player1_goals_against = player2_score
-    player2_goals_against = player1_score
-
-    player1_powerups_picked = random.randint(1, 8)
-    player2_powerups_picked = random.randint(1, 8)
-    player1_powerdowns_picked = random.randint(0, 4)
-    player2_powerdowns_picked = random.randint(0, 4)
-    player1_ballchanges_picked = random.randint(0, 3)
-    player2_ballchanges_picked = random.randint(0, 3)
-
-    # Generate usage stats
-    ball_usage_keys = [
-        'default_balls_used', 'curve_balls_used', 'multiply_balls_used',
-        'spin_balls_used', 'burst_balls_used'
-    ]
-    special_items_keys = [
-        'bullets_used', 'shields_used'
-    ]
-    wall_elements_keys = [
-        'pyramids_used', 'escalators_used', 'hourglasses_used', 'lightnings_used',
-        'maws_used', 'rakes_used', 'trenches_used', 'kites_used', 'bowties_used',
-        'honeycombs_used', 'snakes_used', 'vipers_used', 'waystones_used'
-    ]
-
-    ball_usage = {k: random.randint(0, 5) for k in ball_usage_keys}
-    special_items = {k: random.randint(0, 3) for k in special_items_keys}
-    wall_elements = {k: random.randint(0, 2) for k in wall_elements_keys}
-
-    # Tournament game config
-    config = {
-        "difficulty": "hard",  # Tournament games are harder
-        "time_limit": 600,
-        "tournament_mode": True
-    }
-    config_json = json.dumps(config)
-
-    smart_contract_link = "https://testnet.snowtrace.io/address/0x7f053C63bF897AA9Dc1373158051F1fDbB4a5BC6/contract/43113/readContract?chainid=43113"
-    contract_address = "0x7f053C63bF897AA9Dc1373158051F1fDbB4a5BC6"
-
-    # Insert tournament game
-    c.execute("""
-        INSERT INTO games (
-            is_tournament,
-            player1_id, player2_id, winner_id,
-            player1_score, player2_score,
-            game_mode, general_result,
-            config_json,
-            smart_contract_link, contract_address,
-            default_balls_used, curve_balls_used, multiply_balls_used,
-            spin_balls_used, burst_balls_used,
-            bullets_used, shields_used,
-            pyramids_used, escalators_used, hourglasses_used,
-            lightnings_used, maws_used, rakes_used,
-            trenches_used, kites_used, bowties_used,
-            honeycombs_used, snakes_used, vipers_used,
-            waystones_used,
-            player1_hits, player1_goals_in_favor, player1_goals_against,
-            player1_powerups_picked, player1_powerdowns_picked, player1_ballchanges_picked,
-            player1_result,
-            player2_hits, player2_goals_in_favor, player2_goals_against,
-            player2_powerups_picked, player2_powerdowns_picked, player2_ballchanges_picked,
-            player2_result,
-            ended_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        1,  # is_tournament = True
-        player1_id, player2_id, winner_id,
-        player1_score, player2_score,
-        game_mode, general_result,
-        config_json,
-        smart_contract_link, contract_address,
-        ball_usage['default_balls_used'], ball_usage['curve_balls_used'], ball_usage['multiply_balls_used'],
-        ball_usage['spin_balls_used'], ball_usage['burst_balls_used'],
-        special_items['bullets_used'], special_items['shields_used'],
-        wall_elements['pyramids_used'], wall_elements['escalators_used'], wall_elements['hourglasses_used'],
-        wall_elements['lightnings_used'], wall_elements['maws_used'], wall_elements['rakes_used'],
-        wall_elements['trenches_used'], wall_elements['kites_used'], wall_elements['bowties_used'],
-        wall_elements['honeycombs_used'], wall_elements['snakes_used'], wall_elements['vipers_used'],
-        wall_elements['waystones_used'],
-        player1_hits, player1_goals_in_favor, player1_goals_against,
-        player1_powerups_picked, player1_powerdowns_picked, player1_ballchanges_picked,
-        player1_result,
-        player2_hits, player2_goals_in_favor, player2_goals_against,
-        player2_powerups_picked, player2_powerdowns_picked, player2_ballchanges_picked,
-        player2_result,
-        datetime.now().isoformat(" ", "seconds")
-    ))
-
-    game_id = c.lastrowid
-
-    # Update user stats for both players
-    update_user_stats(c, player1_id,
-                      win=player1_result == 'win',
-                      loss=player1_result == 'lose',
-                      draw=player1_result == 'draw',
-                      hits=player1_hits,
-                      goals_scored=player1_goals_in_favor,
-                      goals_conceded=player1_goals_against,
-                      powerups=player1_powerups_picked,
-                      powerdowns=player1_powerdowns_picked,
-                      ballchanges=player1_ballchanges_picked,
-                      ball_usage={k.replace('_used', ''): ball_usage[k] for k in ball_usage},
-                      special_items={k.replace('_used', ''): special_items[k] for k in special_items},
-                      wall_elements={k.replace('_used', ''): wall_elements[k] for k in wall_elements},
-                      score=player1_score)
-
-    update_user_stats(c, player2_id,
-                      win=player2_result == 'win',
-                      loss=player2_result == 'lose',
-                      draw=player2_result == 'draw',
-                      hits=player2_hits,
-                      goals_scored=player2_goals_in_favor,
-                      goals_conceded=player2_goals_against,
-                      powerups=player2_powerups_picked,
-                      powerdowns=player2_powerdowns_picked,
-                      ballchanges=player2_ballchanges_picked,
-                      ball_usage={k.replace('_used', ''): ball_usage[k] for k in ball_usage},
-                      special_items={k.replace('_used', ''): special_items[k] for k in special_items},
-                      wall_elements={k.replace('_used', ''): wall_elements[k] for k in wall_elements},
-                      score=player2_score)
-
-    return game_id
-
-def update_tournament_positions(c, tournament_id, final_participants, winner_id):
-    """Update final positions for tournament participants"""
-    # Winner gets position 1
-    c.execute("""
-        UPDATE tournament_participants 
-        SET final_position = 1 
-        WHERE id_tournament = ? AND id_user = ?
-    """, (tournament_id, winner_id))
-    
-    # Others get position based on when they were eliminated
-    # For simplicity, all others get position 2
-    c.execute("""
-        UPDATE tournament_participants 
-        SET final_position = 2 
-        WHERE id_tournament = ? AND id_user != ? AND final_position IS NULL
-    """, (tournament_id, winner_id))
-
-def update_tournament_stats(c, tournament_id, winner_id):
-    """Update tournament statistics for all participants"""
-    c.execute("""
-        SELECT id_user FROM tournament_participants 
-        WHERE id_tournament = ?
-    """, (tournament_id,))
-    
-    participants = [row[0] for row in c.fetchall()]
-    
-    for participant_id in participants:
-        is_winner = participant_id == winner_id
-        
-        c.execute("""
-            UPDATE user_stats SET
-                total_tournaments = total_tournaments + 1,
-                tournaments_won = tournaments_won + ?,
-                tournaments_lost = tournaments_lost + ?,
-                last_updated = CURRENT_TIMESTAMP
-            WHERE id_user = ?
-        """, (1 if is_winner else 0, 0 if is_winner else 1, participant_id))
+def build_parser():
+    parser = argparse.ArgumentParser(description="Seed the transcendence database with test data")
+    parser.add_argument("--profile", action="store_true",
+                        help="report time per phase and per SQL statement at the end (slows the run down)")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="also write a cProfile dump of the main thread to PATH and list its hottest functions")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics of the run on this port (scraped as job 'seeder' on 9105)")
+    parser.add_argument("--metrics-textfile", metavar="PATH",
+                        help="keep Prometheus metrics of the run in PATH for a node-exporter textfile collector")
+    parser.add_argument("--metrics-linger", type=float, default=10,
+                        help="seconds to keep serving metrics after the run so the last scrape sees it "
+                             "(default: %(default)s)")
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    def session_parser(default):
+        session = argparse.ArgumentParser(add_help=False)
+        session.add_argument("--mode", choices=db_session.MODES, default=default,
+                             help="bulk: fastest load, indexes rebuilt at the end; "
+                                  "safe: durable commits for a live database (default: %(default)s)")
+        return session
+
+    session = session_parser("bulk")
+    resumable = argparse.ArgumentParser(add_help=False)
+    resumable.add_argument("--resume", action="store_true",
+                           help="continue the last interrupted run of this action with its original options")
+    cooperative = argparse.ArgumentParser(add_help=False)
+    cooperative.add_argument("--yield-ms", type=float, default=None, metavar="MS",
+                             help="share the database with a live backend: take the write lock for one batch "
+                                  "at a time and leave it free after each, so the backend's saves wait about MS "
+                                  "at most (pick a --batch-size that commits within MS); implies --mode safe")
+    payloads = argparse.ArgumentParser(add_help=False)
+    payloads.add_argument("--results", choices=("none",) + game_results.ENCODINGS, default="none",
+                          help="also write a game_results document per game, as JSON text or deflated "
+                               "with a shared dictionary (about 6x smaller) (default: %(default)s)")
+    payloads.add_argument("--results-timeline", action="store_true",
+                          help="add an event timeline to every game_results document (about twice the size)")
+
+    users = actions.add_parser("users", parents=[session, resumable, cooperative], help="create user1..userN with the default password")
+    users.add_argument("number", type=int, nargs="?")
+    users.add_argument("--rounds", type=int, default=DEFAULT_BCRYPT_ROUNDS,
+                       help="bcrypt cost factor (default: %(default)s)")
+    users.add_argument("--workers", type=int, default=None,
+                       help="hashing processes (default: one per CPU)")
+    users.add_argument("--shared-hash", action="store_true",
+                       help="hash the password once and reuse it for every synthetic account")
+    users.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                       help="rows per executemany/transaction (default: %(default)s)")
+    users.add_argument("--totp-secret", default=None,
+                       help="base32 2FA secret to enable on every account, so load_driver.py can sign in")
+
+    friends = actions.add_parser("friends", parents=[session, resumable, cooperative], help="give every user N friends")
+    friends.add_argument("number", type=int, nargs="?")
+    friends.add_argument("--model", choices=friend_graph.MODELS, default="regular",
+                         help="graph model (default: %(default)s)")
+    friends.add_argument("--seed", type=int, default=None, help="random seed")
+    friends.add_argument("--mutual", action="store_true",
+                         help="store every friendship in both directions")
+    friends.add_argument("--community-size", type=int, default=50,
+                         help="users per community for the communities model (default: %(default)s)")
+    friends.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                         help="rows per executemany/transaction (default: %(default)s)")
+
+    games = actions.add_parser("games", parents=[session, resumable, cooperative, payloads], help="simulate N games between random users")
+    games.add_argument("number", type=int, nargs="?")
+    games.add_argument("--seed", type=int, default=None, help="random seed")
+    games.add_argument("--months", type=float, default=6,
+                       help="spread the games over this many months up to now (default: %(default)s)")
+    games.add_argument("--skew", type=float, default=1.0,
+                       help="player activity skew, 0 for uniform, higher for a few heavy players (default: %(default)s)")
+    games.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                       help="games per executemany/transaction (default: %(default)s)")
+    games.add_argument("--engine", choices=("synthetic", "simulated"), default="synthetic",
+                       help="draw stats at random, or play every match in the headless Pong engine "
+                            "(pong_sim.py; it plays a batch at once, about 130 matches/s per core at the default "
+                            "--batch-size, 20/s in batches of 500) (default: %(default)s)")
+    games.add_argument("--vs-ai", type=float, default=0.0,
+                       help="share of simulated games played against ButiBot (default: %(default)s)")
+    games.add_argument("--difficulty", choices=pong_sim.BUTIBOT, default="medium",
+                       help="ButiBot difficulty in simulated games (default: %(default)s)")
+
+    tournaments = actions.add_parser("tournaments", parents=[session, resumable, cooperative, payloads], help="play N single-elimination tournaments")
+    tournaments.add_argument("number", type=int, nargs="?")
+    tournaments.add_argument("--min-size", type=int, default=2,
+                             help="smallest field, byes fill the bracket (default: %(default)s)")
+    tournaments.add_argument("--max-size", type=int, default=8,
+                             help="largest field (default: %(default)s)")
+    tournaments.add_argument("--seed", type=int, default=None, help="random seed")
+    tournaments.add_argument("--months", type=float, default=6,
+                             help="spread the tournaments over this many months up to now (default: %(default)s)")
+    tournaments.add_argument("--batch-size", type=int, default=1000,
+                             help="tournaments per transaction (default: %(default)s)")
+
+    parallel = actions.add_parser("parallel", parents=[session],
+                                  help="seed N new users and their games in parallel shard databases")
+    parallel.add_argument("number", type=int)
+    parallel.add_argument("--games", type=int, default=0, help="games to simulate between the new users")
+    parallel.add_argument("--shards", type=int, default=None,
+                          help="worker processes and shard databases (default: one per CPU)")
+    parallel.add_argument("--rounds", type=int, default=DEFAULT_BCRYPT_ROUNDS,
+                          help="bcrypt cost factor (default: %(default)s)")
+    parallel.add_argument("--shared-hash", action="store_true",
+                          help="hash the password once and reuse it for every synthetic account")
+    parallel.add_argument("--months", type=float, default=6,
+                          help="spread the games over this many months up to now (default: %(default)s)")
+    parallel.add_argument("--skew", type=float, default=1.0,
+                          help="player activity skew, 0 for uniform (default: %(default)s)")
+    parallel.add_argument("--seed", type=int, default=None, help="random seed")
+    parallel.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                          help="games per executemany/transaction in each shard (default: %(default)s)")
+
+    snapshot_parser = actions.add_parser("snapshot", help="export the seeded database to a snapshot file")
+    snapshot_parser.add_argument("path")
+    snapshot_parser.add_argument("--compression", choices=snapshot.COMPRESSION, default="deflate",
+                                 help="zip compression of the snapshot (default: %(default)s)")
+
+    restore = actions.add_parser("restore", help="replace the database with a snapshot file")
+    restore.add_argument("path")
+
+    backfill = actions.add_parser("backfill-game-players", parents=[session_parser("safe")],
+                                  help="build game_players for games already in the database")
+    backfill.add_argument("--from-id", type=int, default=0,
+                          help="only games with a greater id_game, to resume a backfill (default: %(default)s)")
+    backfill.add_argument("--chunk-size", type=int, default=50000,
+                          help="games per transaction (default: %(default)s)")
+
+    suggestions = actions.add_parser("suggestions", parents=[session_parser("safe")],
+                                     help="precompute mutual-friend counts and friend suggestions")
+    suggestions.add_argument("--top-k", type=int, default=10,
+                             help="suggestions kept per user (default: %(default)s)")
+    suggestions.add_argument("--full", action="store_true",
+                             help="recompute every user instead of those whose friends changed since the last run")
+
+    ranking = actions.add_parser("leaderboard", parents=[session_parser("safe")],
+                                 help="rank players by win rate for top-N and around-me lookups")
+    ranking.add_argument("--min-games", type=int, default=10,
+                         help="games a player needs to be ranked (default: %(default)s)")
+    ranking.add_argument("--block-size", type=int, default=1024,
+                         help="players per counted block of the ranking (default: %(default)s)")
+    ranking.add_argument("--full", action="store_true",
+                         help="rank every player instead of those whose user_stats changed since the last run")
+
+    audit = actions.add_parser("audit-stats", parents=[session_parser("safe")],
+                               help="recompute user_stats from games and report rows that drifted")
+    audit.add_argument("--full", action="store_true",
+                       help="read every game instead of those added since the last audit, and check every row")
+    audit.add_argument("--fix", action="store_true",
+                       help="rewrite the mismatched rows in one transaction (backend writes wait meanwhile)")
+    audit.add_argument("--chunk-size", type=int, default=250000,
+                       help="games read per query (default: %(default)s)")
+    audit.add_argument("--tolerance", type=float, default=0.01,
+                       help="allowed difference of win_rate and the per-game averages (default: %(default)s)")
+    audit.add_argument("--show", type=int, default=10,
+                       help="mismatched users to print (default: %(default)s)")
+
+    archive = actions.add_parser("archive-games", parents=[session_parser("safe")],
+                                 help="move old games into an archive database and keep monthly rollups of them")
+    archive.add_argument("--archive", metavar="PATH", default=None,
+                         help="archive database (default: $ARCHIVE_DB_PATH or the database's name with -archive)")
+    archive.add_argument("--older-than", type=int, default=365,
+                         help="archive games created more than this many days ago (default: %(default)s)")
+    archive.add_argument("--batch-size", type=int, default=5000,
+                         help="games per transaction (default: %(default)s)")
+    archive.add_argument("--max-games", type=int, default=None,
+                         help="stop after moving this many games")
+    archive.add_argument("--pause", type=float, default=0.05,
+                         help="seconds to wait between batches so backend writes get the lock (default: %(default)s)")
+    archive.add_argument("--vacuum-pages", type=int, default=2000,
+                         help="free pages returned to the filesystem after each batch (default: %(default)s)")
+    archive.add_argument("--enable-incremental-vacuum", action="store_true",
+                         help="first switch an older database to auto_vacuum = INCREMENTAL "
+                              "(one full VACUUM, the database is locked meanwhile)")
+
+    return parser
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python3 script.py <users|friends|games|tournaments> <number>")
-        sys.exit(1)
-
-    action = sys.argv[1]
-    number = int(sys.argv[2])
-
-    if action == "users":
-        create_users(number)
-    elif action == "friends":
-        create_friends(number)
-    elif action == "games":
-        create_games(number)
-    elif action == "tournaments":
-        create_tournaments(number)
-    else:
-        print(f"Unknown action: {action}")
-        sys.exit(1)
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.profile or args.cprofile:
+        seed_profile.enable(args.cprofile)
+    seed_metrics.enable(args.action, DB_PATH, port=args.metrics_port, textfile=args.metrics_textfile)
+    try:
+        run_action(parser, args)
+    finally:
+        seed_profile.report()
+        seed_metrics.finish(linger=args.metrics_linger if args.metrics_port is not None else 0)
+
+def run_action(parser, args):
+    if args.action == "snapshot":
+        snapshot.create_snapshot(DB_PATH, args.path, compression=args.compression)
+        return
+    if args.action == "restore":
+        snapshot.restore_snapshot(DB_PATH, args.path)
+        return
+
+    if args.action == "backfill-game-players":
+        backfill_game_players(from_id=args.from_id, chunk_size=args.chunk_size, mode=args.mode)
+        return
+    if args.action == "audit-stats":
+        audit_stats(full=args.full, fix=args.fix, chunk_size=args.chunk_size, tolerance=args.tolerance,
+                    show=args.show, mode=args.mode)
+        return
+    if args.action == "archive-games":
+        archive_games(archive_path=args.archive, older_than=args.older_than, batch_size=args.batch_size,
+                      max_games=args.max_games, pause=args.pause, vacuum_pages=args.vacuum_pages,
+                      enable_vacuum=args.enable_incremental_vacuum, mode=args.mode)
+        return
+    if args.action == "leaderboard":
+        refresh_leaderboard(min_games=args.min_games, block_size=args.block_size, full=args.full, mode=args.mode)
+        return
+    if args.action == "suggestions":
+        refresh_suggestions(top_k=args.top_k, full=args.full, mode=args.mode)
+        return
+
+    if getattr(args, "resume", False):
+        conn = db_session.connect(DB_PATH)
+        run = seed_progress.find_unfinished(conn, args.action)
+        conn.close()
+        if run is None:
+            parser.error(f"no interrupted {args.action} run to resume")
+        args.number, args.seed = run["number"], run["seed"]
+        vars(args).update(run["options"])
+    elif getattr(args, "number", 0) is None:
+        parser.error("the number argument is required")
+    if getattr(args, "vs_ai", 0) and args.engine != "simulated":
+        parser.error("--vs-ai needs --engine simulated")
+    if args.action == "tournaments" and args.min_size < 2:
+        parser.error("--min-size must be at least 2")
+    if args.action == "tournaments" and args.max_size < args.min_size:
+        parser.error("--max-size must be at least --min-size")
+    # bulk mode drops indexes and triggers and rebuilds them in one long write, no way to share the lock
+    if getattr(args, "yield_ms", None) and args.mode == "bulk":
+        print("--yield-ms shares the database with the backend, seeding in --mode safe")
+        args.mode = "safe"
+
+    if args.action in ("games", "tournaments", "parallel"):
+        ensure_schema(tournaments=args.action == "tournaments")
+
+    # an explicit seed makes every run reproducible, so always pick and print one
+    if getattr(args, "seed", 0) is None:
+        args.seed = secrets.randbits(32)
+        print(f"Using seed {args.seed}")
+
+    if args.action == "users":
+        create_users(args.number, rounds=args.rounds, workers=args.workers,
+                     shared_hash=args.shared_hash, batch_size=args.batch_size,
+                     totp_secret=args.totp_secret, mode=args.mode, resume=args.resume, yield_ms=args.yield_ms)
+    elif args.action == "friends":
+        create_friends(args.number, model=args.model, seed=args.seed, mutual=args.mutual,
+                       community_size=args.community_size, batch_size=args.batch_size, mode=args.mode,
+                       resume=args.resume, yield_ms=args.yield_ms)
+    elif args.action == "games":
+        create_games(args.number, seed=args.seed, batch_size=args.batch_size, months=args.months, skew=args.skew,
+                     engine=args.engine, vs_ai=args.vs_ai, difficulty=args.difficulty, results=args.results,
+                     results_timeline=args.results_timeline, mode=args.mode, resume=args.resume,
+                     yield_ms=args.yield_ms)
+    elif args.action == "tournaments":
+        create_tournaments(args.number, min_size=args.min_size, max_size=args.max_size,
+                           seed=args.seed, batch_size=args.batch_size, months=args.months, results=args.results,
+                           results_timeline=args.results_timeline, mode=args.mode, resume=args.resume,
+                           yield_ms=args.yield_ms)
+    elif args.action == "parallel":
+        create_parallel(args.number, games=args.games, shards=args.shards, rounds=args.rounds,
+                        shared_hash=args.shared_hash, seed=args.seed, batch_size=args.batch_size,
+                        months=args.months, skew=args.skew, mode=args.mode)
+
+    options = {k: v for k, v in vars(args).items()
+               if k not in ("action", "number", "seed", "resume", "profile", "cprofile", "yield_ms")
+               and not k.startswith("metrics_")}
+    record_run(args.action, args.number, getattr(args, "seed", None), options)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""Move cold games into an archive database and keep monthly per-user rollups of them.
+
+games only grows, and every profile view reads a player's whole history
+through idx_games_player1_id/player2_id. archive() moves the games created
+before a horizon, with their game_results and tournament_games rows, into a
+separate SQLite file, and adds them to user_monthly_stats: one row per user
+and month with the user_stats counters of those games, so totals and
+per-month charts still cover them.
+
+Every batch is two short transactions. The rows are first copied into the
+archive, which only reads the hot database. Then the rollups are added and
+the games deleted in one BEGIN IMMEDIATE, so the backend waits on the write
+lock for one batch at most. A crash between the two leaves copies that the
+next run replaces; a game is never counted twice or lost.
+
+Freed pages go back to the filesystem with PRAGMA incremental_vacuum after
+every batch. That needs auto_vacuum = INCREMENTAL, which init_db.sh sets on
+new databases; enable_incremental_vacuum() converts an older one with a
+single full VACUUM.
+"""
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+import seed_metrics
+import seed_profile
+import stats_audit
+from stats_accumulator import COLUMN_INDEX, StatsAccumulator
+
+
+# tables keyed by id_game that move with their games
+ARCHIVED_TABLES = ("games", "game_results", "tournament_games")
+ROLLUP_COLUMNS = stats_audit.AUDITED_COLUMNS
+
+SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS user_monthly_stats (
+        id_user INTEGER NOT NULL,
+        month TEXT NOT NULL, -- 'YYYY-MM' of games.created_at
+        {' '.join(f'{col} INTEGER NOT NULL DEFAULT 0,' for col in ROLLUP_COLUMNS)}
+        highest_score INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_user, month)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS game_archive_batches (
+        id_batch INTEGER PRIMARY KEY AUTOINCREMENT,
+        first_game INTEGER NOT NULL,
+        last_game INTEGER NOT NULL,
+        games INTEGER NOT NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+# oldest first through idx_games_created_at
+CANDIDATES_SQL = """
+    SELECT id_game, substr(created_at, 1, 7) FROM games
+    WHERE created_at < ?
+    ORDER BY created_at
+    LIMIT ?
+"""
+BATCH_GAMES_SQL = stats_audit.AUDIT_SELECT + """
+    WHERE id_game IN (SELECT value FROM json_each(?))
+    ORDER BY id_game
+"""
+ROLLUP_SQL = f"""
+    INSERT INTO user_monthly_stats (id_user, month, {', '.join(ROLLUP_COLUMNS)}, highest_score)
+    VALUES ({', '.join('?' * (len(ROLLUP_COLUMNS) + 3))})
+    ON CONFLICT(id_user, month) DO UPDATE SET
+        {', '.join(f'{col} = {col} + excluded.{col}' for col in ROLLUP_COLUMNS)},
+        highest_score = MAX(highest_score, excluded.highest_score)
+"""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+def default_path(db_path):
+    """ARCHIVE_DB_PATH, or the database's name with -archive"""
+    root, ext = os.path.splitext(db_path)
+    return os.environ.get("ARCHIVE_DB_PATH", f"{root}-archive{ext or '.db'}")
+
+def archive_schema(conn):
+    """CREATE statements of the hot ARCHIVED_TABLES and their indexes, aimed at the archive"""
+    placeholders = ", ".join("?" * len(ARCHIVED_TABLES))
+    rows = conn.execute(
+        f"SELECT sql FROM main.sqlite_master WHERE type IN ('table', 'index') AND sql IS NOT NULL "
+        f"AND tbl_name IN ({placeholders}) ORDER BY type = 'index'",
+        ARCHIVED_TABLES
+    ).fetchall()
+    return [re.sub(r"^CREATE (UNIQUE )?(TABLE|INDEX) (IF NOT EXISTS )?", r"CREATE \1\2 IF NOT EXISTS archive.", sql)
+            for (sql,) in rows]
+
+def attach(conn, path):
+    """Attach the archive as schema 'archive', creating its tables; returns the tables to move"""
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    conn.execute("PRAGMA archive.journal_mode = WAL")
+    conn.execute("PRAGMA archive.synchronous = FULL")
+    with conn:
+        for sql in archive_schema(conn):
+            conn.execute(sql)
+    return [table for table in ARCHIVED_TABLES
+            if conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()]
+
+def enable_incremental_vacuum(conn):
+    """Switch the hot database to auto_vacuum = INCREMENTAL (a full VACUUM, exclusive while it runs)"""
+    started_at = time.perf_counter()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    print(f"Rewrote the database with incremental vacuum in {time.perf_counter() - started_at:.2f}s")
+
+def vacuum(conn, pages=None):
+    """Return up to pages free pages (all of them if None) to the filesystem; returns how many"""
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # the pragma frees one page per step and execute() steps a statement without columns once,
+    # executescript runs it to the end
+    conn.executescript(f"PRAGMA incremental_vacuum({pages or 0})")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def rollup_rows(chunk, month_of):
+    """ROLLUP_SQL parameters of a BATCH_GAMES_SQL chunk: its counters per player and month"""
+    months = np.array([month_of[game] for game in chunk[:, 0].tolist()])
+    player_ids = chunk[:, 1:3]
+    rows = []
+    for month in np.unique(months).tolist():
+        in_month = months == month
+        # dense indices instead of ids keep the accumulator as small as the batch
+        users, inverse = np.unique(player_ids[in_month], return_inverse=True)
+        games = {col: chunk[in_month, i] for i, col in enumerate(stats_audit.AUDIT_COLUMNS)}
+        games['player1_id'], games['player2_id'] = inverse.reshape(-1, 2).T
+        stats = StatsAccumulator(len(users) - 1)
+        stats.add_games(games)
+        counters = stats.totals[:, [COLUMN_INDEX[col] for col in ROLLUP_COLUMNS]].tolist()
+        for user, totals, highest in zip(users.tolist(), counters, stats.highest_score.tolist()):
+            # 0 stands for a missing player
+            if user:
+                rows.append((user, month, *totals, highest))
+    return rows
+
+def move_batch(conn, tables, ids, month_of):
+    """Roll up and delete the copied games ids (a JSON array) in one write transaction"""
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # games the backend deleted since the copy are left out; the rest are in the archive
+        chunk = np.array(conn.execute(BATCH_GAMES_SQL, (ids,)).fetchall(), dtype=np.int64)
+        if len(chunk) == 0:
+            conn.commit()
+            return 0
+        rows = rollup_rows(chunk, month_of)
+        conn.executemany(ROLLUP_SQL, rows)
+        for table in reversed(tables):
+            conn.execute(f"DELETE FROM main.{table} WHERE id_game IN (SELECT value FROM json_each(?))", (ids,))
+        conn.execute(
+            "INSERT INTO game_archive_batches (first_game, last_game, games) VALUES (?, ?, ?)",
+            (int(chunk[0, 0]), int(chunk[-1, 0]), len(chunk))
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    seed_metrics.add_rows("user_monthly_stats", len(rows))
+    return len(chunk)
+
+def copy_batch(conn, tables, ids):
+    """Copy the rows of games ids (a JSON array) into the archive, replacing copies of an interrupted run"""
+    with conn:
+        for table in tables:
+            columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+            conn.execute(
+                f"INSERT OR REPLACE INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table} "
+                f"WHERE id_game IN (SELECT value FROM json_each(?))",
+                (ids,)
+            )
+
+def archive(conn, archive_path, older_than=365, batch_size=5000, max_games=None, pause=0.05, vacuum_pages=2000):
+    """Move games created more than older_than days ago into archive_path, batch by batch.
+
+    Returns the number of games moved. pause is slept between batches so
+    backend writes waiting on the lock get in.
+    """
+    ensure_schema(conn)
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    if not incremental:
+        print("auto_vacuum is not INCREMENTAL: freed pages are reused but the file will not shrink "
+              "(see --enable-incremental-vacuum)")
+    tables = attach(conn, archive_path)
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f"-{older_than} days",)).fetchone()[0]
+    print(f"Archiving games created before {cutoff} into {archive_path}")
+
+    started_at = time.perf_counter()
+    moved = freed = batches = 0
+    try:
+        while max_games is None or moved < max_games:
+            limit = batch_size if max_games is None else min(batch_size, max_games - moved)
+            with seed_profile.phase("archive.select"):
+                candidates = conn.execute(CANDIDATES_SQL, (cutoff, limit)).fetchall()
+            if not candidates:
+                break
+            month_of = dict(candidates)
+            ids = json.dumps(sorted(month_of))
+            with seed_profile.phase("archive.copy"):
+                copy_batch(conn, tables, ids)
+            with seed_profile.phase("archive.move"):
+                moved += move_batch(conn, tables, ids, month_of)
+            if incremental:
+                with seed_profile.phase("archive.vacuum"):
+                    freed += vacuum(conn, vacuum_pages)
+            batches += 1
+            seed_metrics.set_batches(batches)
+            print(f"  archive: {moved} games moved, oldest left {candidates[-1][1]}", flush=True)
+            time.sleep(pause)
+
+        if incremental:
+            with seed_profile.phase("archive.vacuum"):
+                freed += vacuum(conn)
+        conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA archive.wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.execute("DETACH DATABASE archive")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    print(f"Moved {moved} games in {batches} batches in {time.perf_counter() - started_at:.2f}s, "
+          f"freed {freed * page_size / 1e6:.1f} MB")
+    print(f"  hot database: {pages * page_size / 1e6:.1f} MB, "
+          f"archive: {os.path.getsize(archive_path) / 1e6:.1f} MB")
+    return moved
@@ -0,0 +1,104 @@
+"""game_players: one row per (player, game), clustered by (id_user, created_at).
+
+Game history is an OR over games.player1_id/player2_id sorted by created_at,
+which SQLite answers with a multi-index OR plus a temp B-tree sort. The
+participation table turns it into a single range scan of one B-tree and
+allows keyset pagination on (created_at, id_game). Triggers keep it in step
+with games for rows written by the backend.
+"""
+import time
+
+import seed_metrics
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS game_players (
+        id_user INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        id_game INTEGER NOT NULL,
+        side INTEGER NOT NULL CHECK(side IN (1, 2)),
+        result TEXT CHECK(result IN ('win', 'lose', 'draw')),
+        PRIMARY KEY (id_user, created_at, id_game)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_games_players_insert AFTER INSERT ON games
+    BEGIN
+        INSERT OR IGNORE INTO game_players (id_user, created_at, id_game, side, result)
+        SELECT NEW.player1_id, COALESCE(NEW.created_at, CURRENT_TIMESTAMP), NEW.id_game, 1, NEW.player1_result
+        WHERE NEW.player1_id IS NOT NULL;
+        INSERT OR IGNORE INTO game_players (id_user, created_at, id_game, side, result)
+        SELECT NEW.player2_id, COALESCE(NEW.created_at, CURRENT_TIMESTAMP), NEW.id_game, 2, NEW.player2_result
+        WHERE NEW.player2_id IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_games_players_delete AFTER DELETE ON games
+    BEGIN
+        DELETE FROM game_players WHERE id_user = OLD.player1_id AND created_at = OLD.created_at AND id_game = OLD.id_game;
+        DELETE FROM game_players WHERE id_user = OLD.player2_id AND created_at = OLD.created_at AND id_game = OLD.id_game;
+    END;
+"""
+
+# both sides of games with from_id < id_game <= to_id, in clustered key order
+BACKFILL_SQL = """
+    INSERT OR IGNORE INTO game_players (id_user, created_at, id_game, side, result)
+    SELECT id_user, created_at, id_game, side, result FROM (
+        SELECT player1_id AS id_user, created_at, id_game, 1 AS side, player1_result AS result
+        FROM games WHERE id_game > ? AND id_game <= ? AND player1_id IS NOT NULL
+        UNION ALL
+        SELECT player2_id, created_at, id_game, 2, player2_result
+        FROM games WHERE id_game > ? AND id_game <= ? AND player2_id IS NOT NULL
+    )
+    ORDER BY id_user, created_at, id_game
+"""
+
+# the history queries of getGamesHistory rewritten on top of game_players
+HISTORY_COUNT_SQL = "SELECT COUNT(*) AS total FROM game_players WHERE id_user = ?"
+HISTORY_PAGE_SQL = """
+    SELECT g.id_game, g.created_at, g.is_tournament, g.player1_id, g.player2_id, g.winner_id,
+           g.player1_score, g.player2_score, COALESCE(g.game_mode, 'Classic') AS game_mode,
+           g.smart_contract_link, g.contract_address
+    FROM game_players gp
+    JOIN games g ON g.id_game = gp.id_game
+    WHERE gp.id_user = ?
+    ORDER BY gp.created_at DESC, gp.id_game DESC
+    LIMIT ?
+"""
+# next page after the last (created_at, id_game) the client has seen
+HISTORY_KEYSET_SQL = """
+    SELECT g.id_game, g.created_at, g.is_tournament, g.player1_id, g.player2_id, g.winner_id,
+           g.player1_score, g.player2_score, COALESCE(g.game_mode, 'Classic') AS game_mode,
+           g.smart_contract_link, g.contract_address
+    FROM game_players gp
+    JOIN games g ON g.id_game = gp.id_game
+    WHERE gp.id_user = ? AND (gp.created_at, gp.id_game) < (?, ?)
+    ORDER BY gp.created_at DESC, gp.id_game DESC
+    LIMIT ?
+"""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+def backfill(conn, from_id=0, chunk_size=50000):
+    """Copy games with id_game > from_id into game_players, committing every chunk_size games"""
+    ensure_schema(conn)
+    last_id = conn.execute("SELECT COALESCE(MAX(id_game), 0) FROM games").fetchone()[0]
+    started_at = time.perf_counter()
+    inserted = 0
+
+    low = from_id
+    while low < last_id:
+        high = min(low + chunk_size, last_id)
+        before = conn.total_changes
+        chunk_started_at = time.perf_counter()
+        with conn:
+            conn.execute(BACKFILL_SQL, (low, high, low, high))
+        seed_metrics.observe_commit(time.perf_counter() - chunk_started_at)
+        seed_metrics.add_rows("game_players", conn.total_changes - before)
+        inserted += conn.total_changes - before
+        low = high
+        elapsed = time.perf_counter() - started_at
+        print(f"  game_players: up to game {high}/{last_id}, {inserted} rows, "
+              f"{inserted / elapsed if elapsed > 0 else 0:.0f} rows/s", flush=True)
+
+    return inserted
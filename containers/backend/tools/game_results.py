@@ -0,0 +1,189 @@
+"""game_results: the game_data document saved with every finished match, seeded and optionally compacted.
+
+The backend stores the frontend's GameData object (frontend/src/pong/utils/
+GameConfig.ts) as JSON text in game_results.game_data and never reads it
+back. documents() builds the same documents from a game_synth/pong_sim batch,
+so fixtures carry the table at its real size; timeline=True adds an event log
+(goals, balls, items and walls in match order) to size a richer payload.
+
+The compact encoding is raw deflate primed with a dictionary of the
+document's keys and common values, stored as a BLOB behind a version byte.
+decode() reads both forms, so readers do not need to know how a row was
+written. Node reads a compact row with
+zlib.inflateRawSync(blob.subarray(1), { dictionary }).
+"""
+import json
+import zlib
+
+import numpy as np
+
+import game_synth
+
+
+ENCODINGS = ("json", "deflate")
+
+INSERT_SQL = "INSERT INTO game_results (id_game, game_data, created_at) VALUES (?, ?, ?)"
+
+# version byte -> deflate dictionary; stored rows name theirs, so never edit one, add a new version
+DICTIONARIES = {
+    1: (
+        b'{"t":0,"type":"wall","wall":"pyramids"}{"t":0,"type":"item","item":"bullets","side":"right"}'
+        b'{"t":0,"type":"ball","ball":"curveBalls"}{"t":0,"type":"ball","ball":"multiplyBalls"}'
+        b'{"t":0,"type":"ball","ball":"spinBalls"}{"t":0,"type":"ball","ball":"burstBalls"}'
+        b'"walls":{"pyramids":0,"escalators":0,"hourglasses":0,"lightnings":0,"maws":0,"rakes":0,'
+        b'"trenches":0,"kites":0,"bowties":0,"honeycombs":0,"snakes":0,"vipers":0,"waystones":0},'
+        b'"specialItems":{"bullets":0,"shields":0},'
+        b'"balls":{"defaultBalls":1,"curveBalls":0,"multiplyBalls":0,"spinBalls":0,"burstBalls":0},'
+        b'{"config":{"mode":"online","variant":"1v1","classicMode":true,"filters":false,'
+        b'"gameId":"game_17","hostName":"user","guestName":"user","players":['
+        b'{"id":"1","name":"user","type":"local","side":"left"},{"id":"2","name":"user","type":"remote","side":"right"}]},'
+        b'"createdAt":"2025-01-01T00:00:00.000Z","endedAt":"2025-01-01T00:00:00.000Z",'
+        b'"generalResult":"leftWin","winner":"user","finalScore":{"leftPlayer":11,"rightPlayer":9},'
+        b'"leftPlayer":{"id":"1","name":"user","isDisconnected":false,"score":11,"result":"win","hits":0,'
+        b'"goalsInFavor":11,"goalsAgainst":9,"powerupsPicked":0,"powerdownsPicked":0,"ballchangesPicked":0},'
+        b'"rightPlayer":{"id":"2","name":"user","isDisconnected":false,"score":9,"result":"lose","hits":0,'
+        b'"goalsInFavor":9,"goalsAgainst":11,"powerupsPicked":0,"powerdownsPicked":0,"ballchangesPicked":0},'
+        b'"events":[{"t":0,"type":"goal","side":"left","score":[1,0]},{"t":0,"type":"goal","side":"right","score":[1,1]}'
+    ),
+}
+VERSION = 1
+# priming a compressor with the dictionary costs more than compressing a document, so rows copy this one
+_PACKER = zlib.compressobj(6, zlib.DEFLATED, -15, 8, zlib.Z_DEFAULT_STRATEGY, DICTIONARIES[VERSION])
+
+# GameData groups -> (games column, document key) in the frontend's field order
+BALLS = [(col, key) for col, key in zip(game_synth.BALL_COLUMNS,
+         ('defaultBalls', 'curveBalls', 'multiplyBalls', 'spinBalls', 'burstBalls'))]
+SPECIAL_ITEMS = [(col, col[:-len('_used')]) for col in game_synth.SPECIAL_ITEM_COLUMNS]
+WALLS = [(col, col[:-len('_used')]) for col in game_synth.WALL_COLUMNS]
+PLAYER_FIELDS = [('hits', 'hits'), ('goals_in_favor', 'goalsInFavor'), ('goals_against', 'goalsAgainst'),
+                 ('powerups_picked', 'powerupsPicked'), ('powerdowns_picked', 'powerdownsPicked'),
+                 ('ballchanges_picked', 'ballchangesPicked')]
+GAME_ID_CHARS = np.array(list("abcdefghijklmnopqrstuvwxyz0123456789"))
+
+
+def encode(text, encoding="json"):
+    """game_data column value for a JSON document"""
+    if encoding == "json":
+        return text
+    if encoding == "deflate":
+        packer = _PACKER.copy()
+        return bytes([VERSION]) + packer.compress(text.encode()) + packer.flush()
+    raise ValueError(f"Unknown game_data encoding: {encoding}")
+
+def decode_text(value):
+    """JSON text of a game_data value in either encoding"""
+    if isinstance(value, bytes):
+        unpacker = zlib.decompressobj(-15, DICTIONARIES[value[0]])
+        return (unpacker.decompress(value[1:]) + unpacker.flush()).decode()
+    return value
+
+def decode(value):
+    return json.loads(decode_text(value))
+
+def load_usernames(c):
+    """username of every user, indexed by id_user"""
+    rows = c.execute("SELECT id_user, username FROM users").fetchall()
+    names = np.empty(max((row[0] for row in rows), default=0) + 1, dtype=object)
+    for user_id, username in rows:
+        names[user_id] = username
+    return names
+
+def _iso(texts):
+    """SQLite timestamp text as JavaScript toISOString()"""
+    return [f"{text.replace(' ', 'T')}.000Z" for text in texts]
+
+def _seconds(texts):
+    return np.asarray(texts, dtype='datetime64[s]').astype(np.int64)
+
+def _timelines(rng, games):
+    """Per game, the events behind its counters at random times, in match order"""
+    n = len(games['player1_id'])
+    duration_ms = np.maximum(_seconds(games['ended_at']) - _seconds(games['created_at']), 1) * 1000
+    kinds = ([('goal', 'left', games['player1_score']), ('goal', 'right', games['player2_score'])]
+             + [('ball', key, games[col]) for col, key in BALLS]
+             + [('item', key, games[col]) for col, key in SPECIAL_ITEMS]
+             + [('wall', key, games[col]) for col, key in WALLS])
+    counts = np.stack([np.asarray(count, dtype=np.int64) for _, _, count in kinds], axis=1)
+    owner = np.repeat(np.tile(np.arange(n)[:, None], (1, len(kinds))).ravel(), counts.ravel())
+    kind = np.repeat(np.tile(np.arange(len(kinds)), n), counts.ravel())
+    at = (rng.random(len(owner)) * duration_ms[owner]).astype(np.int64)
+    order = np.lexsort((at, owner))
+    owner, kind, at = owner[order], kind[order], at[order]
+    sides = rng.integers(0, 2, size=len(owner))
+    bounds = np.searchsorted(owner, np.arange(n + 1))
+
+    timelines = []
+    kind, at, sides = kind.tolist(), at.tolist(), sides.tolist()
+    for game in range(n):
+        events, left, right = [], 0, 0
+        for i in range(bounds[game], bounds[game + 1]):
+            group, detail, _ = kinds[kind[i]]
+            if group == 'goal':
+                left, right = left + (detail == 'left'), right + (detail == 'right')
+                events.append({"t": at[i], "type": "goal", "side": detail, "score": [left, right]})
+            elif group == 'item':
+                events.append({"t": at[i], "type": "item", "item": detail, "side": ('left', 'right')[sides[i]]})
+            else:
+                events.append({"t": at[i], "type": group, group: detail})
+        timelines.append(events)
+    return timelines
+
+def documents(rng, games, names, timeline=False):
+    """GameData JSON text for every game of a stamped batch (see game_timeline.stamp)"""
+    n = len(games['player1_id'])
+    p1, p2 = games['player1_id'].tolist(), games['player2_id'].tolist()
+    vs_ai = games['vs_ai'].tolist() if 'vs_ai' in games else [False] * n
+    tournament = games['is_tournament'].tolist()
+    arcade = (games['game_mode'] == 'arcade').tolist()
+    created, ended = _iso(games['created_at']), _iso(games['ended_at'])
+    started_ms = (_seconds(games['created_at']) * 1000).tolist()
+    suffixes = ["".join(chars) for chars in GAME_ID_CHARS[rng.integers(0, len(GAME_ID_CHARS), size=(n, 9))]]
+    general = games['general_result'].tolist()
+    score1, score2 = games['player1_score'].tolist(), games['player2_score'].tolist()
+    groups = [(name, [(key, games[col].tolist()) for col, key in fields])
+              for name, fields in (("balls", BALLS), ("specialItems", SPECIAL_ITEMS), ("walls", WALLS))]
+    sides = [(side, games[f'{side}_result'].tolist(), [(key, games[f'{side}_{col}'].tolist()) for col, key in PLAYER_FIELDS])
+             for side in ('player1', 'player2')]
+    events = _timelines(rng, games) if timeline else None
+
+    texts = []
+    for i in range(n):
+        left, right = names[p1[i]], names[p2[i]]
+        variant = "1vAI" if vs_ai[i] else "tournament" if tournament[i] else "1v1"
+        doc = {
+            "config": {
+                "mode": "local" if vs_ai[i] else "online",
+                "variant": variant,
+                "classicMode": not arcade[i],
+                "filters": False,
+                "gameId": f"game_{started_ms[i]}_{suffixes[i]}",
+                "hostName": left,
+                "guestName": right,
+                "players": [
+                    {"id": str(p1[i]), "name": left, "type": "local", "side": "left"},
+                    {"id": str(p2[i]), "name": right, "type": "ai" if vs_ai[i] else "remote", "side": "right"},
+                ],
+            },
+            "createdAt": created[i],
+            "endedAt": ended[i],
+            "generalResult": general[i],
+            "winner": left if general[i] == 'leftWin' else right if general[i] == 'rightWin' else None,
+            "finalScore": {"leftPlayer": score1[i], "rightPlayer": score2[i]},
+        }
+        for name, fields in groups:
+            doc[name] = {key: values[i] for key, values in fields}
+        for (side, results, fields), player_id, name, score in zip(sides, (p1, p2), (left, right), (score1, score2)):
+            player = {"id": str(player_id[i]), "name": name, "isDisconnected": False,
+                      "score": score[i], "result": results[i]}
+            player.update((key, values[i]) for key, values in fields)
+            doc["leftPlayer" if side == 'player1' else "rightPlayer"] = player
+        if events is not None:
+            doc["events"] = events[i]
+        texts.append(json.dumps(doc, separators=(",", ":")))
+    return texts
+
+def rows(rng, games, first_id, names, encoding="json", timeline=False):
+    """INSERT_SQL parameters for a batch whose games got ids first_id, first_id + 1, ..."""
+    texts = documents(rng, games, names, timeline=timeline)
+    return [(first_id + i, encode(text, encoding), saved_at)
+            for i, (text, saved_at) in enumerate(zip(texts, games['ended_at'].tolist()))]
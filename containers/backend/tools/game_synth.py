@@ -0,0 +1,178 @@
+"""Columnar (NumPy) synthesis of games rows for friends.py"""
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+SMART_CONTRACT_LINK = "https://testnet.snowtrace.io/address/0x7f053C63bF897AA9Dc1373158051F1fDbB4a5BC6/contract/43113/readContract?chainid=43113"
+CONTRACT_ADDRESS = "0x7f053C63bF897AA9Dc1373158051F1fDbB4a5BC6"
+
+BALL_COLUMNS = [
+    'default_balls_used', 'curve_balls_used', 'multiply_balls_used',
+    'spin_balls_used', 'burst_balls_used'
+]
+SPECIAL_ITEM_COLUMNS = [
+    'bullets_used', 'shields_used'
+]
+WALL_COLUMNS = [
+    'pyramids_used', 'escalators_used', 'hourglasses_used', 'lightnings_used',
+    'maws_used', 'rakes_used', 'trenches_used', 'kites_used', 'bowties_used',
+    'honeycombs_used', 'snakes_used', 'vipers_used', 'waystones_used'
+]
+USAGE_COLUMNS = BALL_COLUMNS + SPECIAL_ITEM_COLUMNS + WALL_COLUMNS
+PLAYER_COLUMNS = [
+    'hits', 'goals_in_favor', 'goals_against',
+    'powerups_picked', 'powerdowns_picked', 'ballchanges_picked', 'result'
+]
+
+GAME_COLUMNS = (
+    ['is_tournament', 'player1_id', 'player2_id', 'winner_id',
+     'player1_score', 'player2_score', 'game_mode', 'general_result',
+     'config_json', 'smart_contract_link', 'contract_address']
+    + USAGE_COLUMNS
+    + [f'player1_{col}' for col in PLAYER_COLUMNS]
+    + [f'player2_{col}' for col in PLAYER_COLUMNS]
+    + ['created_at', 'ended_at']
+)
+INSERT_GAME_SQL = (
+    f"INSERT INTO games ({', '.join(GAME_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(GAME_COLUMNS))})"
+)
+# same insert with a caller-assigned id_game, for rows that other tables must reference
+INSERT_GAME_WITH_ID_SQL = (
+    f"INSERT INTO games (id_game, {', '.join(GAME_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(GAME_COLUMNS) + 1))})"
+)
+
+# inclusive [low, high] ranges for each random counter, per kind of game
+ONLINE = {
+    "modes": ['online', 'tournament'],
+    "configs": [{"difficulty": d, "time_limit": t}
+                for d in ("easy", "medium", "hard") for t in (300, 600, 900)],
+    "score": (0, 10), "hits": (0, 20),
+    "powerups": (0, 5), "powerdowns": (0, 3), "ballchanges": (0, 2),
+    "balls": (0, 3), "special_items": (0, 2), "walls": (0, 1),
+    "draw_rate": None,
+}
+TOURNAMENT = {
+    "modes": ['classic', 'arcade', 'time_attack'],
+    "configs": [{"difficulty": "hard", "time_limit": 600, "tournament_mode": True}],
+    "score": (0, 10), "hits": (5, 25),
+    "powerups": (1, 8), "powerdowns": (0, 4), "ballchanges": (0, 3),
+    "balls": (0, 5), "special_items": (0, 3), "walls": (0, 2),
+    # share of tied scores left as a draw, the rest get a tie-break goal or two
+    "draw_rate": 0.1,
+}
+
+LEFT_WIN, RIGHT_WIN, DRAW = 0, 1, 2
+GENERAL_RESULTS = np.array(['leftWin', 'rightWin', 'draw'], dtype=object)
+PLAYER1_RESULTS = np.array(['win', 'lose', 'draw'], dtype=object)
+PLAYER2_RESULTS = np.array(['lose', 'win', 'draw'], dtype=object)
+
+
+def _randint(rng, bounds, size):
+    low, high = bounds
+    return rng.integers(low, high + 1, size=size, dtype=np.int32)
+
+def random_pairs(rng, user_ids, n, activity=None):
+    """Draw n pairs of distinct players from user_ids.
+
+    activity holds cumulative play weights aligned with user_ids (see
+    game_timeline.activity_weights); without it every user is equally likely.
+    """
+    count = len(user_ids)
+    if activity is None:
+        first = rng.integers(0, count, size=n)
+        second = rng.integers(0, count - 1, size=n)
+        second += second >= first
+        return user_ids[first], user_ids[second]
+
+    def draw(size):
+        return np.minimum(np.searchsorted(activity, rng.random(size) * activity[-1], side='right'), count - 1)
+
+    first, second = draw(n), draw(n)
+    clash = np.flatnonzero(first == second)
+    while len(clash):
+        second[clash] = draw(len(clash))
+        clash = clash[first[clash] == second[clash]]
+    return user_ids[first], user_ids[second]
+
+def synthesize_games(rng, player1_ids, player2_ids, profile=ONLINE, is_tournament=False):
+    """Return a dict of column name -> array for one game per (player1, player2) pair"""
+    n = len(player1_ids)
+    player1_score = _randint(rng, profile["score"], n)
+    player2_score = _randint(rng, profile["score"], n)
+
+    if profile["draw_rate"] is not None:
+        ties = (player1_score == player2_score) & (rng.random(n) > profile["draw_rate"])
+        player1_score += ties * _randint(rng, (1, 2), n)
+
+    outcome = np.full(n, DRAW, dtype=np.int8)
+    outcome[player1_score > player2_score] = LEFT_WIN
+    outcome[player2_score > player1_score] = RIGHT_WIN
+
+    winner_id = np.where(outcome == LEFT_WIN, player1_ids,
+                         np.where(outcome == RIGHT_WIN, player2_ids, 0))
+
+    configs = np.array([json.dumps(config) for config in profile["configs"]], dtype=object)
+    modes = np.array(profile["modes"], dtype=object)
+
+    games = {
+        'is_tournament': np.full(n, int(is_tournament), dtype=np.int8),
+        'player1_id': player1_ids,
+        'player2_id': player2_ids,
+        'winner_id': winner_id,
+        'player1_score': player1_score,
+        'player2_score': player2_score,
+        'game_mode': modes[rng.integers(0, len(modes), size=n)],
+        'general_result': GENERAL_RESULTS[outcome],
+        'config_json': configs[rng.integers(0, len(configs), size=n)],
+        'outcome': outcome,
+    }
+    for columns, key in ((BALL_COLUMNS, "balls"), (SPECIAL_ITEM_COLUMNS, "special_items"),
+                         (WALL_COLUMNS, "walls")):
+        for col in columns:
+            games[col] = _randint(rng, profile[key], n)
+
+    for side, score, conceded, results in (
+            ('player1', player1_score, player2_score, PLAYER1_RESULTS),
+            ('player2', player2_score, player1_score, PLAYER2_RESULTS)):
+        games[f'{side}_hits'] = _randint(rng, profile["hits"], n)
+        games[f'{side}_goals_in_favor'] = score
+        games[f'{side}_goals_against'] = conceded
+        games[f'{side}_powerups_picked'] = _randint(rng, profile["powerups"], n)
+        games[f'{side}_powerdowns_picked'] = _randint(rng, profile["powerdowns"], n)
+        games[f'{side}_ballchanges_picked'] = _randint(rng, profile["ballchanges"], n)
+        games[f'{side}_result'] = results[outcome]
+
+    return games
+
+def concat_games(batches):
+    """Concatenate several synthesized batches column by column"""
+    return {col: np.concatenate([games[col] for games in batches]) for col in batches[0]}
+
+def take(games, order):
+    """Reorder (or subset) every column of a batch"""
+    return {col: values[order] for col, values in games.items()}
+
+def game_rows(games, first_id=None):
+    """Turn a synthesized batch into INSERT_GAME_SQL (or INSERT_GAME_WITH_ID_SQL) parameter tuples.
+
+    Batches without created_at/ended_at (see game_timeline.stamp) are stamped with the current time.
+    """
+    n = len(games['player1_id'])
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    columns = [] if first_id is None else [range(first_id, first_id + n)]
+    for col in GAME_COLUMNS:
+        if col == 'smart_contract_link':
+            columns.append([SMART_CONTRACT_LINK] * n)
+        elif col == 'contract_address':
+            columns.append([CONTRACT_ADDRESS] * n)
+        elif col in ('created_at', 'ended_at') and col not in games:
+            columns.append([now] * n)
+        elif col == 'winner_id':
+            columns.append([w or None for w in games[col].tolist()])
+        else:
+            columns.append(games[col].tolist())
+    return zip(*columns)
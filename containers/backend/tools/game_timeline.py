@@ -0,0 +1,77 @@
+"""When seeded games are played and by whom: a months-long timeline with daily and weekly rhythms.
+
+Games used to be stamped with the time they were inserted, so a million rows
+spanned a few seconds and every created_at index looked perfectly selective.
+Timeline spreads them over the last months with traffic following the hour
+of day and the day of week; activity_weights makes a few players much busier
+than the long tail.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# relative traffic per UTC hour of the day: quiet nights, after-school and evening peaks
+DIURNAL = np.array([
+    0.35, 0.22, 0.15, 0.10, 0.08, 0.08, 0.12, 0.20, 0.30, 0.40, 0.50, 0.60,
+    0.70, 0.75, 0.75, 0.80, 0.90, 1.00, 1.15, 1.30, 1.40, 1.35, 1.05, 0.65,
+])
+# Monday .. Sunday
+WEEKLY = np.array([0.85, 0.85, 0.90, 0.95, 1.10, 1.30, 1.25])
+DAY_SECONDS = 86400
+# match length in seconds: lognormal around four minutes, within the shortest and longest time limits
+DURATION_MEDIAN = 240
+DURATION_SIGMA = 0.45
+DURATION_BOUNDS = (45, 900)
+
+
+class Timeline:
+    """Traffic-weighted hours between months ago and end, sampled by share of total traffic.
+
+    Batch i of n equal batches samples the [i/n, (i+1)/n) share, so batches
+    come out in time order and each one regenerates on its own.
+    """
+
+    def __init__(self, end=None, months=6):
+        end = int(end if end is not None else datetime.now(timezone.utc).timestamp())
+        start = end - int(months * 30 * DAY_SECONDS)
+        self.end = end
+        self.months = months
+
+        edges = np.arange(start - start % 3600, end + 3600, 3600, dtype=np.int64)
+        hours = edges[:-1]
+        # 1970-01-01 was a Thursday, weekday 3 counting from Monday
+        weights = DIURNAL[(hours // 3600) % 24] * WEEKLY[(hours // DAY_SECONDS + 3) % 7]
+        self.edges = np.clip(edges, start, end)
+        self.cdf = np.concatenate([[0.0], np.cumsum(weights)])
+        self.cdf /= self.cdf[-1]
+
+    def sample(self, rng, low, high, size):
+        """size sorted Unix times from the [low, high) share of all traffic"""
+        shares = np.sort(rng.uniform(low, high, size))
+        return np.interp(shares, self.cdf, self.edges).astype(np.int64)
+
+
+def durations(rng, size):
+    seconds = rng.lognormal(np.log(DURATION_MEDIAN), DURATION_SIGMA, size)
+    return np.clip(seconds, *DURATION_BOUNDS).astype(np.int64)
+
+def to_text(seconds):
+    """Unix times as SQLite CURRENT_TIMESTAMP text ('YYYY-MM-DD HH:MM:SS', UTC)"""
+    text = np.datetime_as_string(np.asarray(seconds).astype('datetime64[s]'), unit='s')
+    return np.char.replace(text, 'T', ' ').astype(object)
+
+def stamp(rng, games, started_at):
+    """Set created_at/ended_at of a game_synth batch from its start times.
+
+    Simulated batches (pong_sim) carry their real match length in 'seconds'.
+    """
+    played = games['seconds'].astype(np.int64) if 'seconds' in games else durations(rng, len(started_at))
+    games['created_at'] = to_text(started_at)
+    games['ended_at'] = to_text(started_at + played)
+    return games
+
+def activity_weights(rng, count, skew=1.0):
+    """Cumulative Zipf-like play weights for count users in random order (skew 0 is uniform)"""
+    ranks = rng.permutation(count) + 1
+    return np.cumsum(ranks.astype(np.float64) ** -skew)
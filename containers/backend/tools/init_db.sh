@@ -17,6 +17,8 @@ if [ ! -f "$DB_PATH" ]; then
 
 	sqlite3 "$DB_PATH" <<EOF
 	PRAGMA foreign_keys = ON;
+	-- let tools/game_archive.py hand pages freed by archived games back to the filesystem
+	PRAGMA auto_vacuum = INCREMENTAL;
 
 	CREATE TABLE IF NOT EXISTS users (
 		id_user INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -167,10 +169,67 @@ if [ ! -f "$DB_PATH" ]; then
 		FOREIGN KEY(id_game) REFERENCES games(id_game)
 	);
 
+	CREATE TABLE IF NOT EXISTS tournaments (
+		id_tournament INTEGER PRIMARY KEY AUTOINCREMENT,
+		name TEXT NOT NULL,
+		status TEXT CHECK(status IN ('pending', 'active', 'finished')) DEFAULT 'pending',
+		size INTEGER NOT NULL DEFAULT 0,
+		winner_id INTEGER,
+		created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+		FOREIGN KEY(winner_id) REFERENCES users(id_user)
+	);
+
+	CREATE TABLE IF NOT EXISTS tournament_participants (
+		id_tournament INTEGER NOT NULL,
+		id_user INTEGER NOT NULL,
+		is_ai BOOLEAN DEFAULT 0,
+		-- 1 for the winner, 2 for the finalist, 3 for semifinal losers, 5 for quarterfinal losers...
+		final_position INTEGER,
+		PRIMARY KEY (id_tournament, id_user),
+		FOREIGN KEY(id_tournament) REFERENCES tournaments(id_tournament),
+		FOREIGN KEY(id_user) REFERENCES users(id_user)
+	);
+
+	CREATE TABLE IF NOT EXISTS tournament_games (
+		id_tournament INTEGER NOT NULL,
+		id_game INTEGER NOT NULL,
+		round INTEGER NOT NULL,
+		PRIMARY KEY (id_tournament, id_game),
+		FOREIGN KEY(id_tournament) REFERENCES tournaments(id_tournament),
+		FOREIGN KEY(id_game) REFERENCES games(id_game)
+	);
+
+	-- One row per (player, game) clustered by player and date, so a player's history is a single range scan
+	CREATE TABLE IF NOT EXISTS game_players (
+		id_user INTEGER NOT NULL,
+		created_at TIMESTAMP NOT NULL,
+		id_game INTEGER NOT NULL,
+		side INTEGER NOT NULL CHECK(side IN (1, 2)),
+		result TEXT CHECK(result IN ('win', 'lose', 'draw')),
+		PRIMARY KEY (id_user, created_at, id_game)
+	) WITHOUT ROWID;
+
+	CREATE TRIGGER IF NOT EXISTS trg_games_players_insert AFTER INSERT ON games
+	BEGIN
+		INSERT OR IGNORE INTO game_players (id_user, created_at, id_game, side, result)
+		SELECT NEW.player1_id, COALESCE(NEW.created_at, CURRENT_TIMESTAMP), NEW.id_game, 1, NEW.player1_result
+		WHERE NEW.player1_id IS NOT NULL;
+		INSERT OR IGNORE INTO game_players (id_user, created_at, id_game, side, result)
+		SELECT NEW.player2_id, COALESCE(NEW.created_at, CURRENT_TIMESTAMP), NEW.id_game, 2, NEW.player2_result
+		WHERE NEW.player2_id IS NOT NULL;
+	END;
+
+	CREATE TRIGGER IF NOT EXISTS trg_games_players_delete AFTER DELETE ON games
+	BEGIN
+		DELETE FROM game_players WHERE id_user = OLD.player1_id AND created_at = OLD.created_at AND id_game = OLD.id_game;
+		DELETE FROM game_players WHERE id_user = OLD.player2_id AND created_at = OLD.created_at AND id_game = OLD.id_game;
+	END;
+
 		-- Create indexes for better performance
 	CREATE INDEX IF NOT EXISTS idx_games_player1_id ON games(player1_id);
 	CREATE INDEX IF NOT EXISTS idx_games_player2_id ON games(player2_id);
 	CREATE INDEX IF NOT EXISTS idx_games_created_at ON games(created_at);
+	CREATE INDEX IF NOT EXISTS idx_tournament_participants_id_user ON tournament_participants(id_user);
 
 	-- Creation of ButiBot and Guest
 	-- Insert ButiBot user if not exists
@@ -0,0 +1,266 @@
+"""leaderboard: user_stats ranked by win rate, with top-N and around-me lookups that do not sort the table.
+
+Ranking players per request means sorting every user_stats row. build()
+writes the users with at least min_games games to leaderboard in rank order:
+win rate, then wins, then the oldest account. The rate is wins / total_games
+rather than the stored win_rate, a percent that updateUserStats rounds to two
+decimals and so cannot break close ties. The primary key is that order,
+negated so that it ascends, so the top N and the neighbours of a player are
+short primary key range scans.
+
+Positions are counted, not stored, so moving one player never renumbers the
+others. leaderboard_blocks cuts the order into blocks of about block_size
+players and keeps how many each holds: a position is the players of the
+earlier blocks plus a count inside the player's own block. refresh() re-ranks
+only the users whose user_stats row changed since the last build
+(last_updated) and adjusts the block counts of their old and new places; a
+full build evens the blocks out again.
+"""
+import bisect
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+import seed_profile
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS leaderboard (
+        rate_key REAL NOT NULL,     -- -(wins / total_games)
+        wins_key INTEGER NOT NULL,  -- -wins
+        id_user INTEGER NOT NULL,
+        total_games INTEGER NOT NULL,
+        PRIMARY KEY (rate_key, wins_key, id_user)
+    ) WITHOUT ROWID;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_leaderboard_id_user ON leaderboard(id_user);
+
+    CREATE TABLE IF NOT EXISTS leaderboard_blocks (
+        id_block INTEGER PRIMARY KEY,
+        -- first key of the block, in leaderboard order
+        rate_key REAL NOT NULL,
+        wins_key INTEGER NOT NULL,
+        id_user INTEGER NOT NULL,
+        users INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS leaderboard_builds (
+        id_build INTEGER PRIMARY KEY AUTOINCREMENT,
+        min_games INTEGER NOT NULL,
+        block_size INTEGER NOT NULL,
+        full INTEGER NOT NULL,
+        last_updated TEXT,
+        users INTEGER,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    );
+
+    -- GameResultService stores ISO timestamps and the other writers CURRENT_TIMESTAMP, datetime() reads both
+    CREATE INDEX IF NOT EXISTS idx_user_stats_last_updated ON user_stats(datetime(last_updated));
+"""
+
+# below every key (rate_key >= -1), so the first block also holds players who overtake its first one
+FIRST_KEY = (-2.0, 0, 0)
+# a refresh that finds a block this many times block_size rebuilds everything instead
+MAX_BLOCK_GROWTH = 4
+
+INSERT_SQL = "INSERT INTO leaderboard (rate_key, wins_key, id_user, total_games) VALUES (?, ?, ?, ?)"
+DELETE_SQL = "DELETE FROM leaderboard WHERE id_user = ?"
+
+# lookups for the backend
+TOP_SQL = """
+    SELECT id_user, -rate_key AS win_rate, -wins_key AS wins, total_games
+    FROM leaderboard
+    ORDER BY rate_key, wins_key, id_user
+    LIMIT ?
+"""
+POSITION_SQL = """
+    WITH me AS (
+        SELECT rate_key, wins_key, id_user, total_games FROM leaderboard WHERE id_user = ?
+    ), block AS (
+        SELECT b.id_block, b.rate_key, b.wins_key, b.id_user FROM leaderboard_blocks b, me
+        WHERE (b.rate_key, b.wins_key, b.id_user) <= (me.rate_key, me.wins_key, me.id_user)
+        ORDER BY b.id_block DESC
+        LIMIT 1
+    )
+    SELECT (SELECT COALESCE(SUM(users), 0) FROM leaderboard_blocks WHERE id_block < block.id_block)
+           + (SELECT COUNT(*) FROM leaderboard l
+              WHERE (l.rate_key, l.wins_key, l.id_user) >= (block.rate_key, block.wins_key, block.id_user)
+                AND (l.rate_key, l.wins_key, l.id_user) < (me.rate_key, me.wins_key, me.id_user)) + 1,
+           me.rate_key, me.wins_key, me.total_games
+    FROM me, block
+"""
+ABOVE_SQL = """
+    SELECT id_user, -rate_key, -wins_key, total_games FROM leaderboard
+    WHERE (rate_key, wins_key, id_user) < (?, ?, ?)
+    ORDER BY rate_key DESC, wins_key DESC, id_user DESC
+    LIMIT ?
+"""
+BELOW_SQL = """
+    SELECT id_user, -rate_key, -wins_key, total_games FROM leaderboard
+    WHERE (rate_key, wins_key, id_user) > (?, ?, ?)
+    ORDER BY rate_key, wins_key, id_user
+    LIMIT ?
+"""
+
+# the same answers sorted from user_stats per request, for leaderboard_bench.py to compare against
+RANK_ORDER = "CAST(wins AS REAL) / total_games DESC, wins DESC, id_user"
+NAIVE_TOP_SQL = f"""
+    SELECT id_user, CAST(wins AS REAL) / total_games AS win_rate, wins, total_games
+    FROM user_stats
+    WHERE total_games >= ?
+    ORDER BY {RANK_ORDER}
+    LIMIT ?
+"""
+NAIVE_AROUND_SQL = f"""
+    WITH ranked AS (
+        SELECT ROW_NUMBER() OVER (ORDER BY {RANK_ORDER}) AS position,
+               id_user, CAST(wins AS REAL) / total_games AS win_rate, wins, total_games
+        FROM user_stats
+        WHERE total_games >= ?
+    ), me AS (
+        SELECT position FROM ranked WHERE id_user = ?
+    )
+    SELECT ranked.* FROM ranked, me
+    WHERE ranked.position BETWEEN me.position - ? AND me.position + ?
+    ORDER BY ranked.position
+"""
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+def top(conn, n=10):
+    """(position, id_user, win_rate, wins, total_games) of the n best players"""
+    return [(position, *row) for position, row in enumerate(conn.execute(TOP_SQL, (n,)).fetchall(), start=1)]
+
+def around(conn, id_user, window=5):
+    """The player and up to window players on each side, like top(); empty if the player is not ranked"""
+    row = conn.execute(POSITION_SQL, (id_user,)).fetchone()
+    if row is None:
+        return []
+    position, rate_key, wins_key, total_games = row
+    key = (rate_key, wins_key, id_user)
+    above = conn.execute(ABOVE_SQL, (*key, window)).fetchall()
+    below = conn.execute(BELOW_SQL, (*key, window)).fetchall()
+    return ([(position - i, *player) for i, player in reversed(list(enumerate(above, start=1)))]
+            + [(position, id_user, -rate_key, -wins_key, total_games)]
+            + [(position + i, *player) for i, player in enumerate(below, start=1)])
+
+def _keys(wins, total_games):
+    """rate_key, wins_key of every user; the division matches SQLite's CAST(wins AS REAL) / total_games"""
+    return -(wins / total_games), -wins
+
+def build(conn, min_games=10, block_size=1024):
+    """Rewrite leaderboard and leaderboard_blocks from user_stats; returns (users, newest last_updated)"""
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        with seed_profile.phase("leaderboard.read"):
+            watermark = conn.execute("SELECT MAX(datetime(last_updated)) FROM user_stats").fetchone()[0]
+            ids, wins, total_games = np.array(conn.execute(
+                "SELECT id_user, wins, total_games FROM user_stats WHERE total_games >= ?", (max(min_games, 1),)
+            ).fetchall(), dtype=np.int64).reshape(-1, 3).T
+        with seed_profile.phase("leaderboard.sort"):
+            rate_key, wins_key = _keys(wins, total_games)
+            order = np.lexsort((ids, wins_key, rate_key))
+            rate_key, wins_key, ids, total_games = rate_key[order], wins_key[order], ids[order], total_games[order]
+            # at least one block, so players that become eligible later have a place
+            starts = np.arange(0, max(len(ids), 1), block_size)
+            blocks = [(i, *(FIRST_KEY if i == 1 else (rate_key[start], wins_key[start], ids[start])), users)
+                      for i, (start, users) in enumerate(
+                          zip(starts.tolist(), np.diff(np.append(starts, len(ids))).tolist()), start=1)]
+        with seed_profile.phase("leaderboard.write"):
+            conn.execute("DELETE FROM leaderboard")
+            conn.execute("DELETE FROM leaderboard_blocks")
+            conn.executemany(INSERT_SQL, zip(rate_key.tolist(), wins_key.tolist(), ids.tolist(), total_games.tolist()))
+            conn.executemany(
+                "INSERT INTO leaderboard_blocks (id_block, rate_key, wins_key, id_user, users) VALUES (?, ?, ?, ?, ?)",
+                [(i, float(r), int(w), int(u), users) for i, r, w, u, users in blocks]
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(ids), watermark
+
+def rerank(conn, since, min_games=10):
+    """Move the users whose user_stats changed at or after since; returns (users moved, newest last_updated)"""
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        with seed_profile.phase("leaderboard.read"):
+            watermark = conn.execute("SELECT MAX(datetime(last_updated)) FROM user_stats").fetchone()[0]
+            changed = conn.execute(
+                "SELECT id_user, wins, total_games FROM user_stats WHERE datetime(last_updated) >= ?", (since,)
+            ).fetchall()
+            current = {row[2]: row for row in conn.execute(
+                "SELECT rate_key, wins_key, id_user, total_games FROM leaderboard "
+                "WHERE id_user IN (SELECT value FROM json_each(?))",
+                (json.dumps([user for user, _, _ in changed]),)
+            )}
+            blocks = conn.execute("SELECT id_block, rate_key, wins_key, id_user FROM leaderboard_blocks "
+                                  "ORDER BY id_block").fetchall()
+        block_ids = [block[0] for block in blocks]
+        block_keys = [tuple(block[1:]) for block in blocks]
+
+        def block_of(row):
+            return block_ids[max(bisect.bisect_right(block_keys, tuple(row[:3])) - 1, 0)]
+
+        deleted, inserted, counts, moved = [], [], Counter(), 0
+        for user, wins, total_games in changed:
+            old = current.get(user)
+            new = None
+            if total_games >= max(min_games, 1):
+                rate_key, wins_key = _keys(wins, total_games)
+                new = (rate_key, wins_key, user, total_games)
+            if old == new:
+                continue
+            moved += 1
+            if old is not None:
+                deleted.append((user,))
+                counts[block_of(old)] -= 1
+            if new is not None:
+                inserted.append(new)
+                counts[block_of(new)] += 1
+        with seed_profile.phase("leaderboard.write"):
+            conn.executemany(DELETE_SQL, deleted)
+            conn.executemany(INSERT_SQL, inserted)
+            conn.executemany("UPDATE leaderboard_blocks SET users = users + ? WHERE id_block = ?",
+                             [(delta, block) for block, delta in counts.items() if delta])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return moved, watermark
+
+def refresh(conn, min_games=10, block_size=1024, full=False):
+    """Re-rank the users changed since the last build, or everyone with full (also the first build,
+    after a min_games or block_size change, and once a block has grown too large)"""
+    ensure_schema(conn)
+    last = conn.execute(
+        "SELECT min_games, block_size, last_updated FROM leaderboard_builds WHERE finished_at IS NOT NULL "
+        "ORDER BY id_build DESC LIMIT 1"
+    ).fetchone()
+    largest = conn.execute("SELECT COALESCE(MAX(users), 0) FROM leaderboard_blocks").fetchone()[0]
+    full = (full or last is None or last[:2] != (min_games, block_size) or last[2] is None
+            or largest > MAX_BLOCK_GROWTH * block_size)
+    with conn:
+        id_build = conn.execute(
+            "INSERT INTO leaderboard_builds (min_games, block_size, full) VALUES (?, ?, ?)",
+            (min_games, block_size, full)
+        ).lastrowid
+
+    started_at = time.perf_counter()
+    if full:
+        users, watermark = build(conn, min_games=min_games, block_size=block_size)
+    else:
+        users, watermark = rerank(conn, last[2], min_games=min_games)
+    print(f"{'Ranked' if full else 'Re-ranked'} {users} users in {time.perf_counter() - started_at:.2f}s")
+    with conn:
+        conn.execute(
+            "UPDATE leaderboard_builds SET last_updated = ?, users = ?, finished_at = CURRENT_TIMESTAMP "
+            "WHERE id_build = ?", (watermark, users, id_build)
+        )
+    return users, full
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Compare the materialized leaderboard with sorting user_stats per request.
+
+Usage: python3 leaderboard_bench.py --users 1000000 [--updates 1000]
+
+Fills a scratch database with synthetic user_stats rows (games per player
+geometric around --mean-games, win rates spread around one half, last
+written over a year), builds the
+leaderboard (leaderboard.py) and times, for random ranked players:
+
+  top          the --top best players: ORDER BY over user_stats vs a leaderboard range scan
+  around       a player's position and --window neighbours on each side:
+               ROW_NUMBER() over user_stats vs counted blocks plus two range scans
+
+Then --updates random players play one to three more games, the leaderboard
+is refreshed incrementally, and every sampled lookup is checked against the
+naive query.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from itertools import islice
+
+import numpy as np
+
+import leaderboard
+from query_bench import percentile
+
+
+SCHEMA = """
+    CREATE TABLE user_stats (
+        id_user INTEGER PRIMARY KEY,
+        total_games INTEGER DEFAULT 0,
+        wins INTEGER DEFAULT 0,
+        losses INTEGER DEFAULT 0,
+        win_rate FLOAT DEFAULT 0.0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+# rows were last written over the year before this
+SEEDED_AT = np.datetime64("2025-01-01T00:00:00")
+
+
+def fill(conn, users, mean_games, seed=0, batch_size=100000):
+    """users user_stats rows, last written at random times in the year before SEEDED_AT"""
+    rng = np.random.default_rng(seed)
+    games = rng.geometric(1 / mean_games, size=users)
+    wins = rng.binomial(games, rng.beta(6, 6, size=users))
+    updated = (SEEDED_AT - rng.integers(0, 365 * 86400, size=users).astype("timedelta64[s]")).astype(str)
+    rows = zip(range(1, users + 1), games.tolist(), wins.tolist(), (games - wins).tolist(),
+               np.round(wins * 100 / games, 2).tolist(),
+               np.char.replace(updated, "T", " ").tolist())
+    with conn:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            conn.executemany(
+                "INSERT INTO user_stats (id_user, total_games, wins, losses, win_rate, last_updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+def play(conn, users, updates, seed=0):
+    """updates random players each play one to three games, written like updateUserStats"""
+    rng = random.Random(seed)
+    rows = []
+    for user in rng.sample(range(1, users + 1), updates):
+        played = rng.randint(1, 3)
+        won = rng.randint(0, played)
+        rows.append((played, won, played - won, user))
+    with conn:
+        conn.executemany(
+            "UPDATE user_stats SET total_games = total_games + ?, wins = wins + ?, losses = losses + ?, "
+            "last_updated = CURRENT_TIMESTAMP WHERE id_user = ?", rows)
+
+def timed(samples, call):
+    latencies = []
+    results = []
+    for args in samples:
+        started_at = time.perf_counter()
+        results.append(call(*args))
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    return {"calls": len(latencies), "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)}, results
+
+def naive_around(conn, min_games, user, window):
+    return [tuple(row) for row in conn.execute(leaderboard.NAIVE_AROUND_SQL, (min_games, user, window, window))]
+
+def naive_top(conn, min_games, n):
+    return [(position, *row) for position, row in
+            enumerate(conn.execute(leaderboard.NAIVE_TOP_SQL, (min_games, n)).fetchall(), start=1)]
+
+def benchmark(conn, users, min_games, top, window, samples, naive_samples, seed=0):
+    ranked = [row[0] for row in conn.execute("SELECT id_user FROM leaderboard")]
+    picks = [(user,) for user in random.Random(seed).choices(ranked, k=samples)]
+    results = {}
+    results["top.naive"], naive_tops = timed([(min_games, top)] * naive_samples, lambda g, n: naive_top(conn, g, n))
+    results["top.leaderboard"], tops = timed([(top,)] * samples, lambda n: leaderboard.top(conn, n))
+    results["around.naive"], naive = timed(picks[:naive_samples],
+                                           lambda user: naive_around(conn, min_games, user, window))
+    results["around.leaderboard"], materialized = timed(picks, lambda user: leaderboard.around(conn, user, window))
+    mismatches = (naive_tops[0] != tops[0]) + sum(a != b for a, b in zip(naive, materialized))
+    return results, mismatches
+
+def print_report(title, results, mismatches, checked):
+    print(f"\n== {title}")
+    print(f"{'lookup':<22} {'calls':>6} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<22} {result['calls']:>6} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f}")
+    for kind in ("top", "around"):
+        naive, fast = results[f"{kind}.naive"]["p50_ms"], results[f"{kind}.leaderboard"]["p50_ms"]
+        print(f"{kind}: {naive / max(fast, 1e-9):.0f}x faster")
+    print(f"{checked} lookups checked against the naive query, {mismatches} mismatched")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the materialized leaderboard against ORDER BY over user_stats")
+    parser.add_argument("--users", type=int, default=1000000, help="user_stats rows (default: %(default)s)")
+    parser.add_argument("--mean-games", type=float, default=30, help="mean games per player (default: %(default)s)")
+    parser.add_argument("--min-games", type=int, default=10, help="games to be ranked (default: %(default)s)")
+    parser.add_argument("--block-size", type=int, default=1024, help="leaderboard block size (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="size of the top list (default: %(default)s)")
+    parser.add_argument("--window", type=int, default=5, help="neighbours on each side (default: %(default)s)")
+    parser.add_argument("--samples", type=int, default=2000, help="leaderboard lookups (default: %(default)s)")
+    parser.add_argument("--naive-samples", type=int, default=10,
+                        help="naive lookups, each sorts the whole table (default: %(default)s)")
+    parser.add_argument("--updates", type=int, default=1000,
+                        help="players whose stats change before the incremental refresh (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for data and samples (default: %(default)s)")
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    report = {"users": args.users}
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "leaderboard.db"))
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(SCHEMA)
+        started_at = time.perf_counter()
+        fill(conn, args.users, args.mean_games, seed=args.seed)
+        print(f"Filled {args.users} user_stats rows in {time.perf_counter() - started_at:.2f}s")
+
+        started_at = time.perf_counter()
+        ranked, _ = leaderboard.refresh(conn, min_games=args.min_games, block_size=args.block_size)
+        report["build_s"] = time.perf_counter() - started_at
+        results, mismatches = benchmark(conn, args.users, args.min_games, args.top, args.window,
+                                        args.samples, args.naive_samples, seed=args.seed)
+        print_report(f"{args.users} users, {ranked} ranked", results, mismatches, args.naive_samples + 1)
+        report["build"] = {"ranked": ranked, "lookups": results, "mismatches": mismatches}
+
+        play(conn, args.users, args.updates, seed=args.seed)
+        started_at = time.perf_counter()
+        moved, _ = leaderboard.refresh(conn, min_games=args.min_games, block_size=args.block_size)
+        report["refresh_s"] = time.perf_counter() - started_at
+        results, mismatches = benchmark(conn, args.users, args.min_games, args.top, args.window,
+                                        args.samples, args.naive_samples, seed=args.seed + 1)
+        print_report(f"after {args.updates} players played, {moved} re-ranked in {report['refresh_s']:.2f}s",
+                     results, mismatches, args.naive_samples + 1)
+        report["refresh"] = {"moved": moved, "lookups": results, "mismatches": mismatches}
+        conn.close()
+
+    if args.json:
+        with open(args.json, "a") as out:
+            out.write(json.dumps(report) + "\n")
+
+if __name__ == "__main__":
+    main()
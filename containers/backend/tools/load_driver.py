@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""Asyncio load driver for the backend's HTTP routes and WebSockets.
+
+Usage: python3 load_driver.py --users 1000 --scenario history --duration 60
+
+Virtual users are the accounts created by friends.py (userN / userN@gmail.com
+with the default password). Authenticated routes need the 2FA session set by
+/api/auth/verify, so seed the accounts with 'friends.py users N --totp-secret S'
+and pass the same secret here; the driver computes the TOTP codes itself.
+
+Scenarios:
+  login        signin (+ verify) only, measures the bcrypt-bound auth path
+  friends      GET /api/friends and /api/friends/status/:username
+  history      pages through GET /api/games/history
+  matchmaking  FIND_MATCH on the game socket until matched or timed out
+  chat         bursts of general messages on /ws, timed until they echo back
+  idle         holds game and chat sockets open with periodic PINGs
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import math
+import random
+import resource
+import struct
+import sys
+import time
+from collections import Counter, defaultdict
+
+import aiohttp
+
+
+SCENARIOS = ("login", "friends", "history", "matchmaking", "chat", "idle")
+
+
+class Histogram:
+    """Log-bucketed latency histogram (5% buckets), cheap enough for one sample per request"""
+
+    RATIO = math.log(1.05)
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.errors = Counter()
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        self.count += 1
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[int(math.log(max(ms, 0.01) / 0.01) / self.RATIO)] += 1
+
+    def error(self, kind):
+        self.errors[kind] += 1
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(0.01 * math.exp((bucket + 1) * self.RATIO), self.max_ms)
+        return self.max_ms
+
+
+class Stats:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.operations = defaultdict(Histogram)
+        self.open_sockets = 0
+        self.peak_sockets = 0
+
+    def socket_opened(self):
+        self.open_sockets += 1
+        self.peak_sockets = max(self.peak_sockets, self.open_sockets)
+
+    def socket_closed(self):
+        self.open_sockets -= 1
+
+    def report(self, title):
+        elapsed = time.perf_counter() - self.started_at
+        print(f"\n== {title} after {elapsed:.0f}s, sockets open {self.open_sockets} (peak {self.peak_sockets})")
+        print(f"{'operation':<24} {'ok':>8} {'errors':>7} {'err %':>6} {'ok/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>9}")
+        for name, hist in sorted(self.operations.items()):
+            errors = sum(hist.errors.values())
+            total = hist.count + errors
+            print(f"{name:<24} {hist.count:>8} {errors:>7} {100 * errors / total if total else 0:>6.1f} "
+                  f"{hist.count / elapsed:>8.1f} {hist.percentile(50):>8.1f} {hist.percentile(95):>8.1f} "
+                  f"{hist.percentile(99):>8.1f} {hist.max_ms:>9.1f}")
+            for kind, count in hist.errors.most_common(3):
+                print(f"    {count} x {kind}")
+
+    def as_dict(self):
+        return {
+            name: {
+                "ok": hist.count,
+                "errors": dict(hist.errors),
+                "p50_ms": hist.percentile(50),
+                "p95_ms": hist.percentile(95),
+                "p99_ms": hist.percentile(99),
+                "max_ms": hist.max_ms,
+            }
+            for name, hist in self.operations.items()
+        }
+
+
+def totp(secret, at=None, step=30, digits=6):
+    """RFC 6238 code, matching otplib's authenticator defaults (SHA-1, 30 s, 6 digits)"""
+    key = base64.b32decode(secret.upper() + "=" * (-len(secret) % 8))
+    counter = struct.pack(">Q", int((at or time.time()) // step))
+    digest = hmac.new(key, counter, hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(code % 10 ** digits).zfill(digits)
+
+
+class VirtualUser:
+    def __init__(self, number, options, stats, connector):
+        self.number = number
+        self.username = f"user{number}"
+        self.email = f"{self.username}@gmail.com"
+        self.user_id = None
+        self.options = options
+        self.stats = stats
+        self.http = aiohttp.ClientSession(
+            base_url=options.url, connector=connector, connector_owner=False,
+            timeout=aiohttp.ClientTimeout(total=options.timeout)
+        )
+
+    async def timed(self, name, coro):
+        """Await coro, recording its latency or its failure under name"""
+        started_at = time.perf_counter()
+        try:
+            result = await coro
+        except asyncio.TimeoutError:
+            self.stats.operations[name].error("timeout")
+            return None
+        except aiohttp.ClientResponseError as error:
+            self.stats.operations[name].error(f"HTTP {error.status}")
+            return None
+        except (aiohttp.ClientError, OSError) as error:
+            self.stats.operations[name].error(type(error).__name__)
+            return None
+        self.stats.operations[name].record((time.perf_counter() - started_at) * 1000)
+        return result
+
+    async def request(self, method, path, **kwargs):
+        async with self.http.request(method, path, raise_for_status=True, **kwargs) as response:
+            return await response.json()
+
+    async def login(self):
+        body = await self.timed("POST /api/auth/signin", self.request(
+            "POST", "/api/auth/signin", json={"email": self.email, "password": self.options.password}))
+        if not body:
+            return False
+        self.user_id = body.get("userId")
+        if self.options.totp_secret:
+            verified = await self.timed("POST /api/auth/verify", self.request(
+                "POST", "/api/auth/verify",
+                json={"userId": self.user_id, "token": totp(self.options.totp_secret)}))
+            return bool(verified)
+        return True
+
+    async def think(self):
+        await asyncio.sleep(random.expovariate(1 / self.options.think_time) if self.options.think_time else 0)
+
+    async def socket(self, path):
+        ws = await self.http.ws_connect(path, heartbeat=None)
+        self.stats.socket_opened()
+        return ws
+
+    async def close_socket(self, ws):
+        await ws.close()
+        self.stats.socket_closed()
+
+    async def receive(self, ws, types, timeout):
+        """Wait for the next JSON message whose type is in types"""
+        deadline = time.perf_counter() + timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            message = await ws.receive(timeout=remaining)
+            if message.type != aiohttp.WSMsgType.TEXT:
+                raise aiohttp.ClientError(f"socket {message.type.name.lower()}")
+            data = json.loads(message.data)
+            if data.get("type") in types:
+                return data
+
+    # -- scenarios ------------------------------------------------------------
+
+    async def scenario_login(self, deadline):
+        while time.perf_counter() < deadline:
+            await self.login()
+            await self.think()
+
+    async def scenario_friends(self, deadline):
+        while time.perf_counter() < deadline:
+            await self.timed("GET /api/friends", self.request("GET", "/api/friends"))
+            other = f"user{random.randint(1, self.options.population)}"
+            await self.timed("GET /api/friends/status", self.request("GET", f"/api/friends/status/{other}"))
+            await self.think()
+
+    async def scenario_history(self, deadline):
+        while time.perf_counter() < deadline:
+            page = 0
+            while time.perf_counter() < deadline and page < self.options.max_pages:
+                body = await self.timed("GET /api/games/history", self.request(
+                    "GET", "/api/games/history", params={"page": page, "limit": self.options.page_size}))
+                if not body or not body.get("hasNext"):
+                    break
+                page += 1
+                await self.think()
+            await self.think()
+
+    async def scenario_matchmaking(self, deadline):
+        while time.perf_counter() < deadline:
+            ws = await self.timed("connect /socket/game", self.socket("/socket/game"))
+            if ws is None:
+                await self.think()
+                continue
+            try:
+                await ws.send_json({"type": "IDENTIFY", "playerId": self.username})
+                await self.timed("IDENTIFY", self.receive(ws, {"IDENTIFY_SUCCESS"}, self.options.timeout))
+                await ws.send_json({"type": "FIND_MATCH", "playerId": self.username, "gameType": "1v1"})
+                reply = await self.timed("FIND_MATCH", self.receive(
+                    ws, {"MATCHMAKING_WAITING", "MATCHMAKING_SUCCESS", "ERROR"}, self.options.timeout))
+                if reply and reply["type"] == "MATCHMAKING_WAITING":
+                    await self.timed("wait for opponent", self.receive(
+                        ws, {"MATCHMAKING_SUCCESS"}, self.options.match_timeout))
+                elif reply and reply["type"] == "ERROR":
+                    self.stats.operations["FIND_MATCH"].error(reply.get("message", "ERROR"))
+            finally:
+                await self.close_socket(ws)
+            await self.think()
+
+    async def scenario_chat(self, deadline):
+        ws = await self.timed("connect /ws", self.socket("/ws"))
+        if ws is None:
+            return
+        try:
+            await ws.send_json({"type": "identify", "userId": self.user_id, "username": self.username})
+            while time.perf_counter() < deadline:
+                for i in range(self.options.burst):
+                    marker = f"{self.username}:{time.perf_counter_ns()}:{i}"
+                    await ws.send_json({"type": "general", "content": marker, "username": self.username})
+                    await self.timed("chat echo", self.wait_for_echo(ws, marker))
+                await self.think()
+        finally:
+            await self.close_socket(ws)
+
+    async def wait_for_echo(self, ws, marker):
+        deadline = time.perf_counter() + self.options.timeout
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            message = await ws.receive(timeout=remaining)
+            if message.type != aiohttp.WSMsgType.TEXT:
+                raise aiohttp.ClientError(f"socket {message.type.name.lower()}")
+            if marker in message.data:
+                return
+
+    async def scenario_idle(self, deadline):
+        # chatSocket.js drops messages without content before it looks at the type
+        pings = {"/socket/game": {"type": "PING"}, "/ws": {"type": "PING", "content": "ping"}}
+        sockets = []
+        for path, ping in pings.items():
+            ws = await self.timed(f"connect {path}", self.socket(path))
+            if ws is not None:
+                sockets.append((ws, ping))
+        try:
+            while sockets and time.perf_counter() < deadline:
+                await asyncio.sleep(min(self.options.ping_every, max(0, deadline - time.perf_counter())))
+                for ws, ping in sockets:
+                    await ws.send_json(ping)
+                    await self.timed("PING", self.receive(ws, {"PONG"}, self.options.timeout))
+        finally:
+            for ws, _ in sockets:
+                await self.close_socket(ws)
+
+    async def run(self, scenario, deadline):
+        try:
+            if scenario != "login" and not await self.login() and scenario not in ("chat", "idle"):
+                return
+            await getattr(self, f"scenario_{scenario}")(deadline)
+        except Exception as error:
+            self.stats.operations[f"scenario {scenario}"].error(f"{type(error).__name__}: {error}")
+        finally:
+            await self.http.close()
+
+
+def raise_file_limit():
+    """Every socket is a file descriptor, so lift the soft limit as far as the hard one allows"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+async def reporter(stats, every):
+    while True:
+        await asyncio.sleep(every)
+        stats.report("progress")
+
+async def drive(options):
+    stats = Stats()
+    connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+    deadline = time.perf_counter() + options.duration
+    report_task = asyncio.create_task(reporter(stats, options.report_every))
+
+    tasks = []
+    for i in range(options.users):
+        user = VirtualUser(options.first_user + i, options, stats, connector)
+        tasks.append(asyncio.create_task(user.run(options.scenario, deadline)))
+        if options.ramp:
+            await asyncio.sleep(1 / options.ramp)
+
+    await asyncio.gather(*tasks)
+    report_task.cancel()
+    await connector.close()
+    stats.report(f"{options.scenario} with {options.users} users")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive load through the backend with friends.py accounts")
+    parser.add_argument("--url", default="http://localhost:3100", help="backend base URL (default: %(default)s)")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="history")
+    parser.add_argument("--users", type=int, default=100, help="concurrent virtual users (default: %(default)s)")
+    parser.add_argument("--first-user", type=int, default=1, help="first userN account to use (default: %(default)s)")
+    parser.add_argument("--population", type=int, default=None,
+                        help="accounts that exist, for picking other users (default: --users)")
+    parser.add_argument("--password", default="Hola1234")
+    parser.add_argument("--totp-secret", default=None, help="2FA secret the accounts were seeded with")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run (default: %(default)s)")
+    parser.add_argument("--ramp", type=float, default=200, help="new users per second, 0 for all at once (default: %(default)s)")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between actions in seconds (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10, help="per request timeout in seconds (default: %(default)s)")
+    parser.add_argument("--match-timeout", type=float, default=30, help="how long to wait for an opponent (default: %(default)s)")
+    parser.add_argument("--page-size", type=int, default=8, help="history page size (default: %(default)s)")
+    parser.add_argument("--max-pages", type=int, default=20, help="history pages per visit (default: %(default)s)")
+    parser.add_argument("--burst", type=int, default=5, help="chat messages per burst (default: %(default)s)")
+    parser.add_argument("--ping-every", type=float, default=25, help="idle socket PING interval (default: %(default)s)")
+    parser.add_argument("--report-every", type=float, default=10, help="progress report interval (default: %(default)s)")
+    parser.add_argument("--json", help="write the final histograms to this file")
+    options = parser.parse_args()
+    options.population = options.population or options.users
+
+    limit = raise_file_limit()
+    sockets_per_user = 2 if options.scenario == "idle" else 1
+    if options.users * sockets_per_user > limit - 100:
+        print(f"Warning: open file limit is {limit}, not enough for {options.users} users")
+
+    try:
+        stats = asyncio.run(drive(options))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    if options.json:
+        with open(options.json, "w") as out:
+            json.dump({"scenario": options.scenario, "users": options.users,
+                       "peak_sockets": stats.peak_sockets, "operations": stats.as_dict()}, out, indent=2)
+
+if __name__ == "__main__":
+    main()
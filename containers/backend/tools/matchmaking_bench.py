@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Load matchmaking fixtures into Redis and time the backend's lookups against indexed alternatives.
+
+Usage: python3 matchmaking_bench.py --url redis://localhost:6380 --sessions 1000 100000
+
+src/redis/redisService.js finds waiting games with KEYS game:* and one GET
+per key (findWaitingGame, getWaitingGames, cleanupExpiredGames), so every
+matchmaking request pays for every game in Redis. For each session count the
+tool fills a Redis database with game:* entries shaped like the ones the
+backend writes, a share of them waiting for an opponent, and times:
+
+  findWaitingGame      KEYS, then GET one key at a time until a waiting game turns up
+  getWaitingGames      KEYS, then GET every key (FIND_MATCH on the game socket)
+  cleanupExpiredGames  KEYS, then GET every key (deletes nothing, fixtures are fresh)
+  keys+mget            KEYS, then MGET in pages: same scan, far fewer round trips
+  scan+mget            SCAN MATCH game:* pages with MGET, does not block Redis on one command
+  zset.find            ZRANGE on a per-type sorted set of waiting games scored by createdAt, then GET
+  zset.cleanup         ZRANGEBYSCORE up to the 5 minute cutoff
+  list.find            LINDEX 0 on a per-type FIFO list of waiting games, then GET
+
+Claiming a game from the alternatives is ZPOPMIN / LPOP, same cost as the
+lookups timed here. Fixtures go to a separate logical database (--db, 15
+by default) and are left in place after the run. A database that is not
+empty is only cleared with --flush. The backend connects without picking a
+database, so it only sees fixtures loaded with --db 0.
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import redis
+
+from query_bench import percentile
+
+
+GAME_TTL = 3600             # redisService.createGame / setGameData
+CLEANUP_AGE = 5 * 60        # redisService.cleanupExpiredGames cutoff
+MGET_PAGE = 1000
+WAITING_ZSET = "matchmaking:waiting:{}"
+WAITING_LIST = "matchmaking:queue:{}"
+
+
+def game_id(rng, now_ms):
+    """Same format as the backend: game_<Date.now()>_<9 base36 chars>"""
+    suffix = "".join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(9))
+    return f"game_{now_ms}_{suffix}"
+
+def iso(moment):
+    """JavaScript Date.toISOString()"""
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+def load_fixtures(r, sessions, waiting_share, game_type="1v1", seed=0, batch_size=10000):
+    """Write sessions game:* entries, waiting_share of them waiting, plus the sorted set and list indexes"""
+    rng = random.Random(seed)
+    started_at = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    pipe = r.pipeline(transaction=False)
+    waiting = 0
+    for i in range(sessions):
+        created = now - timedelta(seconds=rng.uniform(0, CLEANUP_AGE - 30))
+        created_ms = int(created.timestamp() * 1000)
+        gid = game_id(rng, created_ms)
+        host, guest = f"user{rng.randint(1, 10 * sessions)}", f"user{rng.randint(1, 10 * sessions)}"
+        game = {"gameId": gid, "hostId": host, "guestId": None, "status": "waiting",
+                "gameType": game_type, "createdAt": iso(created)}
+        if rng.random() < waiting_share:
+            waiting += 1
+            pipe.zadd(WAITING_ZSET.format(game_type), {gid: created_ms})
+            pipe.rpush(WAITING_LIST.format(game_type), gid)
+        else:
+            game.update(guestId=guest, status="active", matchedAt=iso(now))
+        pipe.set(f"game:{gid}", json.dumps(game, separators=(",", ":")), ex=GAME_TTL)
+        if (i + 1) % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    elapsed = time.perf_counter() - started_at
+    print(f"fixtures: {sessions} games ({waiting} waiting) in {elapsed:.2f}s ({sessions / elapsed:.0f} keys/s)")
+    return waiting
+
+def _is_waiting(raw, game_type):
+    if raw is None:
+        return False
+    game = json.loads(raw)
+    return game["status"] == "waiting" and game["gameType"] == game_type and not game["guestId"]
+
+def _mget_pages(r, keys):
+    for low in range(0, len(keys), MGET_PAGE):
+        yield from r.mget(keys[low:low + MGET_PAGE])
+
+# each pattern returns (commands sent, games found); commands are a proxy for round trips
+def find_waiting_game(r, game_type):
+    keys = r.keys("game:*")
+    for sent, key in enumerate(keys, start=2):
+        if _is_waiting(r.get(key), game_type):
+            return sent, 1
+    return len(keys) + 1, 0
+
+def get_waiting_games(r, game_type):
+    keys = r.keys("game:*")
+    waiting = [key for key in keys if _is_waiting(r.get(key), game_type)]
+    return len(keys) + 1, len(waiting)
+
+def cleanup_expired_games(r, game_type):
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=CLEANUP_AGE)
+    keys = r.keys("game:*")
+    expired = 0
+    for key in keys:
+        raw = r.get(key)
+        if raw:
+            game = json.loads(raw)
+            created = datetime.fromisoformat(game["createdAt"].replace("Z", "+00:00"))
+            expired += game["status"] == "waiting" and created < cutoff
+    return len(keys) + 1, expired
+
+def keys_mget(r, game_type):
+    keys = r.keys("game:*")
+    waiting = [raw for raw in _mget_pages(r, keys) if _is_waiting(raw, game_type)]
+    return 1 + -(-len(keys) // MGET_PAGE), len(waiting)
+
+def scan_mget(r, game_type):
+    """Stops at the first page holding a waiting game, like findWaitingGame"""
+    sent, cursor = 0, 0
+    while True:
+        cursor, keys = r.scan(cursor, match="game:*", count=MGET_PAGE)
+        sent += 1
+        if keys:
+            sent += 1
+            waiting = [raw for raw in r.mget(keys) if _is_waiting(raw, game_type)]
+            if waiting:
+                return sent, len(waiting)
+        if cursor == 0:
+            return sent, 0
+
+def zset_find(r, game_type):
+    oldest = r.zrange(WAITING_ZSET.format(game_type), 0, 0)
+    if not oldest:
+        return 1, 0
+    return 2, int(_is_waiting(r.get(b"game:" + oldest[0]), game_type))
+
+def zset_cleanup(r, game_type):
+    cutoff_ms = int((time.time() - CLEANUP_AGE) * 1000)
+    expired = r.zrangebyscore(WAITING_ZSET.format(game_type), "-inf", cutoff_ms, start=0, num=100)
+    return 1, len(expired)
+
+def list_find(r, game_type):
+    first = r.lindex(WAITING_LIST.format(game_type), 0)
+    if not first:
+        return 1, 0
+    return 2, int(_is_waiting(r.get(b"game:" + first), game_type))
+
+PATTERNS = {
+    "findWaitingGame": find_waiting_game,
+    "getWaitingGames": get_waiting_games,
+    "cleanupExpiredGames": cleanup_expired_games,
+    "keys+mget": keys_mget,
+    "scan+mget": scan_mget,
+    "zset.find": zset_find,
+    "zset.cleanup": zset_cleanup,
+    "list.find": list_find,
+}
+
+def benchmark(r, sessions, samples=50, budget=10.0, game_type="1v1", patterns=None):
+    """Time every pattern up to samples calls or budget seconds, whichever comes first"""
+    results = {}
+    for name in patterns or PATTERNS:
+        pattern = PATTERNS[name]
+        pattern(r, game_type)
+        latencies, sent, found = [], 0, 0
+        deadline = time.perf_counter() + budget
+        while len(latencies) < samples and (not latencies or time.perf_counter() < deadline):
+            started_at = time.perf_counter()
+            commands, games = pattern(r, game_type)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+            sent += commands
+            found += games
+        latencies.sort()
+        results[name] = {
+            "calls": len(latencies),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "commands_per_call": sent / len(latencies),
+            "found_per_call": found / len(latencies),
+        }
+    return {"sessions": sessions, "patterns": results}
+
+def print_report(report):
+    print(f"\n== {report['sessions']} sessions")
+    print(f"{'pattern':<22} {'calls':>6} {'p50 ms':>10} {'p95 ms':>10} {'commands':>10} {'found':>8}")
+    for name, result in report["patterns"].items():
+        print(f"{name:<22} {result['calls']:>6} {result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f} "
+              f"{result['commands_per_call']:>10.0f} {result['found_per_call']:>8.1f}")
+
+def print_scaling(reports):
+    """p50 growth of every pattern from the smallest to the largest session count"""
+    small, large = reports[0], reports[-1]
+    print(f"\n== p50 from {small['sessions']} to {large['sessions']} sessions")
+    for name, result in large["patterns"].items():
+        before = small["patterns"][name]["p50_ms"]
+        print(f"{name:<22} {before:>10.3f} -> {result['p50_ms']:>10.3f} ms  (x{result['p50_ms'] / max(before, 1e-9):.1f})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Redis matchmaking lookups against the number of game sessions")
+    parser.add_argument("--url", default="redis://localhost:6380", help="Redis URL (default: %(default)s)")
+    parser.add_argument("--db", type=int, default=15, help="logical database for the fixtures (default: %(default)s)")
+    parser.add_argument("--flush", action="store_true", help="clear the database first even if it is not empty")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 100000],
+                        help="game:* entries per run, smallest first (default: %(default)s)")
+    parser.add_argument("--waiting", type=float, default=0.01,
+                        help="share of the sessions waiting for an opponent (default: %(default)s)")
+    parser.add_argument("--game-type", default="1v1", help="gameType of the fixtures (default: %(default)s)")
+    parser.add_argument("--samples", type=int, default=50, help="calls per pattern (default: %(default)s)")
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="seconds per pattern before it stops sampling early (default: %(default)s)")
+    parser.add_argument("--pattern", action="append", choices=list(PATTERNS), help="only run these patterns")
+    parser.add_argument("--seed", type=int, default=0, help="fixture seed (default: %(default)s)")
+    parser.add_argument("--load-only", action="store_true",
+                        help="load the fixtures for the first session count and exit; the backend reads "
+                             "database 0, so pass --db 0 to try it against them by hand")
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    r = redis.Redis.from_url(args.url, db=args.db)
+    if r.dbsize() and not args.flush:
+        print(f"Redis database {args.db} is not empty, pass --flush to clear it.")
+        sys.exit(1)
+
+    reports = []
+    for sessions in args.sessions:
+        r.flushdb()
+        load_fixtures(r, sessions, args.waiting, game_type=args.game_type, seed=args.seed)
+        if args.load_only:
+            return
+        report = benchmark(r, sessions, samples=args.samples, budget=args.budget,
+                           game_type=args.game_type, patterns=args.pattern)
+        print_report(report)
+        reports.append(report)
+        if args.json:
+            with open(args.json, "a") as out:
+                out.write(json.dumps(report) + "\n")
+    if len(reports) > 1:
+        print_scaling(reports)
+
+if __name__ == "__main__":
+    main()
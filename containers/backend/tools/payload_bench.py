@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Compare game_results.game_data stored as JSON text against the compact deflate encoding.
+
+Usage: python3 payload_bench.py --games 100000 [--timeline]
+
+Builds the same GameData documents the seeder writes (game_results.py) and
+loads them into one scratch database per encoding, then reports:
+
+  bytes/doc    average stored value
+  file MB      database size after the load (game_results only)
+  insert/s     rows per second including encoding, in batch transactions
+  point p50/95 lookup of one id_game plus decoding, in microseconds
+  scan/s       documents per second decoded by a full table scan
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+import game_results
+import game_synth
+import game_timeline
+from query_bench import percentile
+
+
+SCHEMA = """
+    CREATE TABLE game_results (
+        id_game INTEGER PRIMARY KEY,
+        game_data TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def sample_documents(n, timeline=False, users=10000, seed=0):
+    """n GameData JSON documents of synthetic games between user1..user<users>"""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, users + 1)
+    player1_ids, player2_ids = game_synth.random_pairs(rng, ids, n)
+    games = game_synth.synthesize_games(rng, player1_ids, player2_ids)
+    game_timeline.stamp(rng, games, time.time() - rng.random(n) * 180 * 86400)
+    names = np.array([None] + [f"user{i}" for i in ids], dtype=object)
+    return game_results.documents(rng, games, names, timeline=timeline), games['ended_at'].tolist()
+
+def benchmark_encoding(path, encoding, texts, saved_at, batch_size=5000, samples=2000, seed=0):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+
+    started_at = time.perf_counter()
+    for low in range(0, len(texts), batch_size):
+        rows = [(i + 1, game_results.encode(text, encoding), saved)
+                for i, (text, saved) in enumerate(zip(texts[low:low + batch_size], saved_at[low:low + batch_size]), low)]
+        with conn:
+            conn.executemany(game_results.INSERT_SQL, rows)
+    insert_seconds = time.perf_counter() - started_at
+    stored = conn.execute("SELECT SUM(length(game_data)) FROM game_results").fetchone()[0]
+    conn.close()
+    file_bytes = os.path.getsize(path)
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(samples):
+        id_game = rng.randint(1, len(texts))
+        lookup_at = time.perf_counter()
+        value = conn.execute("SELECT game_data FROM game_results WHERE id_game = ?", (id_game,)).fetchone()[0]
+        game_results.decode(value)
+        latencies.append((time.perf_counter() - lookup_at) * 1e6)
+    latencies.sort()
+
+    scan_at = time.perf_counter()
+    for (value,) in conn.execute("SELECT game_data FROM game_results"):
+        game_results.decode(value)
+    scan_seconds = time.perf_counter() - scan_at
+    conn.close()
+
+    return {
+        "encoding": encoding,
+        "bytes_per_doc": stored / len(texts),
+        "file_mb": file_bytes / 1e6,
+        "insert_per_s": len(texts) / insert_seconds,
+        "point_p50_us": percentile(latencies, 50),
+        "point_p95_us": percentile(latencies, 95),
+        "scan_per_s": len(texts) / scan_seconds,
+    }
+
+def print_report(results, n, timeline):
+    print(f"\n== {n} game_data documents{' with timelines' if timeline else ''}")
+    print(f"{'encoding':<10} {'bytes/doc':>10} {'file MB':>9} {'insert/s':>10} {'point p50':>10} "
+          f"{'point p95':>10} {'scan/s':>10}")
+    for result in results:
+        print(f"{result['encoding']:<10} {result['bytes_per_doc']:>10.0f} {result['file_mb']:>9.1f} "
+              f"{result['insert_per_s']:>10.0f} {result['point_p50_us']:>10.1f} {result['point_p95_us']:>10.1f} "
+              f"{result['scan_per_s']:>10.0f}")
+    base = results[0]
+    for result in results[1:]:
+        print(f"{result['encoding']}: {base['file_mb'] / result['file_mb']:.1f}x smaller file, "
+              f"{result['insert_per_s'] / base['insert_per_s']:.2f}x insert rate, "
+              f"{result['point_p50_us'] / base['point_p50_us']:.2f}x point lookup time")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game_data encodings of game_results")
+    parser.add_argument("--games", type=int, default=100000, help="documents to load (default: %(default)s)")
+    parser.add_argument("--timeline", action="store_true", help="documents carry an event timeline")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per transaction (default: %(default)s)")
+    parser.add_argument("--samples", type=int, default=2000, help="point lookups per encoding (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for documents and lookups (default: %(default)s)")
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    texts, saved_at = sample_documents(args.games, timeline=args.timeline, seed=args.seed)
+    print(f"Built {len(texts)} documents in {time.perf_counter() - started_at:.2f}s")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for encoding in game_results.ENCODINGS:
+            results.append(benchmark_encoding(os.path.join(tmp, f"{encoding}.db"), encoding, texts, saved_at,
+                                              batch_size=args.batch_size, samples=args.samples, seed=args.seed))
+    print_report(results, len(texts), args.timeline)
+    if args.json:
+        with open(args.json, "a") as out:
+            out.write(json.dumps({"games": len(texts), "timeline": args.timeline, "encodings": results}) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Headless port of pong/ClassicPhysicsEngine.js that plays thousands of classic matches at once.
+
+Usage: python3 pong_sim.py --matches 10000 [--vs-ai] [--difficulty medium]
+
+Every match is a lane of NumPy arrays advanced by the same 120 Hz step the
+backend runs (updatePaddles, updateBall, increaseBallSpeed, checkCollisions,
+handlePaddleCollision, checkScoring), so scores, hits, served balls and match
+length come out of the physics instead of independent random draws. Paddles
+are driven by simple policies: human players of a given skill, or ButiBot,
+ported from the frontend's AISystem. Run as a script it reports the cost of a
+physics tick and the resulting stat distributions.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import game_synth
+
+
+# pong/ClassicGameSession.js gameState and loop
+WIDTH, HEIGHT = 1800, 800
+PADDLE1_X, PADDLE2_X = 60, 1740
+PADDLE_HEIGHT, PADDLE_WIDTH = 80, 10
+BALL_RADIUS = 10
+TICK = 1 / 120
+# pong/ClassicPhysicsEngine.js
+PADDLE_SPEED = 800
+BALL_SPEED_MULTIPLIER = 120
+BALL_SPEED_INCREASE = 0.3
+BALL_DELAY = 2.0
+SPAWN_SPEED = 4
+MAX_SPEED = 20
+WALL_TOP = 60 + 20 / 2
+WALL_BOTTOM = 690 - 20 / 2
+PADDLE_MIN_Y = WALL_TOP + PADDLE_HEIGHT / 2
+PADDLE_MAX_Y = WALL_BOTTOM - PADDLE_HEIGHT / 2
+# ClassicGameSession.update: first to 11 with a two goal lead, or a draw at 20-20
+WIN_SCORE, WIN_MARGIN, DRAW_SCORE = 11, 2, 20
+# safety net for two policies that never miss
+MAX_TICKS = 20 * 60 * 120
+
+# frontend pong/systems/AISystem.ts: one decision per second, aim error, dead zone and paddle
+# speed by difficulty (the frontend moves human paddles at speed 20)
+BUTIBOT = {
+    "easy": {"accuracy": 0.70, "dead_zone": 25, "speed": 10 / 20},
+    "medium": {"accuracy": 0.85, "dead_zone": 15, "speed": 8 / 20},
+    "hard": {"accuracy": 0.95, "dead_zone": 8, "speed": 12 / 20},
+}
+BUTIBOT_INTERVAL = 1.0
+
+ONLINE_CONFIG = json.dumps({"mode": "online", "classicMode": True, "variant": "1v1"})
+
+
+def human_policy(skill):
+    """Paddle policy arrays for human players of skill 0 (new) .. 1 (expert)"""
+    skill = np.asarray(skill, dtype=np.float64)
+    return {
+        "interval": 0.08 + 0.30 * (1 - skill),      # seconds between looks at the ball
+        "error": 30 + 120 * (1 - skill),             # aim error range in px
+        "dead_zone": np.full(skill.shape, 8.0),
+        "anticipation": skill,                       # 0 follows the ball, 1 aims at the interception
+        "speed_error": np.full(skill.shape, 0.15),   # extra error per serve speed gained, ButiBot has none
+        "speed": np.ones(skill.shape),               # share of PADDLE_SPEED
+    }
+
+def butibot_policy(n, difficulty="medium"):
+    params = BUTIBOT[difficulty]
+    return {
+        "interval": np.full(n, BUTIBOT_INTERVAL),
+        "error": np.full(n, (1 - params["accuracy"]) * 60),
+        "dead_zone": np.full(n, float(params["dead_zone"])),
+        "anticipation": np.ones(n),
+        "speed_error": np.zeros(n),
+        "speed": np.full(n, params["speed"]),
+    }
+
+def _fold(y):
+    """Reflect predicted ball heights off the walls like AISystem.predictBallInterception"""
+    low, high = WALL_TOP + BALL_RADIUS, WALL_BOTTOM - BALL_RADIUS
+    span = high - low
+    folded = np.mod(y - low, 2 * span)
+    return low + np.where(folded > span, 2 * span - folded, folded)
+
+def _aim(s, side, rng, due):
+    """New paddle targets for the lanes in due (side 1 or 2)"""
+    policy, paddle_x = (s["p1"], PADDLE1_X) if side == 1 else (s["p2"], PADDLE2_X)
+    bx, by, vx, vy = s["bx"][due], s["by"][due], s["vx"][due], s["vy"][due]
+    approaching = (vx < 0) if side == 1 else (vx > 0)
+    visible = bx >= 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        seconds = np.where(approaching, (paddle_x - bx) / (vx * BALL_SPEED_MULTIPLIER), 0.0)
+    intercept = _fold(by + vy * BALL_SPEED_MULTIPLIER * np.maximum(seconds, 0))
+    anticipation = policy["anticipation"][due]
+    target = by + anticipation * (intercept - by)
+    speed_factor = 1 + policy["speed_error"][due] * (np.hypot(vx, vy) / SPAWN_SPEED - 1)
+    target += (rng.random(len(target)) - 0.5) * policy["error"][due] * speed_factor
+    target = np.where(visible, target, (WALL_TOP + WALL_BOTTOM) / 2)
+    return np.clip(target, PADDLE_MIN_Y, PADDLE_MAX_Y)
+
+def _new_state(rng, lanes, p1_policy, p2_policy):
+    """Fresh matches for the given result lanes, waiting for their first serve"""
+    n = len(lanes)
+    p1_policy = {name: array[lanes] for name, array in p1_policy.items()}
+    p2_policy = {name: array[lanes] for name, array in p2_policy.items()}
+    return {
+        "lane": lanes,
+        "bx": np.full(n, -100.0), "by": np.full(n, -100.0),
+        "vx": np.zeros(n), "vy": np.zeros(n),
+        "y1": np.full(n, HEIGHT / 2), "y2": np.full(n, HEIGHT / 2),
+        "t1": np.full(n, HEIGHT / 2), "t2": np.full(n, HEIGHT / 2),
+        "next1": rng.random(n) * p1_policy["interval"], "next2": rng.random(n) * p2_policy["interval"],
+        "delay": np.full(n, BALL_DELAY),
+        "score1": np.zeros(n, dtype=np.int32), "score2": np.zeros(n, dtype=np.int32),
+        "hits1": np.zeros(n, dtype=np.int32), "hits2": np.zeros(n, dtype=np.int32),
+        "balls": np.zeros(n, dtype=np.int32),
+        "ticks": np.zeros(n, dtype=np.int64),
+        "p1": p1_policy, "p2": p2_policy,
+    }
+
+def _compact(s, keep, fresh=None):
+    """Drop the finished lanes and append fresh matches in their place"""
+    for key, value in s.items():
+        if key in ("p1", "p2"):
+            s[key] = {name: array[keep] if fresh is None else np.concatenate([array[keep], fresh[key][name]])
+                      for name, array in value.items()}
+        else:
+            s[key] = value[keep] if fresh is None else np.concatenate([value[keep], fresh[key]])
+
+def _step(s, rng):
+    """One ClassicPhysicsEngine.update(TICK) for every live lane; returns the lanes that scored"""
+    s["ticks"] += 1
+
+    # paddle policies look at the ball every interval and steer towards their target every tick
+    for side in (1, 2):
+        timer = s[f"next{side}"]
+        timer -= TICK
+        due = np.flatnonzero(timer <= 0)
+        if len(due):
+            s[f"t{side}"][due] = _aim(s, side, rng, due)
+            timer[due] += s[f"p{side}"]["interval"][due]
+        delta = s[f"t{side}"] - s[f"y{side}"]
+        move = np.where(np.abs(delta) < s[f"p{side}"]["dead_zone"], 0, np.sign(delta))
+        step = move * s[f"p{side}"]["speed"] * (PADDLE_SPEED * TICK)
+        s[f"y{side}"] = np.clip(s[f"y{side}"] + step, PADDLE_MIN_Y, PADDLE_MAX_Y)
+
+    # ball delay after a goal, then spawnBall (the spawn tick does not move the ball)
+    waiting = s["delay"] > 0
+    s["delay"] -= TICK * waiting
+    spawn = waiting & (s["delay"] <= 0)
+    if spawn.any():
+        count = int(spawn.sum())
+        angle = (rng.random(count) - 0.5) * np.pi / 3
+        direction = np.where(rng.random(count) > 0.5, 1.0, -1.0)
+        s["bx"][spawn] = WIDTH / 2
+        s["by"][spawn] = HEIGHT / 2
+        s["vx"][spawn] = np.cos(angle) * SPAWN_SPEED * direction
+        s["vy"][spawn] = np.sin(angle) * SPAWN_SPEED
+        s["balls"][spawn] += 1
+    live = ~waiting
+    if not live.any():
+        return np.zeros(len(live), dtype=bool)
+
+    # updateBall: move, bounce off the walls, increaseBallSpeed
+    bx, by, vx, vy = s["bx"], s["by"], s["vx"], s["vy"]
+    bx[live] += vx[live] * BALL_SPEED_MULTIPLIER * TICK
+    by[live] += vy[live] * BALL_SPEED_MULTIPLIER * TICK
+    top = live & (by - BALL_RADIUS <= WALL_TOP)
+    vy[top] *= -1
+    by[top] = WALL_TOP + BALL_RADIUS
+    bottom = live & (by + BALL_RADIUS >= WALL_BOTTOM)
+    vy[bottom] *= -1
+    by[bottom] = WALL_BOTTOM - BALL_RADIUS
+    vx[live] += np.sign(vx[live]) * BALL_SPEED_INCREASE * TICK
+    np.clip(vx, -MAX_SPEED, MAX_SPEED, out=vx)
+
+    # checkCollisions / handlePaddleCollision
+    for side, paddle_x, paddle_y, moving, hits in (
+            ("left", PADDLE1_X, s["y1"], vx < 0, s["hits1"]),
+            ("right", PADDLE2_X, s["y2"], vx > 0, s["hits2"])):
+        hit = (live & moving
+               & (bx + BALL_RADIUS >= paddle_x - PADDLE_WIDTH / 2) & (bx - BALL_RADIUS <= paddle_x + PADDLE_WIDTH / 2)
+               & (by + BALL_RADIUS >= paddle_y - PADDLE_HEIGHT / 2) & (by - BALL_RADIUS <= paddle_y + PADDLE_HEIGHT / 2))
+        if not hit.any():
+            continue
+        hits[hit] += 1
+        bounce = np.clip((by[hit] - paddle_y[hit]) / (PADDLE_HEIGHT / 2), -1, 1) * np.pi / 4
+        speed = np.hypot(vx[hit], vy[hit])
+        sign = 1 if side == "left" else -1
+        new_vx = sign * np.abs(np.cos(bounce)) * speed
+        new_vy = np.sin(bounce) * speed
+        # at most 45 degrees keeps |vx| >= 0.707 * speed, so the 0.7 floor in the JS never applies
+        vx[hit], vy[hit] = new_vx, new_vy
+        bx[hit] = paddle_x + sign * (PADDLE_WIDTH / 2 + BALL_RADIUS + 1)
+
+    # checkScoring and startBallDelay
+    left_goal = live & (bx <= 0)
+    right_goal = live & (bx >= WIDTH)
+    s["score2"] += left_goal
+    s["score1"] += right_goal
+    scored = left_goal | right_goal
+    bx[scored] = by[scored] = -100
+    vx[scored] = vy[scored] = 0
+    s["delay"][scored] = BALL_DELAY
+    return scored
+
+def simulate(rng, p1_policy, p2_policy, lanes=4096):
+    """Play every match to the end; returns per-match score1/score2/hits1/hits2/balls/seconds.
+
+    At most lanes matches are in play at once. A finished match hands its
+    lane to the next queued one, so the step loop never idles on a few long
+    rallies while short matches are still waiting.
+    """
+    n = len(p1_policy["interval"])
+    results = {key: np.zeros(n, dtype=np.int64) for key in ("score1", "score2", "hits1", "hits2", "balls", "ticks")}
+    queued = min(lanes, n)
+    s = _new_state(rng, np.arange(queued), p1_policy, p2_policy)
+    steps = 0
+
+    while len(s["lane"]):
+        scored = _step(s, rng)
+        steps += 1
+        if not scored.any() and steps % 1024:
+            continue
+        high, low = np.maximum(s["score1"], s["score2"]), np.minimum(s["score1"], s["score2"])
+        done = (((high >= WIN_SCORE) & (high - low >= WIN_MARGIN))
+                | ((s["score1"] == DRAW_SCORE) & (s["score2"] == DRAW_SCORE))
+                | (s["ticks"] >= MAX_TICKS))
+        if done.any():
+            finished = s["lane"][done]
+            for key in results:
+                results[key][finished] = s[key][done]
+            refill = min(len(finished), n - queued)
+            fresh = None
+            if refill:
+                fresh = _new_state(rng, np.arange(queued, queued + refill), p1_policy, p2_policy)
+                queued += refill
+            _compact(s, ~done, fresh)
+
+    results["seconds"] = results.pop("ticks") * TICK
+    results["steps"] = steps
+    return results
+
+def simulated_games(rng, player1_ids, player2_ids, skill, vs_ai=None, difficulty="medium"):
+    """Play classic matches and return them as a game_synth batch (plus 'seconds' and 'vs_ai').
+
+    skill maps id_user to a 0..1 skill level; where vs_ai is set player2 is
+    ButiBot and plays with the ButiBot policy of the given difficulty.
+    """
+    n = len(player1_ids)
+    vs_ai = np.zeros(n, dtype=bool) if vs_ai is None else np.asarray(vs_ai, dtype=bool)
+    p1_policy = human_policy(skill[player1_ids])
+    p2_policy = human_policy(skill[player2_ids])
+    bot = butibot_policy(n, difficulty)
+    p2_policy = {key: np.where(vs_ai, bot[key], values) for key, values in p2_policy.items()}
+    played = simulate(rng, p1_policy, p2_policy)
+
+    score1, score2 = played["score1"].astype(np.int32), played["score2"].astype(np.int32)
+    outcome = np.full(n, game_synth.DRAW, dtype=np.int8)
+    outcome[score1 > score2] = game_synth.LEFT_WIN
+    outcome[score2 > score1] = game_synth.RIGHT_WIN
+    zeros = np.zeros(n, dtype=np.int32)
+    ai_config = json.dumps({"mode": "local", "classicMode": True, "variant": "1vAI", "difficulty": difficulty})
+
+    games = {
+        'is_tournament': np.zeros(n, dtype=np.int8),
+        'player1_id': player1_ids,
+        'player2_id': player2_ids,
+        'winner_id': np.where(outcome == game_synth.LEFT_WIN, player1_ids,
+                              np.where(outcome == game_synth.RIGHT_WIN, player2_ids, 0)),
+        'player1_score': score1,
+        'player2_score': score2,
+        'game_mode': np.where(vs_ai, 'local', 'online').astype(object),
+        'general_result': game_synth.GENERAL_RESULTS[outcome],
+        'config_json': np.where(vs_ai, ai_config, ONLINE_CONFIG).astype(object),
+        'outcome': outcome,
+        'vs_ai': vs_ai,
+        'seconds': played["seconds"],
+    }
+    # the classic engine only ever serves default balls and has no items or walls
+    for col in game_synth.USAGE_COLUMNS:
+        games[col] = zeros
+    games['default_balls_used'] = played["balls"].astype(np.int32)
+    for side, hits, score, conceded, results in (
+            ('player1', played["hits1"], score1, score2, game_synth.PLAYER1_RESULTS),
+            ('player2', played["hits2"], score2, score1, game_synth.PLAYER2_RESULTS)):
+        games[f'{side}_hits'] = hits.astype(np.int32)
+        games[f'{side}_goals_in_favor'] = score
+        games[f'{side}_goals_against'] = conceded
+        games[f'{side}_powerups_picked'] = zeros
+        games[f'{side}_powerdowns_picked'] = zeros
+        games[f'{side}_ballchanges_picked'] = zeros
+        games[f'{side}_result'] = results[outcome]
+    return games
+
+def player_skills(rng, max_user_id):
+    """Skill level per id_user, most players middling and a few very good or very bad"""
+    return rng.beta(4, 3, size=max_user_id + 1)
+
+def describe(name, values):
+    values = np.asarray(values, dtype=np.float64)
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    print(f"  {name:<16} mean {values.mean():8.1f}   p5 {p5:8.1f}   p50 {p50:8.1f}   p95 {p95:8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the headless classic Pong simulator")
+    parser.add_argument("--matches", type=int, default=10000, help="matches played at once (default: %(default)s)")
+    parser.add_argument("--vs-ai", action="store_true", help="player2 is ButiBot")
+    parser.add_argument("--difficulty", choices=BUTIBOT, default="medium", help="ButiBot difficulty (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    skill = player_skills(rng, 2 * args.matches)
+    player1_ids = np.arange(args.matches)
+    player2_ids = np.arange(args.matches, 2 * args.matches)
+    vs_ai = np.full(args.matches, args.vs_ai)
+
+    started_at = time.perf_counter()
+    p2_policy = butibot_policy(args.matches, args.difficulty) if args.vs_ai else human_policy(skill[player2_ids])
+    played = simulate(rng, human_policy(skill[player1_ids]), p2_policy)
+    elapsed = time.perf_counter() - started_at
+
+    match_ticks = played["seconds"] / TICK
+    print(f"{args.matches} matches, {played['steps']} vectorized steps in {elapsed:.2f}s: "
+          f"{args.matches / elapsed:.0f} matches/s, {match_ticks.sum() / elapsed / 1e6:.2f}M match-ticks/s, "
+          f"{elapsed / match_ticks.sum() * 1e9:.0f} ns per match-tick")
+    describe("minutes", played["seconds"] / 60)
+    describe("goals", played["score1"] + played["score2"])
+    describe("hits", played["hits1"] + played["hits2"])
+    describe("balls served", played["balls"])
+    wins1 = (played["score1"] > played["score2"]).mean()
+    draws = (played["score1"] == played["score2"]).mean()
+    print(f"  player1 wins {wins1:.1%}, draws {draws:.1%}" + (" (player2 is ButiBot)" if vs_ai.all() else ""))
+
+if __name__ == "__main__":
+    main()
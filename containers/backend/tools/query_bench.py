@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Replay the backend's hot SQL (src/api/db/database.js) against seeded databases.
+
+Usage: python3 query_bench.py <db or snapshot.zip> [<db or snapshot.zip> ...]
+
+Each database is benchmarked in turn, so passing fixtures of increasing size
+gives a scaling curve. For every query the report shows p50/p95/p99 latency,
+rows returned, SQLite VM steps (the closest proxy for rows scanned that the
+Python driver exposes) and flags for full scans and temp B-trees taken from
+EXPLAIN QUERY PLAN. Databases with a game_players table also get the history
+queries rewritten on top of it, including keyset pagination, and databases
+with friend_suggestions compare its lookups with the equivalent self-joins.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import friend_suggestions
+import game_players
+import snapshot
+
+
+# Queries copied from src/api/db/database.js; keep them in sync when the backend changes
+GAMES_HISTORY_COLUMNS = """
+    id_game,
+    created_at,
+    is_tournament,
+    player1_id,
+    player2_id,
+    winner_id,
+    player1_score,
+    player2_score,
+    COALESCE(game_mode, 'Classic') as game_mode,
+    smart_contract_link,
+    contract_address
+"""
+QUERIES = {
+    "getGamesHistory.count": (
+        "SELECT COUNT(*) as total FROM games WHERE player1_id = ? OR player2_id = ?",
+        lambda ctx: (ctx["user"], ctx["user"]),
+    ),
+    "getGamesHistory.first_page": (
+        f"SELECT {GAMES_HISTORY_COLUMNS} FROM games WHERE player1_id = ? OR player2_id = ? "
+        "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+        lambda ctx: (ctx["user"], ctx["user"], ctx["limit"], 0),
+    ),
+    "getGamesHistory.deep_page": (
+        f"SELECT {GAMES_HISTORY_COLUMNS} FROM games WHERE player1_id = ? OR player2_id = ? "
+        "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+        lambda ctx: (ctx["user"], ctx["user"], ctx["limit"], ctx["deep_page"] * ctx["limit"]),
+    ),
+    "getFriendsList": (
+        """SELECT u.id_user, u.username, u.email, u.avatar_filename, u.avatar_type, f.created_at
+           FROM friends f
+           JOIN users u ON f.friend_id = u.id_user
+           WHERE f.user_id = ?
+           ORDER BY f.created_at DESC""",
+        lambda ctx: (ctx["user"],),
+    ),
+    "checkFriendship": (
+        "SELECT 1 FROM friends WHERE user_id = ? AND friend_id = ?",
+        lambda ctx: (ctx["user"], ctx["other"]),
+    ),
+    "getUserStats": (
+        "SELECT * FROM user_stats WHERE id_user = ?",
+        lambda ctx: (ctx["user"],),
+    ),
+    "getUserProfileStats": (
+        "SELECT total_games, wins, losses, total_tournaments FROM user_stats WHERE id_user = ?",
+        lambda ctx: (ctx["user"],),
+    ),
+}
+
+# Same history served from the game_players participation table (friends.py backfill-game-players)
+PARTICIPATION_QUERIES = {
+    "game_players.count": (
+        game_players.HISTORY_COUNT_SQL,
+        lambda ctx: (ctx["user"],),
+    ),
+    "game_players.first_page": (
+        game_players.HISTORY_PAGE_SQL,
+        lambda ctx: (ctx["user"], ctx["limit"]),
+    ),
+    "game_players.keyset_page": (
+        game_players.HISTORY_KEYSET_SQL,
+        lambda ctx: (ctx["user"], *ctx["cursor"], ctx["limit"]),
+    ),
+}
+QUERIES.update(PARTICIPATION_QUERIES)
+
+# Mutual friends and suggestions per request against the tables of friends.py suggestions
+SUGGESTION_QUERIES = {
+    "suggestions.self_join": (
+        friend_suggestions.SUGGESTIONS_SELF_JOIN_SQL,
+        lambda ctx: (ctx["user"], ctx["limit"]),
+    ),
+    "suggestions.materialized": (
+        friend_suggestions.SUGGESTIONS_SQL,
+        lambda ctx: (ctx["user"], ctx["limit"]),
+    ),
+    "mutual_friends.self_join": (
+        friend_suggestions.MUTUAL_FRIENDS_SELF_JOIN_SQL,
+        lambda ctx: (ctx["user"], ctx["other"]),
+    ),
+    "mutual_friends.materialized": (
+        friend_suggestions.MUTUAL_FRIENDS_SQL,
+        lambda ctx: (ctx["user"], ctx["other"]),
+    ),
+}
+QUERIES.update(SUGGESTION_QUERIES)
+
+# VM instructions between progress handler calls while counting steps
+STEP_GRANULARITY = 100
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def plan_flags(plan):
+    """Warnings for plan steps that read a whole table or sort into a temp B-tree"""
+    flags = []
+    for detail in plan:
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            flags.append(f"full scan ({detail})")
+        if "TEMP B-TREE" in detail:
+            flags.append(detail.lower())
+    return flags
+
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+def count_steps(conn, sql, params):
+    steps = [0]
+
+    def tick():
+        steps[0] += STEP_GRANULARITY
+        return 0
+
+    conn.set_progress_handler(tick, STEP_GRANULARITY)
+    try:
+        conn.execute(sql, params).fetchall()
+    finally:
+        conn.set_progress_handler(None, 0)
+    return steps[0]
+
+def sample_contexts(conn, samples, limit, deep_page, seed):
+    rng = random.Random(seed)
+    users = [row[0] for row in conn.execute("SELECT id_user FROM users")]
+    if len(users) < 2:
+        raise SystemExit("Need at least 2 users in the database to benchmark.")
+    contexts = []
+    for _ in range(samples):
+        user, other = rng.sample(users, 2)
+        contexts.append({"user": user, "other": other, "limit": limit, "deep_page": deep_page})
+    return contexts
+
+def benchmark_database(path, samples=200, limit=10, deep_page=50, seed=0, queries=None):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    sizes = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+             for table in ("users", "friends", "games", "user_stats")}
+    contexts = sample_contexts(conn, samples, limit, deep_page, seed)
+
+    names = list(queries or QUERIES)
+    has_participation = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'game_players'"
+    ).fetchone()
+    if has_participation:
+        # keyset pages start after the last row of the page before the deep page
+        for ctx in contexts:
+            ctx["cursor"] = conn.execute(
+                "SELECT created_at, id_game FROM game_players WHERE id_user = ? "
+                "ORDER BY created_at DESC, id_game DESC LIMIT 1 OFFSET ?",
+                (ctx["user"], deep_page * limit - 1)
+            ).fetchone() or ("", 0)
+    else:
+        names = [name for name in names if name not in PARTICIPATION_QUERIES]
+    has_suggestions = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'friend_suggestions'"
+    ).fetchone()
+    if not has_suggestions:
+        names = [name for name in names if name not in SUGGESTION_QUERIES]
+
+    results = {}
+    for name in names:
+        sql, make_params = QUERIES[name]
+        # one pass to warm the page cache, then the timed pass
+        for ctx in contexts[:10]:
+            conn.execute(sql, make_params(ctx)).fetchall()
+
+        latencies, rows = [], 0
+        for ctx in contexts:
+            params = make_params(ctx)
+            started_at = time.perf_counter()
+            rows += len(conn.execute(sql, params).fetchall())
+            latencies.append((time.perf_counter() - started_at) * 1000)
+        latencies.sort()
+
+        steps = [count_steps(conn, sql, make_params(ctx)) for ctx in contexts[:20]]
+        plan = explain(conn, sql, make_params(contexts[0]))
+        results[name] = {
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "rows_per_call": rows / len(contexts),
+            "vm_steps_per_call": sum(steps) / len(steps),
+            "plan": plan,
+            "flags": plan_flags(plan),
+        }
+    conn.close()
+    return {"database": path, "sizes": sizes, "samples": samples, "queries": results}
+
+def print_report(report, show_plans=True):
+    sizes = ", ".join(f"{table}={count}" for table, count in report["sizes"].items())
+    print(f"\n== {report['database']} ({sizes})")
+    print(f"{'query':<28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows':>8} {'vm steps':>11}  flags")
+    for name, result in report["queries"].items():
+        print(f"{name:<28} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+              f"{result['rows_per_call']:>8.1f} {result['vm_steps_per_call']:>11.0f}  "
+              f"{'; '.join(result['flags']) or '-'}")
+    if show_plans:
+        for name, result in report["queries"].items():
+            print(f"  {name}:")
+            for detail in result["plan"]:
+                print(f"    {detail}")
+
+def open_fixture(path, tmp):
+    """Snapshots from friends.py are restored to a temporary database first"""
+    if not path.endswith(".zip"):
+        return path
+    restored = os.path.join(tmp, os.path.basename(path)[:-len(".zip")] + ".db")
+    snapshot.restore_snapshot(restored, path)
+    return restored
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend's hot queries on seeded databases")
+    parser.add_argument("databases", nargs="+", help="database files or friends.py snapshots, smallest first")
+    parser.add_argument("--samples", type=int, default=200, help="calls per query (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=10, help="history page size (default: %(default)s)")
+    parser.add_argument("--deep-page", type=int, default=50, help="page number for the deep history query (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the sampled users (default: %(default)s)")
+    parser.add_argument("--query", action="append", choices=list(QUERIES), help="only run these queries")
+    parser.add_argument("--no-plans", action="store_true", help="do not print EXPLAIN QUERY PLAN output")
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in args.databases:
+            if not os.path.exists(path):
+                print(f"Database not found: {path}")
+                sys.exit(1)
+            report = benchmark_database(open_fixture(path, tmp), samples=args.samples, limit=args.limit,
+                                        deep_page=args.deep_page, seed=args.seed, queries=args.query)
+            report["database"] = path
+            print_report(report, show_plans=not args.no_plans)
+            if args.json:
+                with open(args.json, "a") as out:
+                    out.write(json.dumps(report) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Prometheus metrics for friends.py runs, served on /metrics or written to a node-exporter textfile.
+
+friends.py --metrics-port 9105 serves the current values while the action
+runs (Prometheus scrapes backend:9105 as job 'seeder'); --metrics-textfile
+PATH rewrites PATH every few seconds for a textfile collector instead. The
+dashboard is monitoring/grafana/config/dashboards/Seeding_jobs.json.
+
+Exported, all labelled with the action:
+  seed_rows_total{table}            rows written, rate() gives rows/s per table
+  seed_batch_commit_seconds         histogram of writer transaction latency
+  seed_phase_seconds_total{phase}   wall time per seed_profile phase
+  seed_batches_done, seed_batches_total
+  seed_wal_bytes                    size of the database's -wal file
+  seed_elapsed_seconds, seed_running
+"""
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_TABLE = re.compile(r"^\s*(?:INSERT|REPLACE)\s+(?:OR\s+\w+\s+)?INTO\s+(?:main\.)?(\w+)|^\s*UPDATE\s+(\w+)", re.I)
+
+metrics = None
+
+
+def table_of(sql):
+    """Table written by an INSERT/UPDATE statement, or None"""
+    match = _TABLE.match(sql)
+    return match and (match.group(1) or match.group(2))
+
+
+class Metrics:
+    """Current values of one run, rendered in the Prometheus text exposition format"""
+
+    def __init__(self, action, db_path, textfile=None):
+        self.action = action
+        self.wal_path = f"{db_path}-wal"
+        self.textfile = textfile
+        self.lock = threading.Lock()
+        self.rows = defaultdict(int)
+        self.phases = defaultdict(float)
+        self.commit_buckets = [0] * len(BUCKETS)
+        self.commit_count = 0
+        self.commit_sum = 0.0
+        self.batches = (0, 0)
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def render(self):
+        label = f'action="{self.action}"'
+        try:
+            wal_bytes = os.path.getsize(self.wal_path)
+        except OSError:
+            wal_bytes = 0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{{{label}{labels}}} {value}")
+
+        with self.lock:
+            metric("seed_rows_total", "counter", "Rows written by the seeding job",
+                   [("", f',table="{table}"', rows) for table, rows in sorted(self.rows.items())])
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(BUCKETS, self.commit_buckets):
+                cumulative += count
+                buckets.append(("_bucket", f',le="{bound}"', cumulative))
+            buckets.append(("_bucket", ',le="+Inf"', self.commit_count))
+            metric("seed_batch_commit_seconds", "histogram", "Latency of one batch transaction",
+                   buckets + [("_sum", "", self.commit_sum), ("_count", "", self.commit_count)])
+            metric("seed_phase_seconds_total", "counter", "Wall time spent per phase",
+                   [("", f',phase="{phase}"', round(seconds, 6)) for phase, seconds in sorted(self.phases.items())])
+            metric("seed_batches_done", "gauge", "Checkpointed batches of the run", [("", "", self.batches[0])])
+            metric("seed_batches_total", "gauge", "Planned batches of the run", [("", "", self.batches[1])])
+        metric("seed_wal_bytes", "gauge", "Size of the SQLite write-ahead log", [("", "", wal_bytes)])
+        metric("seed_elapsed_seconds", "gauge", "Time since the job started", [("", "", round(elapsed, 3))])
+        metric("seed_running", "gauge", "1 while the job runs", [("", "", int(self.finished_at is None))])
+        return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _write_textfile(path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as out:
+        out.write(metrics.render())
+    os.replace(tmp, path)
+
+def enable(action, db_path, port=None, textfile=None, interval=5.0):
+    """Start exporting; a no-op unless port or textfile is given"""
+    global metrics
+    if port is None and textfile is None:
+        return
+    metrics = Metrics(action, db_path, textfile)
+    if port is not None:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Serving metrics on :{port}/metrics")
+    if textfile is not None:
+        def refresh():
+            while metrics.finished_at is None:
+                _write_textfile(textfile)
+                time.sleep(interval)
+        threading.Thread(target=refresh, name="metrics-textfile", daemon=True).start()
+
+def add_rows(table, rows):
+    if metrics and table:
+        with metrics.lock:
+            metrics.rows[table] += rows
+
+def observe_commit(seconds):
+    if metrics:
+        with metrics.lock:
+            metrics.commit_count += 1
+            metrics.commit_sum += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    metrics.commit_buckets[i] += 1
+                    break
+
+def add_phase(name, seconds):
+    if metrics:
+        with metrics.lock:
+            metrics.phases[name] += seconds
+
+def set_batches(done, total=None):
+    if metrics:
+        with metrics.lock:
+            metrics.batches = (done, metrics.batches[1] if total is None else total)
+
+def finish(linger=0):
+    """Freeze the values, write the textfile once more and keep /metrics up for linger seconds
+    so the last scrape still sees the finished run"""
+    if metrics is None:
+        return
+    metrics.finished_at = time.time()
+    if metrics.textfile:
+        _write_textfile(metrics.textfile)
+    if linger:
+        print(f"Keeping metrics up for {linger:.0f}s")
+        time.sleep(linger)
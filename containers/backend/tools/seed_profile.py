@@ -0,0 +1,206 @@
+"""Profiling for friends.py runs: time per SQL statement, per phase, and optionally per function.
+
+friends.py --profile (before the action) turns it on. Every connection made by
+db_session.connect then times its execute/executemany calls and row fetches
+by normalized statement, and a sqlite3 trace callback counts how many times
+SQLite actually ran each one (once per row for executemany, again for each
+trigger step). Actions mark their phases with phase(), which adds up wall
+time per name, so per-batch phases show as one line. --cprofile PATH also
+records a cProfile of the main thread; the writer thread and worker
+processes show up in the statement and phase times only.
+"""
+import cProfile
+import pstats
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import seed_metrics
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|X'[0-9A-Fa-f]*'|\bNULL\b")
+_VALUE_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LISTS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+
+profile = None
+
+
+def normalize(sql):
+    """Statement text with literals and value lists collapsed, so every row of an insert shares one key"""
+    sql = _LITERALS.sub("?", " ".join(sql.split()))
+    sql = _VALUE_LISTS.sub("?", sql)
+    return _ROW_LISTS.sub("(?)", sql)
+
+
+class Profile:
+    """Aggregated statement, phase and (optionally) function timings of one run"""
+
+    def __init__(self, cprofile_path=None):
+        self.lock = threading.Lock()
+        self.running = threading.local()   # .key: statement the thread is executing, see ProfiledCursor
+        self.statements = defaultdict(lambda: [0, 0, 0.0])   # calls, executions, seconds
+        self.phases = defaultdict(lambda: [0, 0.0])          # calls, seconds
+        self.started_at = time.perf_counter()
+        self.cprofile_path = cprofile_path
+        self.cprofile = cProfile.Profile() if cprofile_path else None
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def add_statement(self, key, seconds, calls=1):
+        with self.lock:
+            entry = self.statements[key]
+            entry[0] += calls
+            entry[2] += seconds
+
+    def trace(self, sql):
+        # executemany traces every row with its values expanded, so rows are counted against the
+        # statement being executed instead of normalizing each one; only implicit COMMITs and
+        # the like get here outside of an execute call
+        key = getattr(self.running, "key", None) or normalize(sql)
+        with self.lock:
+            self.statements[key][1] += 1
+
+    def add_phase(self, name, seconds):
+        with self.lock:
+            entry = self.phases[name]
+            entry[0] += 1
+            entry[1] += seconds
+
+    def report(self, top=15):
+        total = time.perf_counter() - self.started_at
+        print(f"\n== profile: {total:.2f}s wall")
+
+        # the writer thread's phases run alongside the main thread's, so shares can add up past 100%
+        print(f"\n{'phase':<40} {'calls':>7} {'seconds':>10} {'share':>7}")
+        for name, (calls, seconds) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            print(f"{name:<40} {calls:>7} {seconds:>10.2f} {seconds / total:>7.1%}")
+
+        print(f"\n{'statement':<72} {'calls':>8} {'runs':>10} {'seconds':>9} {'share':>7}")
+        ranked = sorted(self.statements.items(), key=lambda item: -item[1][2])
+        for sql, (calls, executions, seconds) in ranked[:top]:
+            text = sql if len(sql) <= 72 else sql[:69] + "..."
+            print(f"{text:<72} {calls:>8} {executions:>10} {seconds:>9.2f} {seconds / total:>7.1%}")
+        if len(ranked) > top:
+            rest = sum(entry[2] for _, entry in ranked[top:])
+            print(f"{f'({len(ranked) - top} more statements)':<72} {'':>8} {'':>10} {rest:>9.2f}")
+
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+            print(f"\n== functions by own time (main thread, full dump in {self.cprofile_path})")
+            pstats.Stats(self.cprofile_path).sort_stats("tottime").print_stats(top)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that charges execute time and row fetch time to its current statement"""
+
+    _key = None
+
+    def _timed(self, method, sql, *args):
+        key = normalize(sql)
+        outer, profile.running.key = getattr(profile.running, "key", None), key
+        started_at = time.perf_counter()
+        try:
+            return method(self, sql, *args)
+        finally:
+            profile.running.key = outer
+            self._key = key
+            profile.add_statement(key, time.perf_counter() - started_at)
+
+    def _fetch(self, method, *args):
+        started_at = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            if self._key:
+                profile.add_statement(self._key, time.perf_counter() - started_at, calls=0)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self._timed(sqlite3.Cursor.executescript, script)
+
+    def fetchone(self):
+        return self._fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(sqlite3.Cursor.fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(sqlite3.Cursor.fetchall)
+
+    def __next__(self):
+        return self._fetch(sqlite3.Cursor.__next__)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through ProfiledCursor"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def _add_phase(name, seconds):
+    if profile:
+        profile.add_phase(name, seconds)
+    seed_metrics.add_phase(name, seconds)
+
+def enable(cprofile_path=None):
+    global profile
+    profile = Profile(cprofile_path)
+
+def connection_factory():
+    """sqlite3.connect factory for db_session.connect: profiled while profiling is on"""
+    return ProfiledConnection if profile else sqlite3.Connection
+
+def attach(conn):
+    if profile:
+        conn.set_trace_callback(profile.trace)
+
+@contextmanager
+def phase(name):
+    """Add the wall time of the block to phase name (a no-op unless profiling or exporting metrics)"""
+    if profile is None and seed_metrics.metrics is None:
+        yield
+        return
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_phase(name, time.perf_counter() - started_at)
+
+def timed_iter(name, iterable):
+    """Yield from iterable, adding the time spent producing each item to phase name"""
+    if profile is None and seed_metrics.metrics is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        started_at = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _add_phase(name, time.perf_counter() - started_at)
+        yield item
+
+def report():
+    if profile:
+        profile.report()
@@ -0,0 +1,114 @@
+"""Checkpoints for long seeding runs, so an interrupted run can be resumed batch by batch.
+
+A run is split into numbered batches. Batch i draws from its own generator
+seeded with (seed, i), so any batch regenerates identically without replaying
+the ones before it. Each batch is committed in the same transaction as the
+seed_progress row that counts it, which makes a completed batch and its
+checkpoint impossible to separate.
+"""
+import json
+
+import numpy as np
+
+import seed_metrics
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS seed_progress (
+        id_progress INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT NOT NULL,
+        number INTEGER NOT NULL,
+        seed INTEGER,
+        options TEXT,
+        batches_total INTEGER NOT NULL,
+        batches_done INTEGER NOT NULL DEFAULT 0,
+        state TEXT,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+"""
+UNFINISHED_SQL = """
+    SELECT id_progress, action, number, seed, options, batches_total, batches_done, state
+    FROM seed_progress WHERE action = ? AND finished_at IS NULL
+    ORDER BY id_progress DESC LIMIT 1
+"""
+
+
+def find_unfinished(conn, action):
+    """The newest interrupted run of action as a dict, or None"""
+    conn.execute(SCHEMA)
+    row = conn.execute(UNFINISHED_SQL, (action,)).fetchone()
+    if row is None:
+        return None
+    keys = ("id_progress", "action", "number", "seed", "options", "batches_total", "batches_done", "state")
+    run = dict(zip(keys, row))
+    run["options"] = json.loads(run["options"] or "{}")
+    run["state"] = json.loads(run["state"] or "{}")
+    return run
+
+
+class Run:
+    """One checkpointed run: which batches are already committed and what state they were planned with"""
+
+    def __init__(self, id_progress, seed, batches_total, batches_done, state):
+        self.id_progress = id_progress
+        self.seed = seed
+        self.batches_total = batches_total
+        self.batches_done = batches_done
+        self.state = state
+
+    @classmethod
+    def open(cls, conn, action, number, seed, batch_size, batches_total=None, options=None, state=None, resume=False):
+        """Continue the interrupted run of action when resume is set, otherwise start a new one.
+
+        batches_total defaults to number / batch_size rounded up. options are
+        the keyword arguments a resumed run must be called with again; state is
+        whatever the action planned up front (first ids...).
+        """
+        if batches_total is None:
+            batches_total = -(-number // batch_size)
+        conn.execute(SCHEMA)
+        if resume:
+            run = find_unfinished(conn, action)
+            if run is None:
+                raise ValueError(f"No interrupted {action} run to resume")
+            print(f"Resuming {action} run {run['id_progress']} at batch "
+                  f"{run['batches_done']}/{run['batches_total']}")
+            seed_metrics.set_batches(run["batches_done"], run["batches_total"])
+            return cls(run["id_progress"], run["seed"], run["batches_total"], run["batches_done"], run["state"])
+
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO seed_progress (action, number, seed, options, batches_total, state) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (action, number, seed, json.dumps({"batch_size": batch_size, **(options or {})}),
+                 batches_total, json.dumps(state or {}))
+            )
+        seed_metrics.set_batches(0, batches_total)
+        return cls(cursor.lastrowid, seed, batches_total, 0, state or {})
+
+    def rng(self, index):
+        return np.random.default_rng([self.seed, index])
+
+    def pending(self, index):
+        return index >= self.batches_done
+
+    def checkpoint(self, index):
+        """(sql, rows) marking batch index as done, to commit with the batch's own rows"""
+        return (
+            "UPDATE seed_progress SET batches_done = ?, updated_at = CURRENT_TIMESTAMP WHERE id_progress = ?",
+            [(index + 1, self.id_progress)],
+        )
+
+    def save(self, key, value):
+        """(sql, rows) storing value under key in the run's state, to commit with the work it records"""
+        return (
+            "UPDATE seed_progress SET state = json_set(COALESCE(state, '{}'), ?, json(?)), "
+            "updated_at = CURRENT_TIMESTAMP WHERE id_progress = ?",
+            [(f"$.{key}", json.dumps(value), self.id_progress)],
+        )
+
+    def finish(self, conn):
+        conn.execute("UPDATE seed_progress SET finished_at = CURRENT_TIMESTAMP WHERE id_progress = ?",
+                     (self.id_progress,))
@@ -0,0 +1,169 @@
+"""Parallel seeding: worker processes fill private shard databases that are merged with ATTACH.
+
+SQLite allows one writer, so instead of sharing the live database every
+worker builds its share of users, games, game_players and user_stats in a
+temporary file. Ids are planned up front from the target's current maxima.
+Before the merge the run reserves its user and game id ranges in
+sqlite_sequence, past whatever the target holds by then, and shifts every
+shard into them. Foreign keys stay consistent, and rows the backend writes
+between two shard commits take ids after the ranges.
+"""
+import os
+import time
+from dataclasses import dataclass
+
+import bcrypt
+import numpy as np
+
+import db_session
+import game_players
+import game_synth
+import game_timeline
+import seed_metrics
+from stats_accumulator import STAT_COLUMNS, UPSERT_STATS_SQL, StatsAccumulator
+
+
+# tables a shard writes, copied from the target so shards always match its schema
+SHARD_TABLES = ("users", "games", "user_stats", "game_players")
+USER_COLUMNS = ("id_user", "username", "email", "password", "provider")
+INSERT_USER_SQL = f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})"
+SHARD_STATS_SQL = (
+    f"SELECT id_user + ?, {', '.join(STAT_COLUMNS)}, highest_score, "
+    "win_rate, average_score, goals_per_game, hits_per_game, powerups_per_game FROM shard.user_stats"
+)
+
+
+@dataclass
+class Shard:
+    index: int
+    path: str
+    schema: list
+    password: str
+    rounds: int
+    shared_hash: str
+    first_user: int      # userN number of the shard's first account
+    first_user_id: int   # planned id_user of that account
+    users: int
+    all_user_ids: tuple  # (low, high) planned ids of every account in the run, games pick from all shards
+    first_game_id: int
+    games: int
+    game_offset: int     # position of the shard's first game among all the run's games, in time order
+    total_games: int
+    timeline: game_timeline.Timeline
+    activity_seed: int   # same for every shard, so all of them agree on who the heavy players are
+    skew: float
+    seed: np.random.SeedSequence
+    batch_size: int
+
+
+def shard_schema(conn):
+    """CREATE TABLE statements of SHARD_TABLES in the target database"""
+    placeholders = ", ".join("?" * len(SHARD_TABLES))
+    return [row[0] for row in conn.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})", SHARD_TABLES
+    )]
+
+def plan_shards(n_users, n_games, shards, first_user, first_user_id, first_game_id, seed, tmp, schema, **options):
+    """Split the user and game id ranges (and the timeline) into contiguous per-shard blocks"""
+    user_bounds = np.linspace(0, n_users, shards + 1).astype(int)
+    game_bounds = np.linspace(0, n_games, shards + 1).astype(int)
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    all_user_ids = (first_user_id, first_user_id + n_users - 1)
+    return [
+        Shard(
+            index=i,
+            path=os.path.join(tmp, f"shard{i}.db"),
+            schema=schema,
+            first_user=first_user + int(user_bounds[i]),
+            first_user_id=first_user_id + int(user_bounds[i]),
+            users=int(user_bounds[i + 1] - user_bounds[i]),
+            all_user_ids=all_user_ids,
+            first_game_id=first_game_id + int(game_bounds[i]),
+            games=int(game_bounds[i + 1] - game_bounds[i]),
+            game_offset=int(game_bounds[i]),
+            total_games=n_games,
+            activity_seed=seed,
+            seed=seeds[i],
+            **options,
+        )
+        for i in range(shards)
+    ]
+
+def build_shard(shard):
+    """Worker process entry point: write one shard database and return its row counts"""
+    started_at = time.perf_counter()
+    conn = db_session.connect(shard.path, "bulk")
+    for sql in shard.schema:
+        conn.execute(sql)
+    rng = np.random.default_rng(shard.seed)
+
+    def user_rows():
+        for i in range(shard.users):
+            username = f"user{shard.first_user + i}"
+            hashed_password = shard.shared_hash or bcrypt.hashpw(
+                shard.password.encode('utf-8'), bcrypt.gensalt(shard.rounds)).decode('utf-8')
+            yield (shard.first_user_id + i, username, f"{username}@gmail.com", hashed_password, "local")
+
+    with conn:
+        conn.executemany(INSERT_USER_SQL, user_rows())
+
+    user_ids = np.arange(shard.all_user_ids[0], shard.all_user_ids[1] + 1, dtype=np.int64)
+    activity = game_timeline.activity_weights(np.random.default_rng(shard.activity_seed), len(user_ids), shard.skew)
+    stats = StatsAccumulator(int(user_ids[-1]))
+    for offset in range(0, shard.games, shard.batch_size):
+        size = min(shard.batch_size, shard.games - offset)
+        player1_ids, player2_ids = game_synth.random_pairs(rng, user_ids, size, activity)
+        games = game_synth.synthesize_games(rng, player1_ids, player2_ids)
+        low = (shard.game_offset + offset) / shard.total_games
+        game_timeline.stamp(rng, games, shard.timeline.sample(rng, low, low + size / shard.total_games, size))
+        with conn:
+            conn.executemany(game_synth.INSERT_GAME_WITH_ID_SQL,
+                             game_synth.game_rows(games, first_id=shard.first_game_id + offset))
+        stats.add_games(games)
+
+    if shard.games:
+        conn.execute(game_players.BACKFILL_SQL, (0, shard.first_game_id + shard.games) * 2)
+    stats.write(conn.cursor())
+    conn.commit()
+    conn.close()
+    return shard.index, shard.users, shard.games, time.perf_counter() - started_at
+
+def merge_shard(conn, shard, user_delta, game_delta):
+    """Copy one shard into the target with ids shifted by the deltas and commit it.
+
+    Each shard is its own transaction: a database a transaction has read from
+    cannot be detached before it ends.
+    """
+    conn.execute("ATTACH DATABASE ? AS shard", (shard.path,))
+    try:
+        columns = ", ".join(USER_COLUMNS[1:])
+        users = conn.execute(f"INSERT INTO main.users ({', '.join(USER_COLUMNS)}) "
+                             f"SELECT id_user + ?, {columns} FROM shard.users ORDER BY id_user", (user_delta,))
+        seed_metrics.add_rows("users", users.rowcount)
+
+        columns = [col for col in game_synth.GAME_COLUMNS if col not in ("player1_id", "player2_id", "winner_id")]
+        games = conn.execute(
+            f"INSERT INTO main.games (id_game, player1_id, player2_id, winner_id, {', '.join(columns)}) "
+            f"SELECT id_game + ?, player1_id + ?, player2_id + ?, winner_id + ?, {', '.join(columns)} "
+            "FROM shard.games ORDER BY id_game",
+            (game_delta, user_delta, user_delta, user_delta)
+        )
+        seed_metrics.add_rows("games", games.rowcount)
+        players = conn.execute(
+            "INSERT OR IGNORE INTO main.game_players (id_user, created_at, id_game, side, result) "
+            "SELECT id_user + ?, created_at, id_game + ?, side, result FROM shard.game_players "
+            "ORDER BY id_user, created_at, id_game",
+            (user_delta, game_delta)
+        )
+        seed_metrics.add_rows("game_players", players.rowcount)
+        # several shards may have played games for the same user, so stats are added, not copied
+        stats = conn.execute(SHARD_STATS_SQL, (user_delta,)).fetchall()
+        conn.executemany(UPSERT_STATS_SQL, stats)
+        conn.commit()
+    except BaseException:
+        # the shard cannot be detached while the failed transaction still reads it
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE shard")
+    return len(stats)
@@ -0,0 +1,105 @@
+"""Seeded dataset snapshots: a compacted SQLite image plus a manifest, in one zip file"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+
+FORMAT_VERSION = 1
+DATA_ENTRY = "data.sqlite"
+MANIFEST_ENTRY = "manifest.json"
+COMPRESSION = {
+    "deflate": zipfile.ZIP_DEFLATED,
+    "lzma": zipfile.ZIP_LZMA,
+    "none": zipfile.ZIP_STORED,
+}
+
+
+def schema_fingerprint(conn):
+    """Hash of every table and index definition, to spot fixtures built for another schema"""
+    rows = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL "
+        "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE 'seed_%' ORDER BY type, name"
+    ).fetchall()
+    return hashlib.sha256(json.dumps(rows).encode('utf-8')).hexdigest()[:16]
+
+def row_counts(conn):
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+def seed_runs(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seed_runs'").fetchone()
+    if not exists:
+        return []
+    cursor = conn.execute("SELECT * FROM seed_runs ORDER BY id_run")
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+def create_snapshot(db_path, path, compression="deflate"):
+    """Write db_path to path as a compacted, compressed snapshot and return its manifest"""
+    started_at = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp:
+        image = os.path.join(tmp, DATA_ENTRY)
+        # VACUUM INTO gives a defragmented, consistent copy without blocking writers for long
+        conn.execute("VACUUM INTO ?", (image,))
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "created_at": datetime.now().isoformat(" ", "seconds"),
+            "source": os.path.abspath(db_path),
+            "schema_fingerprint": schema_fingerprint(conn),
+            "row_counts": row_counts(conn),
+            "seed_runs": seed_runs(conn),
+            "image_bytes": os.path.getsize(image),
+        }
+        conn.close()
+
+        with zipfile.ZipFile(path, "w", compression=COMPRESSION[compression]) as archive:
+            archive.writestr(MANIFEST_ENTRY, json.dumps(manifest, indent=2))
+            archive.write(image, DATA_ENTRY)
+
+    elapsed = time.perf_counter() - started_at
+    print(f"Snapshot {path}: {manifest['image_bytes'] / 2**20:.1f} MB database, "
+          f"{os.path.getsize(path) / 2**20:.1f} MB on disk, {elapsed:.2f}s")
+    return manifest
+
+def read_manifest(path):
+    with zipfile.ZipFile(path) as archive:
+        return json.loads(archive.read(MANIFEST_ENTRY))
+
+def restore_snapshot(db_path, path):
+    """Replace the contents of db_path with a snapshot through the SQLite backup API"""
+    started_at = time.perf_counter()
+    manifest = read_manifest(path)
+    if manifest["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest['format_version']} in {path}")
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(db_path))) as tmp:
+        with zipfile.ZipFile(path) as archive:
+            image = archive.extract(DATA_ENTRY, tmp)
+
+        source = sqlite3.connect(image)
+        target = sqlite3.connect(db_path, timeout=30)
+        source.backup(target, pages=16384)
+        source.close()
+
+        counts = row_counts(target)
+        target.close()
+
+    mismatched = {table: (count, counts.get(table))
+                  for table, count in manifest["row_counts"].items() if counts.get(table) != count}
+    if mismatched:
+        raise RuntimeError(f"Restored row counts differ from the manifest: {mismatched}")
+
+    elapsed = time.perf_counter() - started_at
+    total = sum(counts.values())
+    print(f"Restored {path} into {db_path}: {total} rows in {len(counts)} tables, {elapsed:.2f}s")
+    for table, count in sorted(counts.items()):
+        print(f"  {table}: {count}")
+    return manifest
@@ -0,0 +1,131 @@
+"""Per-user user_stats totals accumulated in memory while games are seeded"""
+import numpy as np
+
+import game_synth
+import seed_metrics
+
+
+# user_stats counters fed by each side of a game, in column order
+PLAYER_STAT_COLUMNS = {
+    'total_hits': 'hits',
+    'total_goals_scored': 'goals_in_favor',
+    'total_goals_conceded': 'goals_against',
+    'total_powerups_picked': 'powerups_picked',
+    'total_powerdowns_picked': 'powerdowns_picked',
+    'total_ballchanges_picked': 'ballchanges_picked',
+}
+# user_stats counters fed by game-wide usage columns (both players get them)
+USAGE_STAT_COLUMNS = {
+    'total_' + col[:-len('_used')]: col for col in game_synth.USAGE_COLUMNS
+}
+STAT_COLUMNS = (
+    ['total_games', 'wins', 'losses', 'draws']
+    + list(PLAYER_STAT_COLUMNS)
+    + list(USAGE_STAT_COLUMNS)
+    + ['vs_ai_games', 'total_tournaments', 'tournaments_won', 'tournaments_lost']
+)
+COLUMN_INDEX = {col: i for i, col in enumerate(STAT_COLUMNS)}
+
+UPSERT_STATS_SQL = f"""
+    INSERT INTO user_stats (
+        id_user, {', '.join(STAT_COLUMNS)}, highest_score,
+        win_rate, average_score, goals_per_game, hits_per_game, powerups_per_game
+    ) VALUES ({', '.join('?' * (len(STAT_COLUMNS) + 7))})
+    ON CONFLICT(id_user) DO UPDATE SET
+        {', '.join(f'{col} = {col} + excluded.{col}' for col in STAT_COLUMNS)},
+        highest_score = MAX(highest_score, excluded.highest_score),
+        -- the expressions of updateUserStats in database.js: win_rate in percent, the averages
+        -- divide INTEGER columns, an integer division, so they are whole numbers
+        win_rate = CASE WHEN total_games + excluded.total_games > 0
+            THEN ROUND((wins + excluded.wins) * 100.0 / (total_games + excluded.total_games), 2)
+            ELSE 0 END,
+        average_score = CASE WHEN total_games + excluded.total_games > 0
+            THEN ROUND((total_goals_scored + excluded.total_goals_scored) / (total_games + excluded.total_games), 2)
+            ELSE 0 END,
+        goals_per_game = CASE WHEN total_games + excluded.total_games > 0
+            THEN ROUND((total_goals_scored + excluded.total_goals_scored) / (total_games + excluded.total_games), 2)
+            ELSE 0 END,
+        hits_per_game = CASE WHEN total_games + excluded.total_games > 0
+            THEN ROUND((total_hits + excluded.total_hits) / (total_games + excluded.total_games), 2)
+            ELSE 0 END,
+        powerups_per_game = CASE WHEN total_games + excluded.total_games > 0
+            THEN ROUND((total_powerups_picked + excluded.total_powerups_picked) / (total_games + excluded.total_games), 2)
+            ELSE 0 END,
+        last_updated = CURRENT_TIMESTAMP
+"""
+
+
+class StatsAccumulator:
+    """Dense per-user counters indexed by id_user, written with one upsert per user"""
+
+    def __init__(self, max_user_id=0):
+        self.totals = np.zeros((max_user_id + 1, len(STAT_COLUMNS)), dtype=np.int32)
+        self.highest_score = np.zeros(max_user_id + 1, dtype=np.int32)
+
+    def _reserve(self, max_user_id):
+        if max_user_id >= len(self.highest_score):
+            grow = max_user_id + 1 - len(self.highest_score)
+            self.totals = np.vstack([self.totals, np.zeros((grow, len(STAT_COLUMNS)), dtype=np.int32)])
+            self.highest_score = np.concatenate([self.highest_score, np.zeros(grow, dtype=np.int32)])
+
+    def add_games(self, games):
+        """Add both sides of a game_synth batch"""
+        self._reserve(int(max(games['player1_id'].max(), games['player2_id'].max())))
+        outcome = games['outcome']
+        for side, win in (('player1', game_synth.LEFT_WIN), ('player2', game_synth.RIGHT_WIN)):
+            ids = games[f'{side}_id']
+            lose = game_synth.RIGHT_WIN if win == game_synth.LEFT_WIN else game_synth.LEFT_WIN
+            self._add(ids, 'total_games', 1)
+            self._add(ids, 'wins', outcome == win)
+            self._add(ids, 'losses', outcome == lose)
+            self._add(ids, 'draws', outcome == game_synth.DRAW)
+            for stat, col in PLAYER_STAT_COLUMNS.items():
+                self._add(ids, stat, games[f'{side}_{col}'])
+            for stat, col in USAGE_STAT_COLUMNS.items():
+                self._add(ids, stat, games[col])
+            np.maximum.at(self.highest_score, ids, games[f'{side}_score'])
+        # pong_sim batches flag the games player1 played against ButiBot
+        if 'vs_ai' in games:
+            self._add(games['player1_id'], 'vs_ai_games', games['vs_ai'])
+
+    def add_tournament(self, participants, winner_id):
+        """Count one finished tournament for every participant"""
+        ids = np.asarray(participants, dtype=np.int64)
+        self._reserve(int(ids.max()))
+        self._add(ids, 'total_tournaments', 1)
+        self._add(ids, 'tournaments_won', ids == winner_id)
+        self._add(ids, 'tournaments_lost', ids != winner_id)
+
+    def _add(self, ids, column, values):
+        np.add.at(self.totals[:, COLUMN_INDEX[column]], ids, np.asarray(values, dtype=np.int32))
+
+    def rows(self, after=0):
+        """Yield UPSERT_STATS_SQL parameters for every user with something to add, in id_user order,
+        starting after the user after"""
+        touched = np.flatnonzero(self.totals.any(axis=1))
+        touched = touched[touched > after]
+        totals = self.totals[touched].astype(np.float64)
+        games = totals[:, COLUMN_INDEX['total_games']]
+        played = np.maximum(games, 1)
+
+        def per_game(column):
+            # integer division, as updateUserStats computes it in SQL
+            return (totals[:, COLUMN_INDEX[column]] // played).tolist()
+
+        derived = zip(
+            np.round(totals[:, COLUMN_INDEX['wins']] * 100 / played, 2).tolist(),
+            per_game('total_goals_scored'),
+            per_game('total_goals_scored'),
+            per_game('total_hits'),
+            per_game('total_powerups_picked'),
+        )
+        for user_id, counters, highest, rates in zip(
+                touched.tolist(), self.totals[touched].tolist(),
+                self.highest_score[touched].tolist(), derived):
+            yield (user_id, *counters, highest, *rates)
+
+    def write(self, c):
+        """Upsert every touched user_stats row in one executemany"""
+        c.executemany(UPSERT_STATS_SQL, self.rows())
+        seed_metrics.add_rows("user_stats", c.rowcount)
+        return c.rowcount
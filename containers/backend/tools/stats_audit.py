@@ -0,0 +1,264 @@
+"""Recompute user_stats from games with NumPy and diff it against the table.
+
+user_stats is kept up to date incrementally: by updateUserStats in
+src/api/db/database.js, by GameResultsService.updateUserStats in
+pong/GameResultService.js (SELECT then INSERT OR REPLACE per player, with
+halved usage counters and win_rate in percent) and by StatsAccumulator while
+seeding, so counters and per-game averages can drift from the games they
+summarize. audit() streams games in id_game chunks into a StatsAccumulator
+and compares the result with user_stats, column by column, as
+updateUserStats computes them: win_rate in percent, the per-game averages
+divided as integers. GameResultService divides in floating point instead, so
+an average matching either form passes, and the rates are compared within a
+tolerance, since only updateUserStats rounds them to two decimals.
+A win_rate that only differs by being a fraction of one, as older seeds
+wrote it, is counted on its own and never rewritten.
+
+The expected totals are stored in user_stats_audit along with the last
+id_game they include, so the next audit only reads newer games and checks
+the users who played them or whose row changed since (last_updated). --full
+reads every game and checks every row. Games moved out by game_archive.py
+count through their user_monthly_stats rollups.
+
+Tournament counters are left out: the backend updates them from the
+tournament config without recording the tournament anywhere.
+"""
+import time
+import zlib
+
+import numpy as np
+
+import game_synth
+import seed_profile
+from stats_accumulator import COLUMN_INDEX, STAT_COLUMNS, StatsAccumulator
+
+
+AUDITED_COLUMNS = [col for col in STAT_COLUMNS if 'tournament' not in col]
+RATE_COLUMNS = {
+    # user_stats column: the counter updateUserStats divides by total_games. win_rate is
+    # ROUND((wins + ?) * 100.0 / (total_games + 1), 2), the averages are
+    # ROUND((total_goals_scored + ?) / (total_games + 1), 2) on INTEGER columns, an integer division
+    'win_rate': 'wins',
+    'average_score': 'total_goals_scored',
+    'goals_per_game': 'total_goals_scored',
+    'hits_per_game': 'total_hits',
+    'powerups_per_game': 'total_powerups_picked',
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_stats_audit (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_game INTEGER NOT NULL,
+        columns TEXT NOT NULL,
+        users INTEGER NOT NULL,
+        totals BLOB NOT NULL,
+        highest_score BLOB NOT NULL,
+        audited_at TIMESTAMP NOT NULL
+    )
+"""
+
+_SIDE_COLUMNS = [f'{side}_{col}' for side in ('player1', 'player2') for col in game_synth.PLAYER_COLUMNS
+                 if col != 'result']
+# one int64 row per game in the shape StatsAccumulator.add_games expects; the outcome follows
+# player1_result like updateUserStats does, general_result for rows without one
+AUDIT_COLUMNS = (['id_game', 'player1_id', 'player2_id', 'outcome', 'player1_score', 'player2_score', 'vs_ai']
+                 + game_synth.USAGE_COLUMNS + _SIDE_COLUMNS)
+AUDIT_SELECT = f"""
+    SELECT id_game, COALESCE(player1_id, 0), COALESCE(player2_id, 0),
+           CASE COALESCE(player1_result, CASE general_result
+                    WHEN 'leftWin' THEN 'win' WHEN 'rightWin' THEN 'lose' WHEN 'draw' THEN 'draw' END)
+               WHEN 'win' THEN {game_synth.LEFT_WIN} WHEN 'lose' THEN {game_synth.RIGHT_WIN}
+               WHEN 'draw' THEN {game_synth.DRAW} ELSE -1 END,
+           COALESCE(player1_score, 0), COALESCE(player2_score, 0),
+           instr(COALESCE(config_json, ''), '"1vAI"') > 0,
+           {', '.join(f'COALESCE({col}, 0)' for col in game_synth.USAGE_COLUMNS + _SIDE_COLUMNS)}
+    FROM games
+"""
+AUDIT_GAMES_SQL = AUDIT_SELECT + """
+    WHERE id_game > ? AND id_game <= ?
+    ORDER BY id_game
+    LIMIT ?
+"""
+
+FIX_STATS_SQL = f"""
+    INSERT INTO user_stats (id_user, {', '.join(AUDITED_COLUMNS)}, highest_score, {', '.join(RATE_COLUMNS)})
+    VALUES ({', '.join('?' * (len(AUDITED_COLUMNS) + len(RATE_COLUMNS) + 2))})
+    ON CONFLICT(id_user) DO UPDATE SET
+        {', '.join(f'{col} = excluded.{col}' for col in AUDITED_COLUMNS)},
+        highest_score = excluded.highest_score,
+        {', '.join(f'{col} = excluded.{col}' for col in RATE_COLUMNS)},
+        last_updated = CURRENT_TIMESTAMP
+"""
+
+
+def ensure_schema(conn):
+    conn.execute(SCHEMA)
+
+def load_state(conn):
+    """(expected totals, last id_game, audited_at) of the previous audit, or None"""
+    row = conn.execute(
+        "SELECT last_game, columns, users, totals, highest_score, audited_at FROM user_stats_audit"
+    ).fetchone()
+    if row is None or row[1] != ",".join(STAT_COLUMNS):
+        return None
+    last_game, _, users, totals, highest_score, audited_at = row
+    stats = StatsAccumulator()
+    stats.totals = np.frombuffer(zlib.decompress(totals), dtype=np.int32).reshape(users, len(STAT_COLUMNS)).copy()
+    stats.highest_score = np.frombuffer(zlib.decompress(highest_score), dtype=np.int32).copy()
+    return stats, last_game, audited_at
+
+def save_state(conn, stats, last_game, audited_at):
+    conn.execute(
+        "INSERT OR REPLACE INTO user_stats_audit (id, last_game, columns, users, totals, highest_score, audited_at) "
+        "VALUES (1, ?, ?, ?, ?, ?, ?)",
+        (last_game, ",".join(STAT_COLUMNS), len(stats.totals),
+         zlib.compress(stats.totals.tobytes(), 1), zlib.compress(stats.highest_score.tobytes(), 1), audited_at)
+    )
+
+def read_rollups(conn, stats):
+    """Add the user_monthly_stats of archived games (see game_archive.py) to stats"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_monthly_stats'").fetchone():
+        return
+    rows = conn.execute(
+        f"SELECT id_user, {', '.join(f'SUM({col})' for col in AUDITED_COLUMNS)}, MAX(highest_score) "
+        f"FROM user_monthly_stats GROUP BY id_user"
+    ).fetchall()
+    if not rows:
+        return
+    rollups = np.array(rows, dtype=np.int64)
+    users = rollups[:, 0]
+    stats._reserve(int(users.max()))
+    stats.totals[users[:, None], [COLUMN_INDEX[col] for col in AUDITED_COLUMNS]] += rollups[:, 1:-1].astype(np.int32)
+    stats.highest_score[users] = np.maximum(stats.highest_score[users], rollups[:, -1])
+
+def archived_since(conn, last_game, audited_at):
+    """Whether games the previous audit had not read yet were archived since"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'game_archive_batches'").fetchone():
+        return False
+    return conn.execute(
+        "SELECT 1 FROM game_archive_batches WHERE archived_at >= ? AND last_game > ? LIMIT 1", (audited_at, last_game)
+    ).fetchone() is not None
+
+def read_games(conn, stats, after, through, chunk_size):
+    """Add games with after < id_game <= through to stats; returns the ids of their players"""
+    played = []
+    while after < through:
+        with seed_profile.phase("audit.read"):
+            rows = conn.execute(AUDIT_GAMES_SQL, (after, through, chunk_size)).fetchall()
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+        with seed_profile.phase("audit.group"):
+            games = {col: chunk[:, i] for i, col in enumerate(AUDIT_COLUMNS)}
+            stats.add_games(games)
+            played.append(np.unique(chunk[:, 1:3]))
+        after = int(chunk[-1, 0])
+        print(f"  audit: up to game {after}/{through}", flush=True)
+    return np.unique(np.concatenate(played)) if played else np.zeros(0, dtype=np.int64)
+
+def expected_rows(stats, users, divide=np.floor_divide):
+    """FIX_STATS_SQL parameters of users (ids within stats) as an (n, columns) float array; divide
+    computes the per-game averages, integer division like updateUserStats by default"""
+    counters = stats.totals[users][:, [COLUMN_INDEX[col] for col in AUDITED_COLUMNS]].astype(np.float64)
+    played = np.maximum(counters[:, AUDITED_COLUMNS.index('total_games')], 1)
+    rates = [counters[:, AUDITED_COLUMNS.index(col)] * 100 / played if rate == 'win_rate'
+             else divide(counters[:, AUDITED_COLUMNS.index(col)], played) for rate, col in RATE_COLUMNS.items()]
+    return np.column_stack([users, counters, stats.highest_score[users], *rates])
+
+def actual_rows(conn, users, changed_since):
+    """The same columns from user_stats for users, plus rows updated since changed_since (all rows if None)"""
+    columns = f"id_user, {', '.join(AUDITED_COLUMNS)}, highest_score, {', '.join(RATE_COLUMNS)}"
+    if changed_since is None:
+        rows = conn.execute(f"SELECT {columns} FROM user_stats ORDER BY id_user").fetchall()
+    else:
+        rows = conn.execute(
+            f"SELECT {columns} FROM user_stats "
+            f"WHERE id_user IN (SELECT value FROM json_each(?)) OR last_updated >= ? ORDER BY id_user",
+            ("[" + ",".join(map(str, users.tolist())) + "]", changed_since)
+        ).fetchall()
+    width = len(AUDITED_COLUMNS) + len(RATE_COLUMNS) + 2
+    return np.array(rows, dtype=np.float64).reshape(-1, width)
+
+def audit(conn, full=False, fix=False, chunk_size=250000, tolerance=0.01, show=10):
+    """Diff user_stats against games; with fix, rewrite the mismatched rows in one transaction.
+
+    The reads run in one transaction so games and user_stats come from the same
+    snapshot; with fix it is taken as a write transaction up front, so backend
+    writes wait instead of landing between the check and the rewrite.
+    """
+    ensure_schema(conn)
+    started_at = time.perf_counter()
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE" if fix else "BEGIN")
+    try:
+        state = None if full else load_state(conn)
+        if state and archived_since(conn, state[1], state[2]):
+            print("Games newer than the last audit were archived since, auditing everything")
+            state = None
+        stats, after, changed_since = state or (StatsAccumulator(), 0, None)
+        if state is None:
+            read_rollups(conn, stats)
+        through, audited_at = conn.execute("SELECT COALESCE(MAX(id_game), 0), CURRENT_TIMESTAMP FROM games").fetchone()
+        max_user = conn.execute("SELECT COALESCE(MAX(id_user), 0) FROM users").fetchone()[0]
+        stats._reserve(max_user)
+
+        played = read_games(conn, stats, after, through, chunk_size)
+        with seed_profile.phase("audit.diff"):
+            actual = actual_rows(conn, played, changed_since)
+            # rows of users that no longer exist have nothing to be checked against
+            actual = actual[actual[:, 0] <= max_user]
+            actual_ids = actual[:, 0].astype(np.int64)
+            ids = np.union1d(played[(played > 0) & (played <= max_user)], actual_ids)
+            expected = expected_rows(stats, ids)
+            # the averages as GameResultService writes them
+            floating = expected_rows(stats, ids, divide=np.true_divide)
+            # users without a user_stats row count as all zeros
+            current = np.zeros_like(expected)
+            current[:, 0] = ids
+            current[np.searchsorted(ids, actual_ids)] = actual
+            missing = ~np.isin(ids, actual_ids) & expected[:, 1:].any(axis=1)
+
+            exact = len(AUDITED_COLUMNS) + 2
+            off = np.zeros_like(expected, dtype=bool)
+            off[:, 1:exact] = expected[:, 1:exact] != current[:, 1:exact]
+            off[:, exact:] = ((np.abs(expected[:, exact:] - current[:, exact:]) > tolerance)
+                              & (np.abs(floating[:, exact:] - current[:, exact:]) > tolerance))
+            # a win_rate kept as a fraction is the same rate in other units, not drift
+            rate = exact + list(RATE_COLUMNS).index('win_rate')
+            fraction = off[:, rate] & (np.abs(expected[:, rate] - current[:, rate] * 100) <= tolerance)
+            off[fraction, rate] = False
+            bad = off.any(axis=1)
+            fraction &= ~bad
+
+        print_report(ids, expected, current, off, bad, missing, through - after, show)
+        if fraction.any():
+            print(f"{int(fraction.sum())} rows keep win_rate as a fraction of one, left as they are")
+
+        if fix and bad.any():
+            with seed_profile.phase("audit.fix"):
+                rows = expected[bad].tolist()
+                conn.executemany(FIX_STATS_SQL, [(int(row[0]), *map(int, row[1:exact]), *row[exact:]) for row in rows])
+            print(f"Rewrote {int(bad.sum())} user_stats rows")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    # a separate transaction, a read snapshot cannot always be upgraded to a write
+    with conn:
+        save_state(conn, stats, through, audited_at)
+    print(f"Audited {len(ids)} users against {through - after} games in {time.perf_counter() - started_at:.2f}s")
+    return int(bad.sum())
+
+def print_report(ids, expected, current, off, bad, missing, games, show):
+    names = ['id_user'] + AUDITED_COLUMNS + ['highest_score'] + list(RATE_COLUMNS)
+    print(f"\n== user_stats audit: {len(ids)} users checked, {int(bad.sum())} mismatched "
+          f"({int(missing.sum())} without a row), {games} games read")
+    if not bad.any():
+        return
+    print(f"{'column':<28} {'users':>8} {'total drift':>14}")
+    for i in np.flatnonzero(off.any(axis=0)):
+        drift = np.abs(expected[off[:, i], i] - current[off[:, i], i]).sum()
+        print(f"{names[i]:<28} {int(off[:, i].sum()):>8} {drift:>14.2f}")
+    for row in np.flatnonzero(bad)[:show]:
+        diffs = ", ".join(f"{names[i]} {current[row, i]:g} -> {expected[row, i]:g}" for i in np.flatnonzero(off[row]))
+        print(f"  user {int(ids[row])}: {diffs}")
@@ -0,0 +1,105 @@
+"""Single-elimination tournament brackets resolved in memory for friends.py"""
+import numpy as np
+
+import game_synth
+
+
+# Kept in sync with tools/init_db.sh so older databases can be seeded too
+TOURNAMENT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tournaments (
+        id_tournament INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        status TEXT CHECK(status IN ('pending', 'active', 'finished')) DEFAULT 'pending',
+        size INTEGER NOT NULL DEFAULT 0,
+        winner_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(winner_id) REFERENCES users(id_user)
+    );
+
+    CREATE TABLE IF NOT EXISTS tournament_participants (
+        id_tournament INTEGER NOT NULL,
+        id_user INTEGER NOT NULL,
+        is_ai BOOLEAN DEFAULT 0,
+        final_position INTEGER,
+        PRIMARY KEY (id_tournament, id_user),
+        FOREIGN KEY(id_tournament) REFERENCES tournaments(id_tournament),
+        FOREIGN KEY(id_user) REFERENCES users(id_user)
+    );
+
+    CREATE TABLE IF NOT EXISTS tournament_games (
+        id_tournament INTEGER NOT NULL,
+        id_game INTEGER NOT NULL,
+        round INTEGER NOT NULL,
+        PRIMARY KEY (id_tournament, id_game),
+        FOREIGN KEY(id_tournament) REFERENCES tournaments(id_tournament),
+        FOREIGN KEY(id_game) REFERENCES games(id_game)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_tournament_participants_id_user ON tournament_participants(id_user);
+"""
+
+
+def bracket_size(players):
+    """Smallest power of two that fits every player"""
+    return 1 << (players - 1).bit_length()
+
+def play_tournaments(rng, fields):
+    """Play every field (list of user ids) to a single winner.
+
+    All tournaments advance together one round at a time, so each round is
+    synthesized as one game_synth batch. Players without an opponent in the
+    first round get a bye. Returns (winners, positions, rounds) where
+    positions[t] maps user id -> final position and rounds is a list of
+    (round number, tournament index array, games batch).
+    """
+    alive = [list(field) for field in fields]
+    slots = [bracket_size(len(field)) for field in fields]
+    positions = [{} for _ in fields]
+    rounds = []
+
+    round_number = 1
+    while True:
+        owners, player1, player2 = [], [], []
+        for t, players in enumerate(alive):
+            if len(players) < 2:
+                continue
+            games = len(players) - slots[t] // 2
+            byes = len(players) - 2 * games
+            playing = players[byes:]
+            owners += [t] * games
+            player1 += playing[0::2]
+            player2 += playing[1::2]
+            alive[t] = players[:byes]
+        if not owners:
+            break
+
+        owners = np.array(owners, dtype=np.int64)
+        games = game_synth.synthesize_games(
+            rng,
+            np.array(player1, dtype=np.int64),
+            np.array(player2, dtype=np.int64),
+            profile=game_synth.TOURNAMENT,
+            is_tournament=True
+        )
+
+        # a drawn tournament game still needs someone to go through
+        outcome = games['outcome']
+        left_through = (outcome == game_synth.LEFT_WIN) | (
+            (outcome == game_synth.DRAW) & (rng.random(len(owners)) < 0.5))
+        winners = np.where(left_through, games['player1_id'], games['player2_id'])
+        losers = np.where(left_through, games['player2_id'], games['player1_id'])
+
+        for t, winner, loser in zip(owners.tolist(), winners.tolist(), losers.tolist()):
+            alive[t].append(winner)
+            positions[t][loser] = slots[t] // 2 + 1
+        for t in set(owners.tolist()):
+            slots[t] //= 2
+
+        rounds.append((round_number, owners, games))
+        round_number += 1
+
+    winners = []
+    for t, players in enumerate(alive):
+        positions[t][players[0]] = 1
+        winners.append(players[0])
+    return winners, positions, rounds
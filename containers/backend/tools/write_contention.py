@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""Measure lock contention between live game saves, reads and a bulk seed on one SQLite file.
+
+Usage: python3 write_contention.py <seeded db> [--journal-modes delete,wal] [--batch-sizes 5000,200] [--yield-ms 0,20]
+
+Every configuration runs on a fresh copy of the database for --duration
+seconds, with:
+
+  writers  --writers processes saving --rate matches/s in total (Poisson arrivals), each
+           save as the backend writes it: saveGameToDatabase (games, then game_results, each
+           in autocommit) and updateUserStats (one transaction), or for an --online share
+           GameResultService.saveOnlineGameResults (games and both user_stats rows
+           read-modify-write in one deferred transaction)
+  readers  --readers processes running the history (count + first page) and profile
+           (getUserProfileStats + getUserStats) queries at --read-rate requests/s in total
+  seeder   one process inserting synthetic games and their user_stats in batches of
+           --batch-sizes through write_pipeline.BatchWriter, cooperative with --yield-ms
+
+The backend's node-sqlite3 connection waits out SQLITE_BUSY in SQLite's
+default busy handler for 1s (--busy-timeout). The writers and readers run
+the same handler in Python (write_pipeline.busy_delays) so they can count
+every SQLITE_BUSY, the time slept waiting for a lock, and the requests that
+would have failed. Latency is measured from the request's scheduled arrival,
+so time queued behind a slow save counts too. A run without the seeder
+comes first in every journal mode as the baseline.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+import game_results
+import game_synth
+import game_timeline
+import write_pipeline
+from query_bench import QUERIES, percentile
+from stats_accumulator import STAT_COLUMNS, UPSERT_STATS_SQL, StatsAccumulator
+
+
+# node-sqlite3 opens every database with sqlite3_busy_timeout(db, 1000)
+BACKEND_BUSY_TIMEOUT_MS = 1000
+# save payloads each writer prepares up front and cycles through
+POOL_SIZE = 500
+
+GAME_RESULTS_SQL = "INSERT INTO game_results (id_game, game_data) VALUES (?, ?)"
+USER_BY_NAME_SQL = "SELECT * FROM users WHERE username = ?"
+USER_STATS_SQL = f"SELECT {', '.join(STAT_COLUMNS)} FROM user_stats WHERE id_user = ?"
+REPLACE_STATS_SQL = (
+    f"INSERT OR REPLACE INTO user_stats (id_user, {', '.join(STAT_COLUMNS)}, last_updated) "
+    f"VALUES ({', '.join('?' * (len(STAT_COLUMNS) + 2))})"
+)
+
+
+class Requests:
+    """Latency, lock waits and failures of one kind of request in one process"""
+
+    def __init__(self):
+        self.latencies = []
+        self.waits = []
+        self.busy = 0
+        self.blocked = 0
+        self.errors = Counter()
+
+    def merge(self, other):
+        self.latencies += other.latencies
+        self.waits += other.waits
+        self.busy += other.busy
+        self.blocked += other.blocked
+        self.errors.update(other.errors)
+
+    def summary(self):
+        latencies, waits = sorted(self.latencies), sorted(self.waits)
+        calls = len(latencies) + sum(self.errors.values())
+        return {
+            "calls": calls,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+            "busy": self.busy,
+            "blocked_pct": 100 * self.blocked / max(calls, 1),
+            "wait_p99_ms": percentile(waits, 99),
+            "errors": dict(self.errors),
+        }
+
+
+class Busy:
+    """Runs statements like a connection with busy_timeout, counting SQLITE_BUSY and the time slept"""
+
+    def __init__(self, conn, timeout_ms):
+        self.conn = conn
+        self.timeout_ms = timeout_ms
+        self.busy = 0
+        self.waited = 0.0
+
+    def execute(self, sql, params=()):
+        delays = write_pipeline.busy_delays(self.timeout_ms)
+        while True:
+            try:
+                return self.conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as error:
+                # SQLITE_BUSY_SNAPSHOT and friends skip the handler, as they do in SQLite
+                if error.sqlite_errorcode != sqlite3.SQLITE_BUSY:
+                    raise
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+                self.busy += 1
+                self.waited += delay
+                time.sleep(delay / 1000)
+
+
+def open_live(path):
+    """A connection like the backend's: autocommit statements, explicit BEGIN/COMMIT, no busy handler of its own"""
+    return sqlite3.connect(path, timeout=0, isolation_level=None)
+
+def poisson(rng, rate, duration):
+    """Arrival times, in seconds from the start, of rate requests/s over duration seconds"""
+    at = rng.expovariate(rate)
+    while at < duration:
+        yield at
+        at += rng.expovariate(rate)
+
+def serve(rate, duration, seed, barrier, request):
+    """Call request() at Poisson arrivals; returns (arrival-to-finish ms, busy, waited ms, error kind) per call"""
+    rng = random.Random(seed)
+    barrier.wait()
+    started_at = time.perf_counter()
+    for at in poisson(rng, rate, duration):
+        delay = started_at + at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        busy, waited, error = request(rng)
+        yield (time.perf_counter() - started_at - at) * 1000, busy, waited, error
+
+def record(outcomes):
+    requests = Requests()
+    for latency, busy, waited, error in outcomes:
+        requests.busy += busy
+        requests.blocked += busy > 0
+        if error:
+            requests.errors[error] += 1
+        else:
+            requests.latencies.append(latency)
+            requests.waits.append(waited)
+    return requests
+
+def stats_rows(games):
+    """UPSERT_STATS_SQL rows of a game_synth batch, counted over its own players only"""
+    players, inverse = np.unique(np.stack([games['player1_id'], games['player2_id']]), return_inverse=True)
+    inverse = inverse.reshape(2, -1)
+    stats = StatsAccumulator(len(players))
+    stats.add_games({**games, 'player1_id': inverse[0] + 1, 'player2_id': inverse[1] + 1})
+    return [(int(players[row[0] - 1]), *row[1:]) for row in stats.rows()]
+
+def save_pool(conn, rng, size):
+    """size saves as (games row, game_data JSON, UPSERT_STATS_SQL rows of both players, their usernames)"""
+    users = np.array([row[0] for row in conn.execute("SELECT id_user FROM users")], dtype=np.int64)
+    names = game_results.load_usernames(conn)
+    player1_ids, player2_ids = game_synth.random_pairs(rng, users, size)
+    games = game_synth.synthesize_games(rng, player1_ids, player2_ids)
+    now = int(time.time())
+    game_timeline.stamp(rng, games, np.full(size, now - game_timeline.DURATION_MEDIAN))
+    rows = list(game_synth.game_rows(games))
+    documents = game_results.documents(rng, games, names)
+    saves = []
+    for i in range(size):
+        game = {col: values[i:i + 1] for col, values in games.items()}
+        players = (int(player1_ids[i]), int(player2_ids[i]))
+        saves.append((rows[i], documents[i], stats_rows(game), (names[players[0]], names[players[1]])))
+    return saves
+
+def save_game(db, save):
+    """games.js: saveGameToDatabase, then updateUserStats"""
+    row, document, stats, _ = save
+    db.execute(game_synth.INSERT_GAME_SQL, row)
+    id_game = db.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    db.execute(GAME_RESULTS_SQL, (id_game, document))
+    db.execute("BEGIN TRANSACTION")
+    for stats_row in stats:
+        db.execute(UPSERT_STATS_SQL, stats_row)
+    db.execute("COMMIT")
+
+def save_online_game(db, save):
+    """GameResultService.saveOnlineGameResults: the game and both stats rows in one deferred transaction"""
+    row, _, stats, usernames = save
+    for username in usernames:
+        db.execute(USER_BY_NAME_SQL, (username,))
+    db.execute("BEGIN TRANSACTION")
+    db.execute(game_synth.INSERT_GAME_SQL, row)
+    for id_user, *counters in stats:
+        current = db.execute(USER_STATS_SQL, (id_user,))
+        totals = current[0] if current else [0] * len(STAT_COLUMNS)
+        db.execute(REPLACE_STATS_SQL, (id_user, *[total + add for total, add in zip(totals, counters)],
+                                       time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())))
+    db.execute("COMMIT")
+
+def live_writer(path, rate, duration, online, busy_timeout, seed, barrier, results):
+    conn = open_live(path)
+    saves = save_pool(conn, np.random.default_rng(seed), POOL_SIZE)
+
+    def request(rng):
+        db = Busy(conn, busy_timeout)
+        save = saves[rng.randrange(len(saves))]
+        try:
+            (save_online_game if rng.random() < online else save_game)(db, save)
+            return db.busy, db.waited, None
+        except sqlite3.Error as error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return db.busy, db.waited, getattr(error, "sqlite_errorname", type(error).__name__)
+
+    results.put(("writes", record(serve(rate, duration, seed, barrier, request))))
+    conn.close()
+
+def live_reader(path, rate, duration, busy_timeout, seed, barrier, results):
+    conn = open_live(path)
+    users = [row[0] for row in conn.execute("SELECT id_user FROM users")]
+    requests = {
+        "history": ("getGamesHistory.count", "getGamesHistory.first_page"),
+        "profile": ("getUserProfileStats", "getUserStats"),
+    }
+
+    def request(rng):
+        db = Busy(conn, busy_timeout)
+        ctx = {"user": rng.choice(users), "limit": 10}
+        try:
+            for name in requests[rng.choice(("history", "profile"))]:
+                sql, make_params = QUERIES[name]
+                db.execute(sql, make_params(ctx))
+            return db.busy, db.waited, None
+        except sqlite3.Error as error:
+            return db.busy, db.waited, getattr(error, "sqlite_errorname", type(error).__name__)
+
+    results.put(("reads", record(serve(rate, duration, seed, barrier, request))))
+    conn.close()
+
+def seeder(path, batch_size, yield_ms, duration, seed, barrier, results):
+    """Insert synthetic games and their user_stats, batch_size games per transaction, until duration is up"""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA synchronous = FULL")
+    users = np.array([row[0] for row in conn.execute("SELECT id_user FROM users")], dtype=np.int64)
+    budget = write_pipeline.LockBudget(yield_ms / 1000)
+    if not yield_ms:
+        # transactions timed but back to back, like friends.py without --yield-ms
+        budget.gap = 0
+    rng = np.random.default_rng(seed)
+    batches = 0
+    barrier.wait()
+    started_at = time.perf_counter()
+    with write_pipeline.BatchWriter(conn, budget=budget) as writer:
+        while time.perf_counter() - started_at < duration:
+            games = game_synth.synthesize_games(rng, *game_synth.random_pairs(rng, users, batch_size))
+            writer.submit((game_synth.INSERT_GAME_SQL, list(game_synth.game_rows(games))),
+                          (UPSERT_STATS_SQL, stats_rows(games)))
+            batches += 1
+    seconds = time.perf_counter() - started_at
+    conn.close()
+    holds, waits = sorted(budget.holds), sorted(budget.waits)
+    results.put(("seeder", {
+        "games_per_s": batches * batch_size / seconds,
+        "transactions": len(holds),
+        "hold_p50_ms": percentile(holds, 50) * 1000,
+        "hold_max_ms": (holds[-1] if holds else 0) * 1000,
+        "wait_max_ms": (waits[-1] if waits else 0) * 1000,
+    }))
+
+def copy_database(source, path, journal_mode):
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+    dst.execute(f"PRAGMA journal_mode = {journal_mode}")
+    dst.close()
+
+def run_config(source, tmp, journal_mode, batch_size, yield_ms, args, seed):
+    """One configuration on a fresh copy; returns its summary"""
+    path = os.path.join(tmp, f"contention-{journal_mode}.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    copy_database(source, path, journal_mode)
+
+    results = multiprocessing.Queue()
+    workers = args.writers + args.readers + (1 if batch_size else 0)
+    barrier = multiprocessing.Barrier(workers)
+    processes = [
+        multiprocessing.Process(target=live_writer, args=(path, args.rate / args.writers, args.duration, args.online,
+                                                          args.busy_timeout, seed + i, barrier, results))
+        for i in range(args.writers)
+    ] + [
+        multiprocessing.Process(target=live_reader, args=(path, args.read_rate / args.readers, args.duration,
+                                                          args.busy_timeout, seed + 100 + i, barrier, results))
+        for i in range(args.readers)
+    ]
+    if batch_size:
+        processes.append(multiprocessing.Process(target=seeder, args=(path, batch_size, yield_ms, args.duration,
+                                                                      seed, barrier, results)))
+    for process in processes:
+        process.start()
+    summary = {"journal_mode": journal_mode, "batch_size": batch_size, "yield_ms": yield_ms,
+               "writes": Requests(), "reads": Requests(), "seeder": None}
+    for _ in processes:
+        # a worker that died never reports, give up on the configuration instead of hanging
+        kind, result = results.get(timeout=args.duration + 300)
+        if kind == "seeder":
+            summary["seeder"] = result
+        else:
+            summary[kind].merge(result)
+    for process in processes:
+        process.join()
+    summary["writes"] = summary["writes"].summary()
+    summary["reads"] = summary["reads"].summary()
+    return summary
+
+def print_report(summaries, budget_ms):
+    print(f"\n{'journal':<8} {'batch':>6} {'yield':>6} | {'save p50':>8} {'p99':>7} {'max':>7} {'busy%':>6} "
+          f"{'wait99':>7} {'fail':>5} | {'read p50':>8} {'p99':>7} {'busy%':>6} {'fail':>5} | "
+          f"{'seed g/s':>8} {'hold max':>8}")
+    for s in summaries:
+        writes, reads, seed = s["writes"], s["reads"], s["seeder"]
+        seeded = f"{seed['games_per_s']:>8.0f} {seed['hold_max_ms']:>8.1f}" if seed else f"{'-':>8} {'-':>8}"
+        flag = "  over budget" if writes["p99_ms"] > budget_ms or writes["errors"] else ""
+        print(f"{s['journal_mode']:<8} {s['batch_size'] or '-':>6} {s['yield_ms'] if s['batch_size'] else '-':>6} | "
+              f"{writes['p50_ms']:>8.1f} {writes['p99_ms']:>7.1f} {writes['max_ms']:>7.1f} {writes['blocked_pct']:>6.1f} "
+              f"{writes['wait_p99_ms']:>7.1f} {sum(writes['errors'].values()):>5} | "
+              f"{reads['p50_ms']:>8.2f} {reads['p99_ms']:>7.1f} {reads['blocked_pct']:>6.1f} "
+              f"{sum(reads['errors'].values()):>5} | {seeded}{flag}")
+    print(f"\nms throughout; busy% = requests that hit SQLITE_BUSY at least once, wait99 = p99 of the time they "
+          f"slept on locks, fail = requests that gave up or hit an error the busy handler does not retry, "
+          f"over budget = save p99 above {budget_ms:.0f} ms or failed saves")
+
+def _numbers(text, kind=int):
+    return [kind(value) for value in text.split(",") if value]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure lock waits and SQLITE_BUSY between live saves, reads and seeding")
+    parser.add_argument("database", help="seeded database, copied for every configuration")
+    parser.add_argument("--journal-modes", default="delete,wal",
+                        help="comma separated journal modes to compare (default: %(default)s)")
+    parser.add_argument("--batch-sizes", default="5000,200",
+                        help="comma separated seeder batch sizes, 0 for none (default: %(default)s)")
+    parser.add_argument("--yield-ms", default="0,20",
+                        help="comma separated seeder lock budgets, 0 for back to back batches (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per configuration (default: %(default)s)")
+    parser.add_argument("--writers", type=int, default=2, help="live writer processes (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=20, help="saves per second in total (default: %(default)s)")
+    parser.add_argument("--online", type=float, default=0.5,
+                        help="share of saves through GameResultService (default: %(default)s)")
+    parser.add_argument("--readers", type=int, default=2, help="reader processes (default: %(default)s)")
+    parser.add_argument("--read-rate", type=float, default=100,
+                        help="history and profile requests per second in total (default: %(default)s)")
+    parser.add_argument("--busy-timeout", type=int, default=BACKEND_BUSY_TIMEOUT_MS,
+                        help="ms the backend waits on a lock before failing (default: %(default)s)")
+    parser.add_argument("--budget-ms", type=float, default=100,
+                        help="p99 save latency the seeder must keep the backend under (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for payloads and arrivals (default: %(default)s)")
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    configs = []
+    for journal_mode in args.journal_modes.split(","):
+        configs.append((journal_mode, 0, 0))
+        configs += [(journal_mode, batch_size, yield_ms) for batch_size in _numbers(args.batch_sizes) if batch_size
+                    for yield_ms in _numbers(args.yield_ms, float)]
+
+    summaries = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for journal_mode, batch_size, yield_ms in configs:
+            print(f"Running journal_mode={journal_mode} seeder batch={batch_size or '-'} yield={yield_ms or '-'} "
+                  f"for {args.duration:.0f}s", flush=True)
+            summaries.append(run_config(args.database, tmp, journal_mode, batch_size, yield_ms, args, args.seed))
+
+    print_report(summaries, args.budget_ms)
+    if args.json:
+        with open(args.json, "a") as out:
+            for summary in summaries:
+                out.write(json.dumps(summary) + "\n")
+
+if __name__ == "__main__":
+    main()
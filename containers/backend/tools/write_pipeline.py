@@ -0,0 +1,173 @@
+"""Bounded producer/writer pipeline: generation keeps running while SQLite writes.
+
+Producers build batches of rows and submit them; one writer thread owns the
+connection and commits each submission as a transaction. The queue holds at
+most max_pending submissions, so a producer that outruns the disk blocks
+instead of buffering the whole dataset.
+
+Against a database the backend is writing to, a LockBudget makes the
+writer cooperative: every transaction takes the write lock up front, and
+the writer pauses after each commit long enough for a save waiting in
+SQLite's busy handler to wake up and get the lock. With batches small
+enough to commit within the budget, a live write waits for at most about
+one batch.
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import seed_metrics
+import seed_profile
+
+
+_DONE = object()
+
+# sleeps of SQLite's default busy handler (sqlite3_busy_timeout), then the last one repeats
+BUSY_DELAYS_MS = (1, 2, 5, 10, 15, 20, 25, 25, 25, 50, 50, 100)
+
+
+def busy_delays(timeout_ms):
+    """Successive sleeps, in ms, of a connection waiting on a lock with busy_timeout timeout_ms"""
+    waited = 0
+    index = 0
+    while waited < timeout_ms:
+        delay = min(BUSY_DELAYS_MS[min(index, len(BUSY_DELAYS_MS) - 1)], timeout_ms - waited)
+        yield delay
+        waited += delay
+        index += 1
+
+def busy_delay_after(waited_ms):
+    """How long a connection that has waited waited_ms on a lock sleeps before it tries again"""
+    for delay in busy_delays(float("inf")):
+        if waited_ms < delay:
+            return delay
+        waited_ms -= delay
+
+
+class LockBudget:
+    """Transactions that hold the write lock for about budget seconds at most, with a gap after each"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        # a writer that waited the whole budget sleeps this long between tries, the gap must cover one
+        self.gap = busy_delay_after(budget * 1000) / 1000
+        self.holds = []
+        self.waits = []
+
+    @contextmanager
+    def transaction(self, conn):
+        """BEGIN IMMEDIATE ... COMMIT, timing the wait for the lock and how long it was held"""
+        conn.commit()
+        started_at = time.perf_counter()
+        with seed_profile.phase("writer.lock_wait"):
+            conn.execute("BEGIN IMMEDIATE")
+        locked_at = time.perf_counter()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.waits.append(locked_at - started_at)
+            self.holds.append(time.perf_counter() - locked_at)
+
+    def pause(self):
+        """Leave the lock free for one gap, call after every transaction"""
+        with seed_profile.phase("writer.yield"):
+            time.sleep(self.gap)
+
+    def report(self, label):
+        """Print the lock hold times since the last report and, when some ran over the budget,
+        how far to shrink the batches"""
+        if not self.holds:
+            return
+        holds = sorted(self.holds)
+        over = sum(hold > self.budget for hold in holds)
+        print(f"{label}: {len(holds)} cooperative transactions, lock held p50 {holds[len(holds) // 2] * 1000:.1f} ms, "
+              f"max {holds[-1] * 1000:.1f} ms, waited up to {max(self.waits) * 1000:.1f} ms for it, "
+              f"{over} over the {self.budget * 1000:.0f} ms budget")
+        if over:
+            slow = holds[int(len(holds) * 0.9)]
+            print(f"  batches of about {self.budget / slow:.0%} of --batch-size would commit within it")
+        self.holds, self.waits = [], []
+
+
+class BatchWriter:
+    """Write thread for one connection, used as a context manager around the producer loop"""
+
+    def __init__(self, conn, max_pending=4, budget=None):
+        """budget is an optional LockBudget the writer's transactions keep to"""
+        self.conn = conn
+        self.budget = budget
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.changes = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._stop()
+        return False
+
+    def submit(self, *statements, checkpoint=None):
+        """Queue (sql, rows) pairs to be executed and committed together.
+
+        checkpoint is one more (sql, rows) pair for the same transaction whose
+        changes are not counted, see seed_progress.Run.checkpoint.
+        """
+        if self.error:
+            self._stop()
+            raise self.error
+        # time blocked here is time the producer waited on SQLite
+        with seed_profile.phase("writer.queue_wait"):
+            self.pending.put((statements, checkpoint))
+
+    def close(self):
+        """Wait for every submitted batch, re-raising the writer's error if it failed"""
+        self._stop()
+        if self.error:
+            raise self.error
+
+    def _stop(self):
+        if self.thread.is_alive():
+            self.pending.put(_DONE)
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.pending.get()
+            if item is _DONE:
+                return
+            if self.error:
+                # keep draining so a producer blocked on a full queue wakes up and sees the error
+                continue
+            statements, checkpoint = item
+            try:
+                started_at = time.perf_counter()
+                written = []
+                transaction = self.budget.transaction(self.conn) if self.budget else self.conn
+                with seed_profile.phase("writer.transaction"), transaction:
+                    for sql, rows in statements:
+                        before = self.conn.total_changes
+                        self.conn.executemany(sql, rows)
+                        written.append((seed_metrics.table_of(sql), self.conn.total_changes - before))
+                    if checkpoint:
+                        self.conn.executemany(*checkpoint)
+                self.changes += sum(count for _, count in written)
+                seed_metrics.observe_commit(time.perf_counter() - started_at)
+                for table, count in written:
+                    seed_metrics.add_rows(table, count)
+                if checkpoint:
+                    seed_metrics.set_batches(checkpoint[1][0][0])
+                if self.budget:
+                    self.budget.pause()
+            except BaseException as error:
+                self.error = error